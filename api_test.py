@@ -1,6 +1,9 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 import json
-from lambda_function import lambda_handler
+import os
+import time
+from lambda_function import get_evaluator, lambda_handler
+from retry_policy import Deadline
 import logging
 
 app = Flask(__name__)
@@ -18,9 +21,14 @@ class MockContext:
         self.log_group_name = "/aws/lambda/test_lambda_function"
         self.log_stream_name = "test-stream"
         self.invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:test_lambda_function"
+        # Timeout of the deployed function (900 s) unless overridden
+        self.timeout_ms = int(os.getenv("AUTOQA_LOCAL_TIMEOUT_MS", "900000"))
+        self.started_at = time.monotonic()
     
     def get_remaining_time_in_millis(self):
-        return 10000  # example value in milliseconds
+        # Counts down from the function timeout, as Lambda does
+        elapsed_ms = (time.monotonic() - self.started_at) * 1000
+        return max(0, int(self.timeout_ms - elapsed_ms))
 
 @app.route('/test-lambda', methods=['POST'])
 def test_lambda():
@@ -46,6 +54,32 @@ def test_lambda():
         logger.error(f"Error processing request: {e}")
         return jsonify({"error": "An error occurred while processing the request."}), 500
 
+@app.route('/test-lambda/jobs/<job_id>', methods=['GET'])
+def test_lambda_job(job_id):
+    """Poll an async job (submitted with "async": true); run `python jobs.py` to evaluate queued jobs."""
+    event = {"httpMethod": "GET", "pathParameters": {"job_id": job_id}}
+    response = lambda_handler(event, MockContext())
+    return jsonify(json.loads(response['body'])), response['statusCode']
+
+@app.route('/test-lambda/stream', methods=['POST'])
+def test_lambda_stream():
+    """Server-sent events: category scores are sent as soon as the model has produced them."""
+    body = request.get_json(silent=True) or {}
+    transcript = body.get('transcript')
+    if not transcript:
+        return jsonify({"error": "Transcript not found in the event data."}), 400
+
+    def events():
+        try:
+            for event in get_evaluator().stream_evaluation(transcript, Deadline.from_context(MockContext())):
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming evaluation: {e}")
+            yield f"event: error\ndata: {json.dumps({'event': 'error', 'error': str(e)})}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,79 @@
+import gzip
+import json
+import logging
+import queue
+import threading
+import time
+
+class AuditLog:
+    """
+    Background writer of raw LLM prompts and responses to a gzip-compressed
+    JSON-lines file. record() only enqueues, so no disk I/O happens on the
+    request path; a writer thread drains the queue in batches. When the queue
+    is full (the disk cannot keep up), records are dropped and counted rather
+    than blocking evaluations. Appending to an existing file adds a gzip
+    member, which gzip readers handle transparently.
+    """
+
+    def __init__(self, path, max_queued=10000, batch_size=256, flush_interval=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.dropped = 0
+        self.closed = False
+        self.file = gzip.open(path, "at", encoding="utf-8")
+        self.thread = threading.Thread(target=self._drain, name="audit-log", daemon=True)
+        self.thread.start()
+
+    def record(self, **fields):
+        if self.closed:
+            return
+        fields.setdefault("ts", time.time())
+        try:
+            self.queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1:
+                logging.warning(f"Audit log queue is full; dropping records for {self.path}")
+
+    def _drain(self):
+        flushed_at = time.monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            batch = [] if item is None else [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(entry is self for entry in batch)
+            lines = [json.dumps(entry, default=str) + "\n" for entry in batch if entry is not self]
+            if lines:
+                self.file.writelines(lines)
+            if stop or time.monotonic() - flushed_at >= self.flush_interval:
+                self.file.flush()
+                flushed_at = time.monotonic()
+            if stop:
+                return
+
+    def close(self):
+        """Write everything queued so far and close the file."""
+        if self.closed:
+            return
+        self.closed = True
+        # The log itself is the end-of-stream marker
+        self.queue.put(self)
+        self.thread.join()
+        self.file.close()
+        if self.dropped:
+            logging.warning(f"Audit log dropped {self.dropped} records")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
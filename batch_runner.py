@@ -0,0 +1,130 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+from token_estimates import estimate_tokens
+
+# evaluate_conversation's result for an evaluation that failed without spending tokens
+FAILED_RESULT = (None, '', '', None, 0, 0)
+
+class BatchRunner:
+    """
+    Evaluates many transcripts with up to `max_in_flight` concurrent LLM calls.
+
+    A RateLimiter, if given, is handed to the evaluator: every API request an
+    evaluation makes (parse retries, map-reduce summaries, cascade tiers,
+    split sections, hedges) first reserves one request and its estimated
+    tokens, and afterwards reconciles the tokens bucket with the tokens
+    reported by the API.
+
+    With a TranscriptPacker, short transcripts are grouped and each group is
+    evaluated with one call (see ChatAgentEvaluator.evaluate_packed).
+
+    Records are read `chunk_size` at a time, and the timing of a whole chunk
+    is scored with one TimingEngine pass instead of one per transcript.
+
+    Next to each result comes the number of tokens the evaluation actually
+    sent to the API: 0 for an evaluation served from the cache or a near
+    duplicate, whose result still reports the stored token counts.
+    """
+
+    def __init__(self, evaluator, max_in_flight=4, limiter=None, packer=None, chunk_size=64):
+        self.evaluator = evaluator
+        self.max_in_flight = max_in_flight
+        self.limiter = limiter
+        self.packer = packer
+        self.chunk_size = chunk_size
+        if limiter:
+            evaluator.limiter = limiter
+
+    def evaluate(self, code, transcript, timings=None):
+        """Evaluate one transcript; returns (code, evaluate_conversation result, seconds taken, tokens spent)."""
+        transcript_text = self.evaluator.format_transcript(transcript)
+        start = time.perf_counter()
+        result = self.evaluator.evaluate_conversation(transcript_text, timings=timings)
+        return code, result, time.perf_counter() - start, self.evaluator.call_state.spent_tokens
+
+    def evaluate_pack(self, group, timings=None):
+        """Evaluate a group of (code, transcript_text) with one call; returns a list of (code, result, seconds, tokens spent)."""
+        start = time.perf_counter()
+        results = self.evaluator.evaluate_packed([transcript_text for _, transcript_text in group], timings=timings)
+        elapsed = time.perf_counter() - start
+        spent_tokens = self.evaluator.call_state.spent_tokens
+        return [(code, result, elapsed, spent) for (code, _), result, spent in zip(group, results, spent_tokens)]
+
+    def run(self, records):
+        """
+        Evaluate an iterable of (code, transcript) records, yielding
+        (code, result, seconds, tokens spent) tuples as evaluations complete. At most
+        `max_in_flight` calls (and the rest of the current chunk) are pulled
+        from the iterable ahead of the results.
+        An evaluation that raises yields a failed result (no scores, no
+        tokens), so every record gets exactly one result.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            pending = set()
+            codes = {}
+            group, group_tokens, group_timings = [], [], {}
+            rubric_tokens = estimate_tokens(self.evaluator.rubric_prompt()) if self.packer else 0
+
+            def submit(function, batch_codes, *args):
+                nonlocal pending
+                if len(pending) >= self.max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from self._collect(done, codes)
+                future = executor.submit(function, *args)
+                codes[future] = batch_codes
+                pending.add(future)
+
+            def submit_group():
+                # A group of one is an ordinary evaluation
+                if len(group) == 1:
+                    yield from submit(self.evaluate, [group[0][0]], *group[0], dict(group_timings))
+                elif group:
+                    yield from submit(self.evaluate_pack, [code for code, _ in group], list(group), dict(group_timings))
+                group.clear()
+                group_tokens.clear()
+                group_timings.clear()
+
+            records = iter(records)
+            for chunk in iter(lambda: list(islice(records, self.chunk_size)), []):
+                chunk = [(code, self.evaluator.format_transcript(transcript)) for code, transcript in chunk]
+                timings = self.score_timings([transcript_text for _, transcript_text in chunk])
+                for code, transcript_text in chunk:
+                    if self.packer and self.packer.is_short(transcript_text):
+                        tokens = estimate_tokens(transcript_text)
+                        if group and not self.packer.fits(rubric_tokens, group_tokens + [tokens], self.evaluator.context_window()):
+                            yield from submit_group()
+                        group.append((code, transcript_text))
+                        group_tokens.append(tokens)
+                        if transcript_text in timings:
+                            group_timings[transcript_text] = timings[transcript_text]
+                        continue
+                    yield from submit(self.evaluate, [code], code, transcript_text, timings)
+            yield from submit_group()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from self._collect(done, codes)
+
+    def score_timings(self, transcript_texts):
+        """Timing of a chunk of transcripts (see ChatAgentEvaluator.score_timings); empty if it cannot be scored at once."""
+        try:
+            return self.evaluator.score_timings(transcript_texts)
+        except Exception as e:
+            # Each evaluation then scores (and reports the failure of) its own transcript
+            logging.warning(f"Could not score the timing of {len(transcript_texts)} transcripts at once: {e}")
+            return {}
+
+    def _collect(self, futures, codes):
+        for future in futures:
+            batch_codes = codes.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"Error in batch evaluation of {', '.join(map(str, batch_codes))}: {e}")
+                # Callers still settle these codes (e.g. release their token budget reservations)
+                yield from ((code, FAILED_RESULT, 0.0, 0) for code in batch_codes)
+                continue
+            # Packed groups complete with a list of results
+            yield from result if isinstance(result, list) else [result]
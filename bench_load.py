@@ -0,0 +1,170 @@
+"""
+Load benchmark against the local Groq stand-in (mock_groq.py), so no quota is spent.
+
+Replays transcript.txt through lambda_handler, the Flask /test-lambda route
+and the autoQA batch runner at the given concurrency levels, and reports
+throughput, p50/p95/p99 latency and tokens per evaluation per target and
+level, plus what the mock server answered (injected 429s, 5xx, ...).
+
+Usage:
+    python bench_load.py --targets handler,flask,batch --concurrency 1,4,16 --requests 50
+    python bench_load.py --latency-ms 800 --distribution lognormal --rate-429 0.05 --malformed-rate 0.1
+    python bench_load.py --baseline bench_baseline.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+from bench_startup import percentile
+from mock_groq import MockGroqServer, add_config_arguments, config_from_args
+
+TARGETS = ("handler", "flask", "batch")
+
+class BenchContext:
+    """Lambda context with a generous deadline."""
+    function_name = "bench_load"
+    aws_request_id = "bench-load"
+
+    def get_remaining_time_in_millis(self):
+        return 900000
+
+def load_transcripts(path, count):
+    """`count` (code, transcript) records from the export, cycling if it has fewer."""
+    from transcript_reader import iter_transcripts
+    records = list(islice(iter_transcripts(path), count))
+    if not records:
+        raise SystemExit(f"No transcripts found in {path}")
+    return list(islice(cycle(records), count))
+
+def tokens_of(body):
+    return (body.get("Input Token Count") or 0) + (body.get("Output Token Count") or 0)
+
+def run_handler(records, concurrency):
+    """lambda_handler called directly from `concurrency` threads; returns (seconds, ok, tokens) samples."""
+    import lambda_function
+
+    def call(record):
+        event = {"body": json.dumps({"transcript": record[1]})}
+        start = time.perf_counter()
+        response = lambda_function.lambda_handler(event, BenchContext())
+        elapsed = time.perf_counter() - start
+        body = json.loads(response["body"])
+        return elapsed, response["statusCode"] == 200 and "error" not in body, tokens_of(body)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(call, records))
+
+def run_flask(records, concurrency):
+    """POST /test-lambda through the Flask test client (one client per request, no socket)."""
+    from api_test import app
+
+    def call(record):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post("/test-lambda", json={"transcript": record[1]})
+        elapsed = time.perf_counter() - start
+        body = response.get_json(silent=True) or {}
+        return elapsed, response.status_code == 200 and "error" not in body, tokens_of(body)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(call, records))
+
+def run_batch(records, concurrency):
+    """autoQA's BatchRunner and evaluator (batch route) without a rate limiter or audit log (the mock has no quota)."""
+    from autoQA import ChatAgentEvaluator
+    from batch_runner import BatchRunner
+
+    runner = BatchRunner(ChatAgentEvaluator(), max_in_flight=concurrency)
+    samples = []
+    for _, result, elapsed, _ in runner.run(iter(records)):
+        total_scores, _, _, _, input_token_count, output_token_count = result
+        samples.append((elapsed, bool(total_scores), (input_token_count or 0) + (output_token_count or 0)))
+    failed = len(records) - len(samples)
+    return samples + [(0.0, False, 0)] * failed
+
+RUNNERS = {"handler": run_handler, "flask": run_flask, "batch": run_batch}
+
+def summarize(target, concurrency, samples, wall_seconds):
+    latencies = [elapsed * 1000 for elapsed, ok, _ in samples if ok]
+    tokens = [count for _, ok, count in samples if ok]
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": sum(1 for _, ok, _ in samples if not ok),
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "tokens_per_eval": round(sum(tokens) / len(tokens), 1) if tokens else 0.0,
+    }
+
+def regressions(results, baseline, max_regression):
+    """Rows whose p95 grew, or whose throughput dropped, by more than `max_regression` (a fraction)."""
+    previous = {(row["target"], row["concurrency"]): row for row in baseline}
+    found = []
+    for row in results:
+        before = previous.get((row["target"], row["concurrency"]))
+        if not before:
+            continue
+        if before["p95_ms"] and row["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            found.append(f"{row['target']}@{row['concurrency']}: p95 {before['p95_ms']} -> {row['p95_ms']} ms")
+        if before["throughput_rps"] and row["throughput_rps"] < before["throughput_rps"] * (1 - max_regression):
+            found.append(f"{row['target']}@{row['concurrency']}: throughput {before['throughput_rps']} -> {row['throughput_rps']} rps")
+    return found
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark throughput and latency against a local Groq stand-in.")
+    parser.add_argument("--input", default="transcript.txt", help="Transcript export to replay.")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="Comma separated: handler, flask, batch.")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma separated concurrency levels.")
+    parser.add_argument("--requests", type=int, default=32, help="Evaluations per target and level.")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", default=None, help="Results JSON of a previous run to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95/throughput regression (fraction).")
+    add_config_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    targets = [target.strip() for target in args.targets.split(",") if target.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        raise SystemExit(f"Unknown targets: {sorted(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    records = load_transcripts(args.input, args.requests)
+
+    with MockGroqServer(config_from_args(args)) as server:
+        # Must be set before the evaluator (and its Groq client) is built; the cache would hide the LLM path
+        os.environ["GROQ_BASE_URL"] = server.url
+        os.environ.setdefault("GROQ_API", "mock")
+        os.environ["AUTOQA_CACHE"] = "off"
+        os.environ.setdefault("AUTOQA_METRICS", "off")
+
+        results = []
+        for target in targets:
+            for level in levels:
+                start = time.perf_counter()
+                samples = RUNNERS[target](records, level)
+                row = summarize(target, level, samples, time.perf_counter() - start)
+                results.append(row)
+                print(json.dumps(row), flush=True)
+        print(json.dumps({"mock_server": server.stats.snapshot()}))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(results, json.load(file), args.max_regression)
+        for message in found:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Startup benchmark for the lambda.
+
+Measures, over several fresh interpreter processes (cold containers):
+  - import time of lambda_function
+  - time to build the evaluator (dotenv + groq import + backend client creation)
+  - time of the first lambda_handler request
+and, inside a single process (warm container), the latency of follow-up
+requests that reuse the module-level evaluator.
+
+Usage:
+    python bench_startup.py --runs 10 --warm-requests 20
+    python bench_startup.py --no-request      # import/build time only, no API calls
+"""
+import argparse
+import json
+import math
+import subprocess
+import sys
+import time
+
+SAMPLE_TRANSCRIPT = [
+    {"timestamp": "2023-10-01T12:00:00Z", "user": "customer", "message": "Hello, I need help with my order."},
+    {"timestamp": "2023-10-01T12:01:00Z", "user": "agent", "message": "Sure, I can help you with that. Can you please provide your order number?"},
+]
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+def summarize(name, values):
+    return {
+        "stage": name,
+        "runs": len(values),
+        "p50_ms": round(percentile(values, 50), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(max(values), 2) if values else 0.0,
+    }
+
+def run_child(do_request, warm_requests):
+    """Executed inside a fresh interpreter: time one cold start and optional warm requests."""
+    timings = {}
+    start = time.perf_counter()
+    import lambda_function
+    timings["import_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    lambda_function.get_evaluator().router.connect()
+    timings["evaluator_build_ms"] = (time.perf_counter() - start) * 1000
+
+    timings["warm_ms"] = []
+    if do_request:
+        event = {"body": json.dumps({"transcript": SAMPLE_TRANSCRIPT})}
+        start = time.perf_counter()
+        lambda_function.lambda_handler(event, None)
+        timings["first_request_ms"] = (time.perf_counter() - start) * 1000
+        for _ in range(warm_requests):
+            start = time.perf_counter()
+            lambda_function.lambda_handler(event, None)
+            timings["warm_ms"].append((time.perf_counter() - start) * 1000)
+    print(json.dumps(timings))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lambda cold start and warm request latency.")
+    parser.add_argument("--runs", type=int, default=10, help="Number of cold (fresh process) runs.")
+    parser.add_argument("--warm-requests", type=int, default=5, help="Warm requests per cold run.")
+    parser.add_argument("--no-request", action="store_true", help="Skip lambda_handler calls (no API usage).")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(not args.no_request, args.warm_requests)
+        return
+
+    results = {"import_ms": [], "evaluator_build_ms": [], "first_request_ms": [], "warm_ms": []}
+    for _ in range(args.runs):
+        cmd = [sys.executable, __file__, "--child", "--warm-requests", str(args.warm_requests)]
+        if args.no_request:
+            cmd.append("--no-request")
+        output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        for key in ("import_ms", "evaluator_build_ms", "first_request_ms"):
+            if key in timings:
+                results[key].append(timings[key])
+        results["warm_ms"].extend(timings["warm_ms"])
+
+    for key, values in results.items():
+        if values:
+            print(json.dumps(summarize(key, values)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import json
+import logging
+import os
+import re
+import threading
+from datetime import date
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from qa_analytics import metadata_frame
+from rate_limiter import EXPECTED_COMPLETION_TOKENS
+from timing_engine import TimingEngine
+from token_estimates import estimate_tokens
+
+# Customer wording that usually means the ticket matters beyond its own score
+ESCALATION_PATTERN = re.compile(
+    r"\b(?:escalat\w*|manager|supervisor|complain\w*|complaint|refund|legal|consumer court|cancel\w*|"
+    r"unacceptable|worst|frustrat\w*|disappointed|still not|not resolved|no one|nobody)\b",
+    re.IGNORECASE,
+)
+REOPEN_PREFIX = "Reopened by"
+
+# Points per unit of each risk signal; signals are capped at RISK_CAP units so no single one dominates
+RISK_WEIGHTS = {"reopens": 3.0, "wait_ratio": 2.0, "escalations": 2.0, "reassignments": 1.0}
+RISK_CAP = 3
+# Risk bands used (with the team) as strata of the sample
+RISK_BANDS = (0.0, 3.0)
+
+def risk_frame(transcripts, engine=None):
+    """
+    Cheap local risk signals of {code: transcript_text}, as a frame indexed by
+    Code: reopens, reassignments (assignments after the first), escalations
+    (customer messages with escalation wording), max_wait_seconds (longest
+    dead air, see TimingEngine), wait_ratio (that over the dead-air limit),
+    team, risk (the weighted sum of the capped signals) and band.
+    """
+    engine = engine or TimingEngine()
+    codes = pd.Index(list(transcripts.keys()), name="Code")
+    events = engine.events_frame(transcripts)
+    message = events["message"].fillna("")
+    grouped = pd.DataFrame({
+        "Code": events["ticket"],
+        "reopens": message.str.startswith(REOPEN_PREFIX),
+        "assignments": events["role"].eq("assignment"),
+        "escalations": events["role"].eq("customer") & message.str.contains(ESCALATION_PATTERN),
+    }).groupby("Code").sum()
+
+    risks = grouped.reindex(codes).fillna(0)
+    risks["reassignments"] = (risks.pop("assignments") - 1).clip(lower=0)
+    timing = engine.score_batch(transcripts)
+    risks["max_wait_seconds"] = timing["max_dead_air_seconds"].reindex(codes).to_numpy()
+    risks["wait_ratio"] = (risks["max_wait_seconds"] / engine.dead_air_limit).fillna(0)
+    risks["team"] = metadata_frame(transcripts)["team"].fillna("unknown")
+
+    risk = np.zeros(len(risks))
+    for signal, weight in RISK_WEIGHTS.items():
+        risk += risks[signal].clip(upper=RISK_CAP).to_numpy(dtype=float) * weight
+    risks["risk"] = risk.round(2)
+    risks["band"] = np.select(
+        [risk <= RISK_BANDS[0], risk < RISK_BANDS[1]], ["none", "low"], default="high"
+    )
+    return risks
+
+class TokenLedger:
+    """
+    Tokens spent today against a daily quota, kept in a small JSON file so
+    that reruns on the same day share the quota. Scheduled evaluations
+    reserve their estimate until their actual usage is settled.
+
+    The ledger also learns how far the estimates are off: `ratio` is a
+    moving average of actual over estimated tokens, kept across days, and
+    estimates are scaled by it (see calibrated).
+    """
+    # Weight of the latest evaluation in the moving average of `ratio`
+    RATIO_SMOOTHING = 0.1
+    # Estimator the ratio was learned against; a ratio learned against another one is dropped
+    ESTIMATOR = "token_estimates.estimate_tokens"
+
+    def __init__(self, path, daily_budget):
+        self.path = path
+        self.daily_budget = daily_budget
+        self.lock = threading.Lock()
+        self.day = date.today().isoformat()
+        self.spent = 0
+        self.ratio = 1.0
+        self.reserved = {}
+        self.estimates = {}
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                state = json.load(file)
+            if state.get("estimator") == self.ESTIMATOR:
+                self.ratio = state.get("ratio", 1.0)
+            if state.get("date") == self.day:
+                self.spent = state.get("spent", 0)
+
+    def calibrated(self, estimated_tokens):
+        return int(estimated_tokens * self.ratio)
+
+    def remaining(self):
+        with self.lock:
+            return self.daily_budget - self.spent - sum(self.reserved.values())
+
+    def reserve(self, code, estimated_tokens):
+        """Reserve an evaluation's calibrated estimate; False (nothing reserved) if it does not fit."""
+        with self.lock:
+            tokens = self.calibrated(estimated_tokens)
+            if self.spent + sum(self.reserved.values()) + tokens > self.daily_budget:
+                return False
+            self.reserved[code] = tokens
+            self.estimates[code] = estimated_tokens
+            return True
+
+    def settle(self, code, tokens):
+        """Replace an evaluation's reservation with the tokens it actually used."""
+        with self.lock:
+            self.reserved.pop(code, None)
+            estimated_tokens = self.estimates.pop(code, None)
+            # No usage means the call never reached the API; it says nothing about the estimates
+            if estimated_tokens and tokens:
+                self.ratio += self.RATIO_SMOOTHING * (tokens / estimated_tokens - self.ratio)
+            self.spent += tokens
+            state = {
+                "date": self.day, "spent": self.spent, "daily_budget": self.daily_budget,
+                "ratio": round(self.ratio, 4), "estimator": self.ESTIMATOR,
+            }
+        with open(self.path + ".tmp", "w") as file:
+            json.dump(state, file)
+        os.replace(self.path + ".tmp", self.path)
+
+class BudgetScheduler:
+    """
+    Picks which tickets of a batch to evaluate within a token budget, and in
+    which order. Every ticket's prompt cost is estimated up front (compacted
+    transcript plus rubric plus the expected completion) and ranked by a
+    local risk score (see risk_frame):
+
+    - "priority": tickets with a positive risk, highest first, fill
+      `priority_share` of the budget;
+    - "sample": the rest of the budget goes to a stratified sample of the
+      remaining tickets (strata: team and risk band), so the results stay
+      representative of the whole batch;
+    - "deferred": tickets that did not fit.
+
+    Tickets are parsed in batches of `batch_size`; only the scheduled
+    transcripts are held in memory, and those are bounded by the budget.
+    """
+
+    def __init__(self, evaluator, budget, priority_share=0.8, seed=0, batch_size=500):
+        self.evaluator = evaluator
+        self.budget = budget
+        self.priority_share = priority_share
+        self.seed = seed
+        self.batch_size = batch_size
+        self.engine = TimingEngine()
+
+    def estimate_tokens(self, transcript):
+        """Estimated total tokens of one evaluation, after compaction (with the estimator the rate limiter uses)."""
+        evaluator = self.evaluator
+        transcript_text = evaluator.format_transcript(transcript)
+        if evaluator.compactor:
+            transcript_text, _ = evaluator.compactor.compact(transcript_text)
+        return estimate_tokens(evaluator.build_prompt(transcript_text)) + EXPECTED_COMPLETION_TOKENS
+
+    def plan(self, records, calibrate=None):
+        """
+        The schedule of (code, transcript) records: risk_frame columns plus
+        estimated tokens (passed through `calibrate` if given), selection and order.
+        """
+        frames = []
+        records = iter(records)
+        while True:
+            batch = dict(islice(records, self.batch_size))
+            if not batch:
+                break
+            risks = risk_frame({code: self.evaluator.format_transcript(text) for code, text in batch.items()}, self.engine)
+            risks["estimated_tokens"] = [self.estimate_tokens(text) for text in batch.values()]
+            risks["tokens"] = risks["estimated_tokens"].map(calibrate) if calibrate else risks["estimated_tokens"]
+            frames.append(risks)
+        if not frames:
+            return pd.DataFrame(columns=["risk", "band", "team", "estimated_tokens", "tokens", "selection", "order"])
+        return self.select(pd.concat(frames))
+
+    def select(self, schedule):
+        schedule = schedule[~schedule.index.duplicated(keep="last")].copy()
+        schedule["selection"] = "deferred"
+        tokens = schedule["tokens"].to_numpy()
+        left = self.budget
+
+        priority = schedule.index[schedule["risk"] > 0]
+        ranked = schedule.loc[priority].sort_values(["risk", "tokens"], ascending=[False, True], kind="stable")
+        priority_left = self.budget * self.priority_share
+        chosen = []
+        for code, cost in zip(ranked.index, ranked["tokens"].to_numpy()):
+            if cost <= priority_left:
+                chosen.append(code)
+                priority_left -= cost
+        schedule.loc[chosen, "selection"] = "priority"
+        left -= schedule.loc[chosen, "tokens"].sum()
+
+        # Systematic stratified order: each stratum's tickets are spread evenly over the sample order,
+        # so any prefix of it holds the strata in proportion to their size
+        rest = schedule[schedule["selection"] == "deferred"]
+        generator = np.random.default_rng(self.seed)
+        strata = rest.groupby(["team", "band"], sort=False)
+        shuffled = pd.Series(generator.random(len(rest)), index=rest.index)
+        position = (shuffled.groupby([rest["team"], rest["band"]]).rank(method="first") - generator.random()) / strata["risk"].transform("size")
+        sampled = []
+        for code in position.sort_values(kind="stable").index:
+            cost = schedule.at[code, "tokens"]
+            if cost <= left:
+                sampled.append(code)
+                left -= cost
+        schedule.loc[sampled, "selection"] = "sample"
+
+        order = {code: index for index, code in enumerate(chosen + sampled)}
+        schedule["order"] = [order.get(code, len(tokens)) for code in schedule.index]
+        return schedule.sort_values("order", kind="stable")
+
+    def schedule(self, make_records, ledger=None, schedule_path=None):
+        """
+        Plan the records of `make_records()` (called twice: to plan, then to
+        read the scheduled transcripts) and yield the scheduled (code,
+        transcript) records in order. With a TokenLedger, the budget is what
+        is left of today's quota, and a ticket is only yielded once its
+        estimate could be reserved.
+        """
+        if ledger:
+            self.budget = max(0, ledger.remaining())
+        schedule = self.plan(make_records(), ledger.calibrated if ledger else None)
+        counts = schedule["selection"].value_counts()
+        scheduled = schedule[schedule["selection"] != "deferred"]
+        logging.info(
+            f"Token budget {self.budget}: {len(scheduled)} of {len(schedule)} tickets scheduled "
+            f"({counts.get('priority', 0)} by priority, {counts.get('sample', 0)} sampled, ~{int(scheduled['tokens'].sum())} tokens); "
+            f"{counts.get('deferred', 0)} deferred."
+        )
+        if schedule_path:
+            schedule.to_csv(schedule_path)
+
+        codes = set(scheduled.index)
+        transcripts = {code: transcript for code, transcript in make_records() if code in codes}
+        for code, tokens in zip(scheduled.index, scheduled["estimated_tokens"].to_numpy()):
+            if code not in transcripts:
+                continue
+            if ledger and not ledger.reserve(code, int(tokens)):
+                logging.warning(f"Deferring {code}: its ~{ledger.calibrated(tokens)} tokens no longer fit today's quota.")
+                continue
+            yield code, transcripts.pop(code)
@@ -0,0 +1,104 @@
+import os
+import re
+import threading
+
+from llm_json import RUBRIC_SCHEMA
+
+# Reasoning that says an item was missed, and reasoning that says it was done well
+NEGATIVE_REASONING = re.compile(
+    r"\b(?:did not|didn't|does not|doesn't|failed to|not|no|never|missing|missed|lack(?:ed|s|ing)?|without|absent|incorrect)\b",
+    re.IGNORECASE,
+)
+POSITIVE_REASONING = re.compile(
+    r"\b(?:correctly|properly|appropriately|promptly|clearly|well|good|excellent|successfully|did use|used the)\b",
+    re.IGNORECASE,
+)
+
+class ModelCascade:
+    """
+    Scores with a cheap model first and escalates to the evaluator's own
+    (larger) model only when the cheap result is doubtful:
+
+    - "invalid": it failed schema validation (after repair)
+    - "fatal": Fatal came back "yes", which zeroes the ticket
+    - "boundary": the total is within `margin` points of the pass mark
+    - "reasoning": a category's Reasoning contradicts its scores (full
+      marks with reasoning listing what was missed, or zero with praise)
+    """
+
+    def __init__(self, cheap_route="realtime", pass_mark=80, margin=5):
+        self.cheap_route = cheap_route
+        self.pass_mark = pass_mark
+        self.margin = margin
+        self.lock = threading.Lock()
+        self.tiers = {}
+        self.escalations = {}
+
+    @classmethod
+    def from_env(cls):
+        """A ModelCascade if AUTOQA_CASCADE is "on", else None."""
+        if os.getenv("AUTOQA_CASCADE", "off") != "on":
+            return None
+        return cls(
+            cheap_route=os.getenv("AUTOQA_CASCADE_ROUTE", "realtime"),
+            pass_mark=float(os.getenv("AUTOQA_PASS_MARK", 80)),
+            margin=float(os.getenv("AUTOQA_CASCADE_MARGIN", 5)),
+        )
+
+    def escalation_reasons(self, evaluation, total_score):
+        """Why a cheap-tier evaluation should be redone by the larger model; empty if it can be kept."""
+        if not evaluation:
+            return ["invalid"]
+        reasons = []
+        if evaluation.get("Fatal") == "yes":
+            reasons.append("fatal")
+        elif total_score is not None and abs(total_score - self.pass_mark) <= self.margin:
+            reasons.append("boundary")
+        if any(self.reasoning_disagrees(category, evaluation.get(category)) for category in RUBRIC_SCHEMA):
+            reasons.append("reasoning")
+        return reasons
+
+    def reasoning_disagrees(self, category, section):
+        if not isinstance(section, dict) or not isinstance(section.get("Reasoning"), str):
+            return False
+        items = {key: value for key, value in section.items() if key in RUBRIC_SCHEMA[category] and isinstance(value, (int, float))}
+        maximum = sum(RUBRIC_SCHEMA[category][key] for key in items)
+        if not maximum:
+            return False
+        ratio = sum(items.values()) / maximum
+        reasoning = section["Reasoning"]
+        negative = len(NEGATIVE_REASONING.findall(reasoning))
+        positive = len(POSITIVE_REASONING.findall(reasoning))
+        return (ratio >= 1 and negative >= 2 and negative > positive) or (ratio == 0 and positive >= 2 and not negative)
+
+    def record_tier(self, tier, seconds, tokens):
+        with self.lock:
+            stats = self.tiers.setdefault(tier, {"calls": 0, "total_ms": 0.0, "tokens": 0})
+            stats["calls"] += 1
+            stats["total_ms"] += seconds * 1000
+            stats["tokens"] += tokens
+
+    def record_escalation(self, reasons):
+        with self.lock:
+            for reason in reasons:
+                self.escalations[reason] = self.escalations.get(reason, 0) + 1
+            self.escalations["total"] = self.escalations.get("total", 0) + 1
+
+    def stats(self):
+        """Escalation rate and reasons, and calls/average latency/average tokens per tier."""
+        with self.lock:
+            tiers = {
+                tier: {
+                    "calls": stats["calls"],
+                    "avg_ms": round(stats["total_ms"] / stats["calls"], 1),
+                    "avg_tokens": round(stats["tokens"] / stats["calls"], 1),
+                }
+                for tier, stats in self.tiers.items()
+            }
+            escalations = dict(self.escalations)
+        cheap_calls = tiers.get(self.cheap_route, {}).get("calls", 0)
+        return {
+            "tiers": tiers,
+            "escalations": escalations,
+            "escalation_rate": round(escalations.get("total", 0) / cheap_calls, 4) if cheap_calls else 0.0,
+        }
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+def normalize_transcript(transcript_text):
+    """Whitespace-insensitive form of a transcript, so trivially re-formatted copies share a key."""
+    lines = (re.sub(r"\s+", " ", line).strip() for line in transcript_text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def make_cache_key(transcript_text, model_id, prompt_hash):
+    """Content address of an evaluation: normalized transcript + model + rubric prompt version."""
+    return hash_text("\x1f".join([normalize_transcript(transcript_text), model_id, prompt_hash]))
+
+class LRUCache:
+    """In-memory tier holding the most recently used `max_entries` evaluations."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+class SQLiteCache:
+    """Persistent tier in a local SQLite file (e.g. /tmp on Lambda, a project dir for batch runs)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS evaluations (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM evaluations WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO evaluations (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+            self.conn.commit()
+
+class EvaluationCache:
+    """
+    Tiered evaluation cache. Tiers are checked in order; a hit in a slower tier
+    is copied into the faster ones. Any object with get(key)/put(key, value)
+    can be used as a tier.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        for index, tier in enumerate(self.tiers):
+            try:
+                value = tier.get(key)
+            except Exception as e:
+                logging.warning(f"Cache tier {type(tier).__name__} read failed: {e}")
+                continue
+            if value is not None:
+                for faster_tier in self.tiers[:index]:
+                    faster_tier.put(key, value)
+                with self.lock:
+                    self.hits += 1
+                return value
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        for tier in self.tiers:
+            try:
+                tier.put(key, value)
+            except Exception as e:
+                logging.warning(f"Cache tier {type(tier).__name__} write failed: {e}")
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+def build_cache_from_env():
+    """
+    Build the cache described by AUTOQA_CACHE, a comma separated list of tiers
+    ("memory", "sqlite"), or "off" to disable caching. The SQLite file lives
+    at AUTOQA_CACHE_PATH.
+    """
+    tier_names = [name.strip() for name in os.getenv("AUTOQA_CACHE", "memory,sqlite").split(",") if name.strip()]
+    tiers = []
+    for name in tier_names:
+        if name == "off":
+            return None
+        if name == "memory":
+            tiers.append(LRUCache(int(os.getenv("AUTOQA_CACHE_MAX_ENTRIES", 1024))))
+        elif name == "sqlite":
+            try:
+                tiers.append(SQLiteCache(os.getenv("AUTOQA_CACHE_PATH", "/tmp/autoqa_cache.sqlite")))
+            except sqlite3.Error as e:
+                logging.warning(f"SQLite cache disabled: {e}")
+        else:
+            logging.warning(f"Unknown cache tier: {name}")
+    return EvaluationCache(tiers) if tiers else None
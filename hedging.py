@@ -0,0 +1,171 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+
+class HedgeBudget:
+    """
+    Caps the tokens spent on hedging: tokens of the losing request of every
+    hedged pair may add at most `max_extra_ratio` to the tokens of the
+    requests whose results were used. A hedge is only launched if its
+    expected cost (the average tokens per request so far) still fits.
+    """
+
+    def __init__(self, max_extra_ratio=0.1):
+        self.max_extra_ratio = max_extra_ratio
+        self.lock = threading.Lock()
+        self.used_tokens = 0
+        self.used_requests = 0
+        self.extra_tokens = 0
+        self.reserved_tokens = 0
+
+    def average_tokens(self):
+        return self.used_tokens / self.used_requests if self.used_requests else None
+
+    def reserve(self):
+        """Reserve the expected cost of a hedge; returns the reservation, or None if over budget."""
+        with self.lock:
+            expected = self.average_tokens()
+            if expected is None:
+                return None
+            if self.extra_tokens + self.reserved_tokens + expected > self.max_extra_ratio * self.used_tokens:
+                return None
+            self.reserved_tokens += expected
+            return expected
+
+    def record_used(self, tokens):
+        with self.lock:
+            self.used_tokens += tokens
+            self.used_requests += 1
+
+    def record_extra(self, tokens, reservation):
+        with self.lock:
+            self.reserved_tokens -= reservation
+            self.extra_tokens += tokens
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "used_tokens": self.used_tokens,
+                "extra_tokens": self.extra_tokens,
+                "extra_ratio": round(self.extra_tokens / self.used_tokens, 4) if self.used_tokens else 0.0,
+            }
+
+class Hedger:
+    """
+    Hedged requests: if the primary request has not answered by the
+    `percentile` of recent request latencies, a duplicate request is sent
+    (to the same or another route). The first valid result wins and the
+    other request is cancelled. Hedging starts once `min_samples`
+    latencies have been seen, and stays within the HedgeBudget.
+    """
+
+    def __init__(self, percentile=95, max_extra_ratio=0.1, min_samples=20, hedge_route=None, max_workers=32):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.hedge_route = hedge_route
+        self.latencies = metrics.Histogram()
+        self.budget = HedgeBudget(max_extra_ratio)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "hedged": 0, "hedge_wins": 0, "primary_wins": 0, "budget_skipped": 0}
+
+    @classmethod
+    def from_env(cls):
+        """A Hedger if AUTOQA_HEDGING is "on", else None."""
+        if os.getenv("AUTOQA_HEDGING", "off") != "on":
+            return None
+        return cls(
+            percentile=float(os.getenv("AUTOQA_HEDGE_PERCENTILE", 95)),
+            max_extra_ratio=float(os.getenv("AUTOQA_HEDGE_MAX_EXTRA", 0.1)),
+            min_samples=int(os.getenv("AUTOQA_HEDGE_MIN_SAMPLES", 20)),
+            hedge_route=os.getenv("AUTOQA_HEDGE_ROUTE") or None,
+        )
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def hedge_delay(self):
+        """Seconds to wait for the primary before hedging, or None while there are too few samples."""
+        if self.latencies.count < self.min_samples:
+            return None
+        return self.latencies.percentile(self.percentile)
+
+    def run(self, attempt, route, is_valid):
+        """
+        Run `attempt(route, cancel_event)` -> (content, tokens, details), hedging
+        it if slow. Returns the first valid result; when no result is valid,
+        the first one to finish. Raises the last error if every attempt failed.
+        """
+        self.count("requests")
+        started_at = time.perf_counter()
+        cancels = {"primary": threading.Event(), "hedge": threading.Event()}
+        labels = {self.executor.submit(contextvars.copy_context().run, attempt, route, cancels["primary"]): "primary"}
+
+        delay = self.hedge_delay()
+        done, _ = wait(list(labels), timeout=delay)
+        reservation = 0
+        if not done and delay is not None:
+            reservation = self.budget.reserve()
+            if reservation is None:
+                reservation = 0
+                self.count("budget_skipped")
+            else:
+                self.count("hedged")
+                metrics.current().increment("hedges_launched")
+                labels[self.executor.submit(contextvars.copy_context().run, attempt, self.hedge_route or route, cancels["hedge"])] = "hedge"
+
+        first, last_error = None, None
+        pending = set(labels)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                label = labels[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.warning(f"Hedged {label} request failed: {e}")
+                    last_error = e
+                    continue
+                if result[0] and is_valid(result[0]):
+                    self.settle(label, result, labels, cancels, reservation, started_at, won=True)
+                    return result
+                first = first or (label, result)
+        if first is None:
+            # No request has tokens to account for; give the hedge's reservation back
+            self.budget.record_extra(0, reservation)
+            raise last_error
+        self.settle(first[0], first[1], labels, cancels, reservation, started_at, won=False)
+        return first[1]
+
+    def settle(self, label, result, labels, cancels, reservation, started_at, won):
+        """Cancel the other request and account tokens: the used result's, and the other's once it stops."""
+        # When the hedge wins this is a lower bound of the primary's latency, which is all we will learn
+        self.latencies.add(time.perf_counter() - started_at)
+        self.budget.record_used(result[1])
+        if len(labels) == 1:
+            return
+        if won:
+            self.count(f"{label}_wins")
+            if label == "hedge":
+                metrics.current().increment("hedge_wins")
+        for future, other in labels.items():
+            if other == label:
+                continue
+            cancels[other].set()
+            future.add_done_callback(lambda loser: self.budget.record_extra(
+                0 if loser.exception() else loser.result()[1], reservation
+            ))
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        counts["hedge_win_rate"] = round(counts["hedge_wins"] / counts["hedged"], 4) if counts["hedged"] else 0.0
+        counts["hedge_delay_ms"] = round(self.hedge_delay() * 1000, 1) if self.hedge_delay() is not None else None
+        counts.update(self.budget.snapshot())
+        return counts
@@ -0,0 +1,344 @@
+import abc
+import json
+import logging
+import os
+import threading
+import time
+import types
+from collections import deque
+
+import metrics
+from retry_policy import is_retryable
+
+# Model per route when AUTOQA_BACKENDS is not set: the lambda scores in real time, autoQA in batch
+DEFAULT_ROUTES = {
+    "realtime": "llama-3.1-8b-instant",
+    "batch": "llama3-70b-8192",
+}
+DEFAULT_POOL_SIZE = int(os.getenv("AUTOQA_POOL_SIZE", 16))
+# A failover attempt started with less time than this left before the deadline cannot finish
+MIN_FAILOVER_TIME = 1.0
+
+_request_timing = threading.local()
+
+def on_request_sent(request):
+    _request_timing.sent_at = time.perf_counter()
+
+def on_response_headers(response):
+    """httpx hook, called once the response headers are in: time to first byte."""
+    sent_at = getattr(_request_timing, "sent_at", None)
+    if sent_at is not None:
+        metrics.current().record("network_ttfb_ms", (time.perf_counter() - sent_at) * 1000)
+
+def to_namespace(value):
+    """JSON response -> attribute access, shaped like the Groq SDK's response objects."""
+    if isinstance(value, dict):
+        return types.SimpleNamespace(**{key: to_namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [to_namespace(item) for item in value]
+    return value
+
+class BackendError(Exception):
+    """HTTP error of an OpenAI-compatible backend; carries status_code and response like the SDK errors."""
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        super().__init__(f"HTTP {response.status_code}: {response.text[:200]}")
+
+class CircuitBreaker:
+    """
+    Tracks the outcomes of a backend's recent calls. When the share of failed
+    or slow calls in the last `window` calls reaches `failure_rate` (after at
+    least `min_calls`), the circuit opens and the backend is skipped for
+    `cooldown` seconds. Then a single probe call is let through (half-open):
+    success closes the circuit, failure opens it again.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_rate=0.5, slow_call_seconds=20.0, window=20, min_calls=5, cooldown=30.0):
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.outcomes = deque(maxlen=window)
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            failure_rate=float(os.getenv("AUTOQA_BREAKER_FAILURE_RATE", 0.5)),
+            slow_call_seconds=float(os.getenv("AUTOQA_BREAKER_SLOW_CALL_MS", 20000)) / 1000,
+            window=int(os.getenv("AUTOQA_BREAKER_WINDOW", 20)),
+            min_calls=int(os.getenv("AUTOQA_BREAKER_MIN_CALLS", 5)),
+            cooldown=float(os.getenv("AUTOQA_BREAKER_COOLDOWN", 30)),
+        )
+
+    def allow(self):
+        """Whether a call may be sent now; in half-open state only one probe at a time is allowed."""
+        with self.lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self.probe_in_flight:
+                    return False
+                self.probe_in_flight = True
+            return True
+
+    def record(self, success, seconds):
+        with self.lock:
+            bad = not success or seconds > self.slow_call_seconds
+            if self.state == self.HALF_OPEN:
+                self.probe_in_flight = False
+                if bad:
+                    self._open()
+                else:
+                    self.state = self.CLOSED
+                    self.outcomes.clear()
+                return
+            self.outcomes.append(bad)
+            if len(self.outcomes) >= self.min_calls and sum(self.outcomes) / len(self.outcomes) >= self.failure_rate:
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {"state": self.state, "recent_calls": len(self.outcomes), "recent_failures": sum(self.outcomes)}
+
+class InferenceBackend(abc.ABC):
+    """
+    A chat completions provider with the model it serves for each route. Its
+    HTTP client (one size-limited connection pool) is created on first use
+    and shared by every evaluator of the process.
+    """
+
+    def __init__(self, name, models, api_key=None, base_url=None, max_connections=DEFAULT_POOL_SIZE, breaker=None):
+        self.name = name
+        self.models = dict(models)
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.breaker = breaker or CircuitBreaker.from_env()
+        self._client = None
+        self.client_lock = threading.Lock()
+
+    def model_for(self, route):
+        return self.models.get(route)
+
+    def http_options(self):
+        """Options of the pooled httpx client, with the time-to-first-byte hooks."""
+        import httpx
+        return {
+            "limits": httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            "event_hooks": {"request": [on_request_sent], "response": [on_response_headers]},
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self.client_lock:
+                if self._client is None:
+                    self._client = self.build_client()
+        return self._client
+
+    @abc.abstractmethod
+    def build_client(self):
+        """The provider's HTTP client, pooled as http_options() describes."""
+
+    @abc.abstractmethod
+    def create(self, messages, model, timeout, stream=False):
+        """A chat completion (or a stream of chunks) in the Groq SDK's response shape."""
+
+class GroqBackend(InferenceBackend):
+    """Groq through its SDK. Also serves the local stand-in (mock_groq.py) via base_url."""
+
+    def build_client(self):
+        from groq import DefaultHttpxClient, Groq
+        # Retries are handled by the evaluator's RetryPolicy, not by the SDK
+        return Groq(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            max_retries=0,
+            http_client=DefaultHttpxClient(**self.http_options()),
+        )
+
+    def create(self, messages, model, timeout, stream=False):
+        return self.client.chat.completions.create(messages=messages, model=model, timeout=timeout, stream=stream)
+
+class OpenAIStream:
+    """Chunks of a streamed OpenAI-compatible completion; close() drops the connection."""
+
+    def __init__(self, response):
+        self.response = response
+
+    def __iter__(self):
+        for line in self.response.iter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            yield to_namespace(json.loads(data))
+
+    def close(self):
+        self.response.close()
+
+class OpenAICompatibleBackend(InferenceBackend):
+    """Any endpoint speaking the OpenAI chat completions API (POST {base_url}/chat/completions)."""
+
+    def build_client(self):
+        import httpx
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        return httpx.Client(base_url=self.base_url, headers=headers, **self.http_options())
+
+    def create(self, messages, model, timeout, stream=False):
+        payload = {"model": model, "messages": messages, "stream": stream}
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        request = self.client.build_request("POST", "/chat/completions", json=payload, timeout=timeout)
+        response = self.client.send(request, stream=stream)
+        if response.status_code >= 400:
+            response.read()
+            response.close()
+            raise BackendError(response)
+        if stream:
+            return OpenAIStream(response)
+        return to_namespace(response.json())
+
+BACKEND_KINDS = {
+    "groq": GroqBackend,
+    "mock": GroqBackend,
+    "openai": OpenAICompatibleBackend,
+}
+
+class BackendRouter:
+    """
+    Sends each chat completion to the first backend, in priority order, that
+    serves the route and whose circuit is not open. Retryable errors (rate
+    limits, 5xx, timeouts) fail over to the next backend right away; if every
+    circuit is open the primary is tried anyway, since a slow answer beats none.
+    """
+
+    def __init__(self, backends):
+        if not backends:
+            raise ValueError("At least one inference backend is required")
+        self.backends = backends
+
+    def model_for(self, route):
+        """Model of the primary backend for a route (the one responses normally come from)."""
+        for backend in self.backends:
+            if backend.model_for(route):
+                return backend.model_for(route)
+        return None
+
+    def connect(self):
+        """Build every backend's client up front (e.g. during a cold start)."""
+        for backend in self.backends:
+            backend.client
+
+    def status(self):
+        return {backend.name: backend.breaker.snapshot() for backend in self.backends}
+
+    def create(self, messages, route, timeout, deadline=None, stream=False):
+        """
+        Returns (backend, model, response). Raises the last backend's error if
+        none of them answered.
+        """
+        serving = [backend for backend in self.backends if backend.model_for(route)]
+        if not serving:
+            raise ValueError(f"No inference backend serves the route {route!r}")
+
+        last_error = None
+        for backend in self.candidates(serving):
+            attempt_timeout = min(timeout, deadline.remaining()) if deadline else timeout
+            model = backend.model_for(route)
+            start = time.perf_counter()
+            try:
+                response = backend.create(messages, model, attempt_timeout, stream)
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                if not is_retryable(e):
+                    # The backend answered; the request itself is at fault
+                    backend.breaker.record(True, elapsed)
+                    raise
+                backend.breaker.record(False, elapsed)
+                last_error = e
+                if deadline and deadline.remaining() < MIN_FAILOVER_TIME:
+                    break
+                logging.warning(f"Backend {backend.name} failed with {type(e).__name__}; trying the next backend")
+                continue
+            backend.breaker.record(True, time.perf_counter() - start)
+            if backend is not serving[0]:
+                metrics.current().increment("backend_failovers")
+            return backend, model, response
+        raise last_error
+
+    def candidates(self, serving):
+        """
+        Backends to try in order. Lazy, so a half-open circuit only admits its
+        probe when the backends before it have actually failed.
+        """
+        tried = False
+        for backend in serving:
+            if backend.breaker.allow():
+                tried = True
+                yield backend
+        if not tried:
+            yield serving[0]
+
+def build_router_from_env():
+    """
+    Backends from AUTOQA_BACKENDS, a JSON list in priority order of
+    {"name", "kind": "groq" | "openai" | "mock", "base_url", "api_key_env",
+    "models": {route: model}, "max_connections"}. Without it, Groq alone
+    serves DEFAULT_ROUTES. AUTOQA_MODEL_<ROUTE> (e.g. AUTOQA_MODEL_BATCH)
+    overrides the primary backend's model for a route.
+    """
+    configs = json.loads(os.getenv("AUTOQA_BACKENDS") or "null") or [
+        {"name": "groq", "kind": "groq", "api_key_env": "GROQ_API", "models": DEFAULT_ROUTES},
+    ]
+    backends = []
+    for config in configs:
+        kind = config.get("kind", "groq")
+        if kind not in BACKEND_KINDS:
+            raise ValueError(f"Unknown inference backend kind {kind!r}")
+        base_url = config.get("base_url")
+        api_key = os.getenv(config["api_key_env"]) if config.get("api_key_env") else None
+        if kind == "mock":
+            base_url = base_url or "http://127.0.0.1:8008"
+            api_key = api_key or "mock"
+        backends.append(BACKEND_KINDS[kind](
+            name=config.get("name", kind),
+            models=config.get("models", DEFAULT_ROUTES),
+            api_key=api_key,
+            base_url=base_url,
+            max_connections=int(config.get("max_connections", DEFAULT_POOL_SIZE)),
+        ))
+
+    primary = backends[0]
+    for route in set(DEFAULT_ROUTES) | set(primary.models):
+        override = os.getenv(f"AUTOQA_MODEL_{route.upper()}")
+        if override:
+            primary.models[route] = override
+    return BackendRouter(backends)
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_router():
+    """The process-wide router, so all evaluators share the backends' connection pools."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = build_router_from_env()
+    return _router
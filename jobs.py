@@ -0,0 +1,295 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+class QueueMessage:
+    """A received queue message; `receipt_handle` deletes it once it has been handled."""
+
+    def __init__(self, message_id, body, receipt_handle, receive_count):
+        self.message_id = message_id
+        self.body = body
+        self.receipt_handle = receipt_handle
+        self.receive_count = receive_count
+
+class SQLiteJobQueue:
+    """
+    SQS-shaped queue in a local SQLite file, for local runs and tests. A
+    received message is hidden for `visibility_timeout` seconds and comes
+    back if it is not deleted by then (e.g. the worker crashed).
+    """
+
+    def __init__(self, path, visibility_timeout=900.0):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages (id TEXT PRIMARY KEY, body TEXT NOT NULL, visible_at REAL NOT NULL, "
+            "receive_count INTEGER NOT NULL DEFAULT 0, receipt_handle TEXT, sent_at REAL NOT NULL)"
+        )
+
+    def send_messages(self, bodies):
+        """Enqueue JSON-serializable bodies; returns their message ids."""
+        now = time.time()
+        rows = [(uuid.uuid4().hex, json.dumps(body), now, now) for body in bodies]
+        with self.lock:
+            self.conn.executemany("INSERT INTO messages (id, body, visible_at, sent_at) VALUES (?, ?, ?, ?)", rows)
+        return [row[0] for row in rows]
+
+    def receive_messages(self, max_messages=10):
+        """Up to `max_messages` visible messages, oldest first, hidden from other receivers until deleted or timed out."""
+        now = time.time()
+        with self.lock:
+            # BEGIN IMMEDIATE takes the write lock, so workers in other processes never receive the same message
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute(
+                    "SELECT id, body, receive_count FROM messages WHERE visible_at <= ? ORDER BY sent_at LIMIT ?",
+                    (now, max_messages),
+                ).fetchall()
+                messages = []
+                for message_id, body, receive_count in rows:
+                    receipt_handle = uuid.uuid4().hex
+                    self.conn.execute(
+                        "UPDATE messages SET visible_at = ?, receive_count = ?, receipt_handle = ? WHERE id = ?",
+                        (now + self.visibility_timeout, receive_count + 1, receipt_handle, message_id),
+                    )
+                    messages.append(QueueMessage(message_id, json.loads(body), receipt_handle, receive_count + 1))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return messages
+
+    def delete_messages(self, receipt_handles):
+        with self.lock:
+            self.conn.executemany("DELETE FROM messages WHERE receipt_handle = ?", [(handle,) for handle in receipt_handles])
+
+class SQLiteJobStore:
+    """DynamoDB-shaped store of job items ({"job_id", "status", ...}) in a local SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, item TEXT NOT NULL, expires_at REAL)")
+
+    def put_item(self, item):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, item, expires_at) VALUES (?, ?, ?)",
+                (item["job_id"], json.dumps(item), item.get("expires_at")),
+            )
+
+    def get_item(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT item, expires_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if not row or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def update_item(self, job_id, fields):
+        """Set `fields` on an existing item; a missing item is created from them."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT item FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                item = json.loads(row[0]) if row else {"job_id": job_id}
+                item.update(fields)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO jobs (job_id, item, expires_at) VALUES (?, ?, ?)",
+                    (job_id, json.dumps(item), item.get("expires_at")),
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+class SQSJobQueue:
+    """The same queue interface on Amazon SQS (boto3 is part of the Lambda runtime)."""
+    # SQS limit on messages per send/receive/delete call
+    MAX_BATCH = 10
+
+    def __init__(self, queue_url):
+        import boto3
+        self.queue_url = queue_url
+        self.client = boto3.client("sqs")
+
+    def send_messages(self, bodies):
+        message_ids = []
+        for start in range(0, len(bodies), self.MAX_BATCH):
+            entries = [
+                {"Id": str(index), "MessageBody": json.dumps(body)}
+                for index, body in enumerate(bodies[start:start + self.MAX_BATCH])
+            ]
+            response = self.client.send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            if response.get("Failed"):
+                raise RuntimeError(f"SQS rejected {len(response['Failed'])} messages: {response['Failed'][0].get('Message')}")
+            by_id = {entry["Id"]: entry["MessageId"] for entry in response.get("Successful", [])}
+            message_ids.extend(by_id[entry["Id"]] for entry in entries)
+        return message_ids
+
+    def receive_messages(self, max_messages=10):
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, self.MAX_BATCH),
+            AttributeNames=["ApproximateReceiveCount"],
+        )
+        return [
+            QueueMessage(
+                message["MessageId"], json.loads(message["Body"]), message["ReceiptHandle"],
+                int(message.get("Attributes", {}).get("ApproximateReceiveCount", 1)),
+            )
+            for message in response.get("Messages", [])
+        ]
+
+    def delete_messages(self, receipt_handles):
+        for start in range(0, len(receipt_handles), self.MAX_BATCH):
+            entries = [
+                {"Id": str(index), "ReceiptHandle": handle}
+                for index, handle in enumerate(receipt_handles[start:start + self.MAX_BATCH])
+            ]
+            self.client.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+
+class DynamoDBJobStore:
+    """
+    The same store interface on a DynamoDB table keyed by job_id. Results are
+    stored as JSON strings, since DynamoDB does not accept float numbers; set
+    `expires_at` as the table's TTL attribute to expire old jobs.
+    """
+
+    def __init__(self, table_name):
+        import boto3
+        self.table = boto3.resource("dynamodb").Table(table_name)
+
+    @staticmethod
+    def _encode(fields):
+        return {key: json.dumps(value) if key == "result" else value for key, value in fields.items()}
+
+    def put_item(self, item):
+        self.table.put_item(Item=self._encode(item))
+
+    def get_item(self, job_id):
+        item = self.table.get_item(Key={"job_id": job_id}).get("Item")
+        if not item:
+            return None
+        if "result" in item:
+            item["result"] = json.loads(item["result"])
+        # Numbers come back as Decimal
+        return {key: int(value) if key.endswith("_at") else value for key, value in item.items()}
+
+    def update_item(self, job_id, fields):
+        fields = self._encode(fields)
+        names = {f"#f{index}": key for index, key in enumerate(fields)}
+        values = {f":v{index}": value for index, value in enumerate(fields.values())}
+        self.table.update_item(
+            Key={"job_id": job_id},
+            UpdateExpression="SET " + ", ".join(f"#f{index} = :v{index}" for index in range(len(fields))),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+class JobService:
+    """
+    Submit/poll evaluation jobs: submit() stores a queued job per transcript
+    and enqueues it, get() returns a job's status and, once done, its result.
+    Workers receive() queued jobs in batches and complete() them.
+    """
+
+    def __init__(self, queue, store, ttl=7 * 24 * 3600, max_receives=3):
+        self.queue = queue
+        self.store = store
+        self.ttl = ttl
+        # A job received this many times without completing (e.g. its worker keeps timing out) is failed
+        self.max_receives = max_receives
+
+    def submit(self, transcripts):
+        """Queue one job per transcript; returns their job ids in order."""
+        now = int(time.time())
+        job_ids = [uuid.uuid4().hex for _ in transcripts]
+        for job_id in job_ids:
+            self.store.put_item({"job_id": job_id, "status": QUEUED, "created_at": now, "updated_at": now, "expires_at": now + self.ttl})
+        try:
+            self.queue.send_messages([
+                {"job_id": job_id, "transcript": transcript} for job_id, transcript in zip(job_ids, transcripts)
+            ])
+        except Exception as e:
+            # Jobs left "queued" would never run; fail them so nothing polls them forever
+            logging.error(f"Could not enqueue {len(job_ids)} jobs: {e}")
+            for job_id in job_ids:
+                self.store.update_item(job_id, {"status": FAILED, "error": f"Job could not be queued: {e}", "updated_at": int(time.time())})
+            raise
+        return job_ids
+
+    def get(self, job_id):
+        return self.store.get_item(job_id)
+
+    def receive(self, max_messages=10):
+        """Queued messages to evaluate; messages past `max_receives` fail their job instead."""
+        messages = []
+        for message in self.queue.receive_messages(max_messages):
+            if message.receive_count > self.max_receives:
+                logging.error(f"Job {message.body.get('job_id')} was received {message.receive_count} times; failing it.")
+                self.complete(message, error="Job did not complete after repeated attempts.")
+                continue
+            self.start(message)
+            messages.append(message)
+        return messages
+
+    def start(self, message):
+        self.store.update_item(message.body["job_id"], {"status": RUNNING, "updated_at": int(time.time())})
+
+    def complete(self, message, result=None, error=None, delete=True):
+        """Store a job's result (or error). `delete` is off when the queue deletes handled messages itself (SQS triggers)."""
+        fields = {"status": FAILED if error else DONE, "updated_at": int(time.time())}
+        if error:
+            fields["error"] = error
+        else:
+            fields["result"] = result
+        self.store.update_item(message.body["job_id"], fields)
+        if delete:
+            self.queue.delete_messages([message.receipt_handle])
+
+def build_job_service_from_env():
+    """
+    Queue and store from AUTOQA_JOB_QUEUE: "sqlite" (default; both in the
+    file AUTOQA_JOB_DB) or "sqs" (the queue at AUTOQA_JOB_QUEUE_URL and the
+    DynamoDB table AUTOQA_JOB_TABLE).
+    """
+    kind = os.getenv("AUTOQA_JOB_QUEUE", "sqlite")
+    if kind == "sqs":
+        queue = SQSJobQueue(os.environ["AUTOQA_JOB_QUEUE_URL"])
+        store = DynamoDBJobStore(os.environ["AUTOQA_JOB_TABLE"])
+    elif kind == "sqlite":
+        path = os.getenv("AUTOQA_JOB_DB", "/tmp/autoqa_jobs.sqlite")
+        queue = SQLiteJobQueue(path, visibility_timeout=float(os.getenv("AUTOQA_JOB_VISIBILITY_TIMEOUT", 900)))
+        store = SQLiteJobStore(path)
+    else:
+        raise ValueError(f"Unknown job queue {kind!r}")
+    return JobService(queue, store, ttl=int(os.getenv("AUTOQA_JOB_TTL", 7 * 24 * 3600)))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local worker: evaluates queued jobs with lambda_function.worker_handler.")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("AUTOQA_WORKER_BATCH", 10)), help="Jobs received per batch.")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+    parser.add_argument("--once", action="store_true", help="Drain the queue and exit.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    import lambda_function
+
+    args = parse_args()
+    lambda_function.load_env()
+    while True:
+        response = lambda_function.worker_handler({"max_messages": args.batch_size}, None)
+        if not response.get("processed"):
+            if args.once:
+                break
+            time.sleep(args.poll_interval)
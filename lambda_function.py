@@ -2,11 +2,104 @@ import json
 import logging
 import os
 import re
-from groq import Groq
-from dotenv import load_dotenv
+import contextvars
+import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cascade import ModelCascade
+from eval_cache import build_cache_from_env, hash_text, make_cache_key
+from hedging import Hedger
+from inference_backends import get_router
+import metrics
+from llm_json import PARSE_STATS, RUBRIC_SCHEMA, IncrementalObjectParser, normalize_fatal, parse_evaluation, validate_category, validate_evaluation
+from near_duplicates import NearDuplicateIndex
+from rate_limiter import EXPECTED_COMPLETION_TOKENS
+from retry_policy import Deadline, RetryPolicy
+from rubric import Rubric
+from split_evaluation import SplitEvaluator
+from token_estimates import estimate_tokens
+from transcript_chunking import chunk_transcript
+from transcript_compaction import build_compactor_from_env
+from transcript_packing import build_packed_prompt, split_packed_output
 
-# Load environment variables
-load_dotenv()
+# Limits for batch requests ({"transcripts": [{id, transcript}, ...]})
+MAX_BATCH_SIZE = int(os.getenv("AUTOQA_MAX_BATCH_SIZE", 50))
+MAX_CONCURRENCY = int(os.getenv("AUTOQA_MAX_CONCURRENCY", 4))
+
+# Queued jobs a worker invocation evaluates together when it pulls from the queue itself
+WORKER_BATCH_SIZE = int(os.getenv("AUTOQA_WORKER_BATCH", 10))
+
+# Upper bound for a single Groq request, in seconds (further capped by the invocation deadline)
+REQUEST_TIMEOUT = float(os.getenv("AUTOQA_REQUEST_TIMEOUT", 60))
+
+# Rubric items scored locally from timestamps (see timing_engine) instead of by the LLM
+TIMING_RUBRIC_ITEMS = {
+    "Opening": "First response given within defined timeframe",
+    "Communication skills": "Timely response",
+}
+
+# Context windows of the models we use; prompts that would not fit are condensed by map-reduce
+MODEL_CONTEXT_WINDOWS = {
+    "llama3-70b-8192": 8192,
+    "llama-3.1-8b-instant": 131072,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+# Tokens kept free for the rubric JSON completion (scores, reasoning and summary)
+COMPLETION_TOKEN_RESERVE = 1500
+MAP_REDUCE_MAX_ROUNDS = 2
+MAP_REDUCE_CONCURRENCY = int(os.getenv("AUTOQA_MAP_CONCURRENCY", 4))
+
+CHUNK_SUMMARY_PROMPT = """
+            The following is part {index} of {total} of a conversation between a customer and a support agent.
+            It will be scored later for agent quality, so summarize it in at most {max_words} words while keeping:
+                - the timestamps of customer and agent messages, assignments, reopen and resolve events
+                - the agent's opening statement and closing statement, quoted verbatim
+                - apologies or empathy, probing questions, product guidance, links, screenshots and steps shared
+                - internal notes and information passed to other departments
+                - spelling mistakes, unprofessional language, incorrect information and actions taken without permission
+
+            Return only the summary text.
+
+            Conversation part:
+            {chunk}
+        """
+
+# Module-level evaluator and job service, reused across warm invocations of the same container
+_evaluator = None
+_job_service = None
+_live_sessions = None
+_env_loaded = False
+
+def load_env():
+    """Load the .env file once per container (python-dotenv is imported on first use)."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    _env_loaded = True
+
+def get_evaluator():
+    """
+    Return the container-wide ChatAgentEvaluator, building it on first use.
+    Reusing it keeps the backends' HTTP connection pools (and their TLS
+    sessions) alive across warm invocations.
+    """
+    global _evaluator
+    if _evaluator is None:
+        load_env()
+        _evaluator = ChatAgentEvaluator()
+    return _evaluator
+
+def get_job_service():
+    """Return the container-wide JobService (queue and store of async jobs), building it on first use."""
+    global _job_service
+    if _job_service is None:
+        load_env()
+        from jobs import build_job_service_from_env
+        _job_service = build_job_service_from_env()
+    return _job_service
 
 def is_allowed_origin(origin):
     """
@@ -21,31 +114,114 @@ def is_allowed_origin(origin):
     localhost_pattern = r"^http://localhost(:\d+)?$"
     return re.match(pattern, origin) or re.match(localhost_pattern, origin)
 
+class TokenMeter:
+    """Tokens the API reported for one evaluation's requests, added up from every thread that makes them."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = 0
+
+    def add(self, tokens):
+        with self.lock:
+            self.tokens += tokens
+
 class ChatAgentEvaluator:
     def __init__(self):
-        self.groq_client = Groq(api_key=os.getenv("GROQ_API"))
-        self.model_id = 'llama-3.1-8b-instant'
+        # Inference backends are shared by all evaluators; the route picks the model
+        self.router = get_router()
+        self.route = "realtime"
+        self.model_id = self.router.model_for(self.route)
+        self.cache = build_cache_from_env()
+        self.near_duplicates = NearDuplicateIndex.from_env()
+        self.compactor = build_compactor_from_env()
+        self.retry_policy = RetryPolicy.from_env()
+        # RateLimiter every API request waits for (set by batch runs), or None
+        self.limiter = None
+        self.hedger = Hedger.from_env()
+        self.cascade = ModelCascade.from_env()
+        self._cheap_tier = None
+        # One concurrent prompt per rubric section instead of one monolithic prompt, when on
+        self.splitter = SplitEvaluator.from_env()
+        # Points, weights and fatal policy used to total the LLM's item scores
+        self.rubric = Rubric.from_env()
+        # LLM calls per evaluation when the output cannot be parsed
+        self.max_parse_attempts = 3
+        self.local_timing = os.getenv("AUTOQA_LOCAL_TIMING", "on") != "off"
+        self._timing_engine = None
+        # Per-thread details of the last evaluation (e.g. cache status), read back by the handler
+        self.call_state = threading.local()
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-    def call_groq_inference(self, input_text: str):
-        """Function to call Groq for LLM inference and return token usage from API."""
+    @property
+    def timing_engine(self):
+        """TimingEngine, created (and pandas imported) on first use."""
+        if self._timing_engine is None:
+            from timing_engine import TimingEngine
+            self._timing_engine = TimingEngine()
+        return self._timing_engine
+
+    def acquire_request(self, input_text):
+        """Wait for one request and the estimated tokens of `input_text` from the rate limiter; returns the estimate."""
+        if not self.limiter:
+            return 0
+        estimated_tokens = estimate_tokens(input_text) + EXPECTED_COMPLETION_TOKENS
+        self.limiter.acquire(estimated_tokens)
+        return estimated_tokens
+
+    def record_request_usage(self, estimated_tokens, usage):
+        """
+        Reconcile the rate limiter with a request's usage and add it to the
+        evaluation's TokenMeter; without usage the request never reached the API.
+        """
+        if self.limiter:
+            self.limiter.record_usage(estimated_tokens, usage.total_tokens if usage else 0)
+        meter = getattr(self.call_state, "meter", None)
+        if meter and usage:
+            meter.add(usage.total_tokens)
+
+    def call_groq_inference(self, input_text: str, validate=None):
+        """
+        Call the inference backends (Groq unless configured otherwise) and return
+        the output and token usage. With hedging on, `validate(output)` decides
+        which of two hedged outputs is usable.
+        """
         if not self.model_id or not input_text:
             raise ValueError("Both model_id and input_text must be provided")
+        if self.hedger:
+            return self.hedged_inference(input_text, validate)
+
+        deadline = getattr(self.call_state, "deadline", None)
+
+        def create_completion():
+            # Every attempt of the retry policy is a request of its own for the rate limiter
+            estimated_tokens = self.acquire_request(input_text)
+            try:
+                # The router caps each request's timeout by the time left before the deadline
+                backend, model, response = self.router.create(
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "you are a experienced helpful QA assistant."
+                        },
+                        {
+                            "role": "user",
+                            "content": input_text,
+                        }
+                    ],
+                    route=self.route,
+                    timeout=REQUEST_TIMEOUT,
+                    deadline=deadline,
+                )
+            except Exception:
+                self.record_request_usage(estimated_tokens, None)
+                raise
+            self.record_request_usage(estimated_tokens, getattr(response, "usage", None))
+            self.call_state.backend = {"name": backend.name, "model": model}
+            return response
 
         try:
-            chat_completion = self.groq_client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "you are a experienced helpful QA assistant."
-                    },
-                    {
-                        "role": "user",
-                        "content": input_text,
-                    }
-                ],
-                model=self.model_id,
-            )
+            with metrics.stage("network_total"):
+                chat_completion = self.retry_policy.call(create_completion, deadline)
             content = chat_completion.choices[0].message.content
             # Extract token usage from the API response
             token_usage = {
@@ -58,17 +234,73 @@ class ChatAgentEvaluator:
             logging.error(f"Unexpected error during Groq inference: {e}")
             return None, None
 
+    def hedged_inference(self, input_text, validate=None):
+        """
+        Streamed completion raced against a hedge request when it is slow (see
+        hedging.Hedger). Streaming lets the losing request be cancelled by
+        closing its HTTP stream.
+        """
+        deadline = getattr(self.call_state, "deadline", None)
+        untimed = getattr(self.call_state, "untimed", False)
+        meter = getattr(self.call_state, "meter", None)
+
+        def attempt(route, cancel):
+            # Runs on a hedging thread, which has its own call_state
+            self.call_state.deadline = deadline
+            self.call_state.untimed = untimed
+            self.call_state.meter = meter
+            self.call_state.backend = None
+            parts, token_usage = [], None
+            stream = self.stream_groq_inference(input_text, route)
+            try:
+                for delta, usage in stream:
+                    if cancel.is_set():
+                        break
+                    parts.append(delta)
+                    token_usage = usage or token_usage
+            finally:
+                stream.close()
+            content = "".join(parts)
+            tokens = token_usage["total_tokens"] if token_usage else estimate_tokens(input_text) + estimate_tokens(content)
+            return content, tokens, (token_usage, self.call_state.backend)
+
+        try:
+            # Wall time of the race, as call_groq_inference times its single request with retries
+            with metrics.stage("network_total"):
+                content, _, (token_usage, backend) = self.hedger.run(attempt, self.route, validate or bool)
+        except Exception as e:
+            logging.error(f"Unexpected error during hedged inference: {e}")
+            return None, None
+        self.call_state.backend = backend
+        return content, token_usage
+
+    def scores_timing_locally(self):
+        """
+        Whether this thread's transcript has its time-based items scored
+        locally: local timing is on and its timestamps could be parsed.
+        """
+        return self.local_timing and not getattr(self.call_state, "untimed", False)
+
+    def excluded_items(self):
+        """Rubric items the LLM is not asked for, since they are scored locally."""
+        return tuple(TIMING_RUBRIC_ITEMS.values()) if self.scores_timing_locally() else ()
+
+    def is_valid_evaluation(self, output):
+        """Whether an output parses into a valid evaluation (without counting it in PARSE_STATS)."""
+        return parse_evaluation(output, excluded_items=self.excluded_items(), stats=None)[0] is not None
+
+    def hedge_metadata(self):
+        """Container-wide hedging counters (win rate, extra tokens), or None when hedging is off."""
+        return self.hedger.stats() if self.hedger else None
+
     def count_tokens(self, text=None, usage=None):
         """Return token count from API usage if provided, else fallback to heuristic."""
         if usage and isinstance(usage, dict) and "total_tokens" in usage:
             return usage["total_tokens"]
-        if not text:
-            return 0
-        len_ = len(text)
-        return int((len_ * 1.15) * (3/4))
+        return estimate_tokens(text)
 
-    def analyze_customer_sentiment_and_responses(self, transcript):
-        """Analyzes the transcript to extract sentiment and response relevance."""
+    def build_prompt(self, transcript):
+        """Build the rubric prompt for a formatted transcript."""
         prompt = f"""
             You are tasked with evaluating a conversation between a customer and an agent. Your job is to assess the agent's performance across 
             various categories and provide a score for each sub-parameter based on how well the agent followed best practices, responded to the 
@@ -163,8 +395,191 @@ class ChatAgentEvaluator:
             Transcript: 
             {transcript}
         """
+        if self.scores_timing_locally():
+            # Time-based items are scored from timestamps; drop their description and JSON lines
+            split_at = prompt.rindex(transcript)
+            rubric = "\n".join(
+                line for line in prompt[:split_at].split("\n")
+                if not any(item in line for item in TIMING_RUBRIC_ITEMS.values())
+            )
+            prompt = rubric + prompt[split_at:]
+        return prompt
+
+    def rubric_prompt(self):
+        """The rubric prompt up to (not including) its transcript, for packed prompts."""
+        prompt = self.build_prompt("")
+        return prompt[:prompt.rindex("Transcript:")]
+
+    def prompt_hash(self):
+        """Version of the rubric prompt (and of the section prompts in split mode), used in evaluation cache keys."""
+        prompt = self.build_prompt("{transcript}")
+        if self.splitter:
+            prompt += self.splitter.version(self)
+        return hash_text(prompt)
+
+    def cache_metadata(self):
+        """Cache status of this thread's last evaluation plus the container-wide hit/miss counters."""
+        metadata = {"status": getattr(self.call_state, "cache_status", "off")}
+        if self.cache:
+            metadata.update(self.cache.stats())
+        return metadata
+
+    def near_duplicate_of(self, transcript_text):
+        """
+        A near-duplicate match of a transcript that missed the cache, or None.
+        Sets this thread's near-duplicate status; in "reuse" mode the match's
+        llm_response is a flagged copy of the stored evaluation.
+        """
+        self.call_state.near_duplicate = None
+        if not self.near_duplicates:
+            return None
+        with metrics.stage("near_duplicate_lookup"):
+            match = self.near_duplicates.find(transcript_text, f"{self.model_id}:{self.prompt_hash()}")
+        if not match:
+            return None
+        metrics.current().increment("near_duplicate_matches")
+        flag = {"mode": self.near_duplicates.mode, "similarity": match["similarity"], "source": match["key"]}
+        self.call_state.near_duplicate = flag
+        if self.near_duplicates.mode == "reuse":
+            match["llm_response"] = dict(match["llm_response"], NearDuplicate=flag)
+        return match
+
+    def index_evaluation(self, transcript_text, llm_response, input_token_count, output_token_count):
+        """Make a fresh evaluation available to later near-duplicates of its transcript."""
+        if self.near_duplicates and self.served_by_primary_model():
+            self.near_duplicates.add(
+                hash_text(transcript_text), transcript_text, f"{self.model_id}:{self.prompt_hash()}",
+                llm_response, input_token_count, output_token_count,
+            )
+
+    def near_duplicate_metadata(self):
+        """Near-duplicate match of this thread's last evaluation plus the container-wide index stats."""
+        if not self.near_duplicates:
+            return None
+        return {"match": getattr(self.call_state, "near_duplicate", None), **self.near_duplicates.stats()}
+
+    def served_by_primary_model(self):
+        """
+        Whether this thread's last completion came from self.model_id. Answers
+        of a failover model are not cached under the primary model's key.
+        """
+        backend = getattr(self.call_state, "backend", None)
+        return not backend or backend["model"] == self.model_id
+
+    def context_window(self):
+        return MODEL_CONTEXT_WINDOWS.get(self.model_id, DEFAULT_CONTEXT_WINDOW)
+
+    def context_budget(self):
+        """Prompt tokens the model accepts once room for the completion is reserved."""
+        return self.context_window() - COMPLETION_TOKEN_RESERVE
+
+    def summarize_chunk(self, chunk, index, total, max_words):
+        """Map step: summarize one chunk of a long transcript. Returns (summary, token_usage)."""
+        prompt = CHUNK_SUMMARY_PROMPT.format(index=index, total=total, max_words=max_words, chunk=chunk)
+        return self.call_groq_inference(prompt)
+
+    def condense_transcript(self, transcript):
+        """
+        Map-reduce a transcript that does not fit the model's context window:
+        split it on conversation boundaries, summarize the chunks in parallel and
+        join the summaries into a digest that the final scoring prompt can hold.
+        Returns (digest, input_tokens, output_tokens) spent on the summaries.
+        """
+        transcript_budget = self.context_budget() - estimate_tokens(self.build_prompt(""))
+        chunk_budget = self.context_budget() - estimate_tokens(CHUNK_SUMMARY_PROMPT)
+        input_tokens = output_tokens = 0
+
+        for round_number in range(1, MAP_REDUCE_MAX_ROUNDS + 1):
+            chunks = chunk_transcript(transcript, chunk_budget)
+            # Words per summary so that all summaries together fit the scoring prompt
+            max_words = max(50, int(transcript_budget * 0.75 / len(chunks) * 0.8))
+            logging.info(f"Map-reduce round {round_number}: {len(chunks)} chunks, {max_words} words per summary")
+
+            deadline = getattr(self.call_state, "deadline", None)
+            meter = getattr(self.call_state, "meter", None)
+
+            def summarize(numbered):
+                # Worker threads have their own call_state; carry the invocation deadline and token meter over
+                self.call_state.deadline = deadline
+                self.call_state.meter = meter
+                return self.summarize_chunk(numbered[1], numbered[0] + 1, len(chunks), max_words)
+
+            with ThreadPoolExecutor(max_workers=max(1, min(MAP_REDUCE_CONCURRENCY, len(chunks)))) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, summarize, numbered) for numbered in enumerate(chunks)]
+                results = [future.result() for future in futures]
+
+            summaries = []
+            for index, (summary, token_usage) in enumerate(results):
+                if token_usage:
+                    input_tokens += token_usage.get("prompt_tokens", 0)
+                    output_tokens += token_usage.get("completion_tokens", 0)
+                # A failed summary keeps the raw chunk; the next round or the final cut deals with it
+                summaries.append(f"Part {index + 1} of {len(chunks)}:\n{summary.strip() if summary else chunks[index]}")
+            transcript = "\n\n".join(summaries)
+            if estimate_tokens(transcript) <= transcript_budget:
+                return transcript, input_tokens, output_tokens
+
+        logging.warning("Condensed transcript still exceeds the context window; truncating it.")
+        return transcript[:int(transcript_budget * 3.5)], input_tokens, output_tokens
+
+    def analyze_customer_sentiment_and_responses(self, transcript):
+        """Analyzes the transcript to extract sentiment and response relevance."""
+        with metrics.stage("prompt_build"):
+            prompt = self.build_prompt(transcript)
+
+        cache_key = None
+        self.call_state.cache_status = "off"
+        self.call_state.parse_status = None
+        self.call_state.backend = None
+        self.call_state.near_duplicate = None
+        self.call_state.split = None
+        if self.cache:
+            with metrics.stage("cache_lookup"):
+                cache_key = make_cache_key(transcript, self.model_id, self.prompt_hash())
+                cached = self.cache.get(cache_key)
+            if cached:
+                self.call_state.cache_status = "hit"
+                metrics.current().increment("cache_hits")
+                return cached["llm_response"], cached["input_tokens"], cached["output_tokens"]
+            self.call_state.cache_status = "miss"
+            metrics.current().increment("cache_misses")
+
+        # Templated tickets: reuse a near-identical ticket's evaluation, or anchor the prompt with it
+        near_duplicate = self.near_duplicate_of(transcript)
+        if near_duplicate and self.near_duplicates.mode == "reuse":
+            return near_duplicate["llm_response"], 0, 0
+
+        # Pre-flight: condense transcripts whose prompt would overflow the context window
+        map_input_tokens = map_output_tokens = 0
+        prompt_transcript = transcript
+        if estimate_tokens(prompt) > self.context_budget():
+            logging.info(f"Prompt of ~{estimate_tokens(prompt)} tokens exceeds the {self.model_id} budget; condensing transcript.")
+            with metrics.stage("map_reduce"):
+                prompt_transcript, map_input_tokens, map_output_tokens = self.condense_transcript(transcript)
+            prompt = self.build_prompt(prompt_transcript)
+        reference = self.near_duplicates.reference_prompt(near_duplicate) if near_duplicate else ""
+        prompt += reference
+
+        if self.splitter:
+            with metrics.stage("split_sections"):
+                parsed, input_token_count, output_token_count, statuses = self.splitter.evaluate(self, transcript, prompt_transcript, reference)
+            self.call_state.split = statuses
+            self.call_state.parse_status = "failed" if parsed is None else "clean"
+            input_token_count += map_input_tokens
+            output_token_count += map_output_tokens
+            if parsed:
+                # As with single prompts, answers of a failover model are not cached under the primary model's key
+                if cache_key and "failover" not in statuses.values():
+                    self.cache.put(cache_key, {
+                        "llm_response": parsed,
+                        "input_tokens": input_token_count,
+                        "output_tokens": output_token_count
+                    })
+                self.index_evaluation(transcript, parsed, input_token_count, output_token_count)
+            return parsed, input_token_count, output_token_count
+
         input_token_count = 0
-        max_attempts = 3
+        max_attempts = self.max_parse_attempts
         attempt = 0
         result = None
         parsed = None
@@ -174,164 +589,824 @@ class ChatAgentEvaluator:
         while attempt < max_attempts:
             try:
                 # Get both result and token usage from the API call
-                result, output_token_usage = self.call_groq_inference(prompt)
+                metrics.current().increment("llm_attempts")
+                result, output_token_usage = self.call_groq_inference(prompt, validate=self.is_valid_evaluation)
                 if output_token_usage:
-                    input_token_count = output_token_usage.get("prompt_tokens", 0)
-                    output_token_count = output_token_usage.get("completion_tokens", 0)
+                    input_token_count = map_input_tokens + output_token_usage.get("prompt_tokens", 0)
+                    output_token_count = map_output_tokens + output_token_usage.get("completion_tokens", 0)
                 else:
-                    input_token_count = 0
-                    output_token_count = 0
+                    input_token_count = map_input_tokens
+                    output_token_count = map_output_tokens
                 if result:
-                    parsed = self.parse_llm_output(result)
+                    with metrics.stage("parse"):
+                        parsed = self.parse_llm_output(result)
                     if parsed:
+                        if cache_key and self.served_by_primary_model():
+                            self.cache.put(cache_key, {
+                                "llm_response": parsed,
+                                "input_tokens": input_token_count,
+                                "output_tokens": output_token_count
+                            })
+                        self.index_evaluation(transcript, parsed, input_token_count, output_token_count)
                         return parsed, input_token_count, output_token_count
                     else:
                         logging.warning(f"Attempt {attempt+1}: Failed to parse LLM output.")
                 else:
+                    # Transport errors were already retried by the retry policy; a new attempt would repeat them
                     logging.warning(f"Attempt {attempt+1}: No result returned from LLM.")
+                    break
             except Exception as e:
                 logging.error(f"Error during sentiment analysis (attempt {attempt+1}): {e}")
             attempt += 1
+            deadline = getattr(self.call_state, "deadline", None)
+            if deadline and deadline.expired():
+                logging.warning("Invocation deadline reached; giving up on re-parsing attempts.")
+                break
 
         # If all attempts fail
         return None, input_token_count, output_token_count
 
     def parse_llm_output(self, output):
-        """Extract key values from the LLM response."""
-
-        if "```" in output:
-            output = output.split("```")[1]
-        
-        if output[-1] != '}':
-            if output[-1] == '"':
-                output += "}"
-            else:
-                output += '"}' 
-        try:
-            response_data = json.loads(output)  # Use json.loads for safer parsing
-            return response_data
-        except json.JSONDecodeError as e:
-            logging.error(f"Error parsing LLM output: {str(e)}")
-            return None
+        """Extract key values from the LLM response, repairing common JSON defects and validating the rubric."""
+        parsed, status = parse_evaluation(output, excluded_items=self.excluded_items())
+        self.call_state.parse_status = status
+        return parsed
+
+    def parse_metadata(self):
+        """Parse status of this thread's last evaluation plus the container-wide clean/repaired/failed counters."""
+        metadata = {"status": getattr(self.call_state, "parse_status", None)}
+        metadata.update(PARSE_STATS.snapshot())
+        return metadata
 
     def calculate_score(self, llm_response):
-        """Calculate the score based on the LLM response."""
+        """Calculate the category and total scores of an LLM response under the rubric (see rubric.py)."""
         try:
-            # Extract the scores from the LLM response
-            # 1. Opening (max score: 15 points)
-            opening_score = llm_response.get('Opening', {})
-            opening_score_value = sum({key: value for key, value in opening_score.items() if key != "Reasoning"}.values())
-
-            # 2. Communication Skills (max score: 20 points)
-            communication_score = llm_response.get('Communication skills', {})
-            communication_score_value = sum({key: value for key, value in communication_score.items() if key != "Reasoning"}.values())
-
-            # 3. Chat Handling (max score: 25 points)
-            chat_handling_score = llm_response.get('Chat Handling', {})
-            chat_handling_score_value = sum({key: value for key, value in chat_handling_score.items() if key != "Reasoning"}.values())
-
-            # 4. Product Knowledge (max score: 40 points)
-            product_knowledge_score = llm_response.get('Product Knowledge', {})
-            product_knowledge_score_value = sum({key: value for key, value in product_knowledge_score.items() if key != "Reasoning"}.values())
-
-            # 5. Fatal (Zero Tolerance)
-            fatal_error_score = llm_response.get('Fatal', "no")
-            if fatal_error_score == "yes":
-                fatal_error_score = 0
-            else:
-                fatal_error_score = 1
-            
-            # Calculate the total score
-            total_score = (opening_score_value + communication_score_value + chat_handling_score_value + product_knowledge_score_value) * fatal_error_score
-
-            overall_scores = {
-                "Opening Score": opening_score_value,
-                "Communication Skills Score": communication_score_value,
-                "Chat Handling Score": chat_handling_score_value,
-                "Product Knowledge Score": product_knowledge_score_value,
-                "Fatal Error": "No" if fatal_error_score == 1 else "Yes",
-                "Total Score": total_score,
-            }
+            overall_scores = self.rubric.score(llm_response)
             return overall_scores, llm_response.get('Summary', ''), llm_response.get('Sentiment', '')
         except Exception as e:
             logging.error(f"Error calculating score: {e}")
             return None, '', ''
 
-    def evaluate_conversation(self, transcript):
-        """Evaluate the conversation using the LLM."""
+    def cheap_tier(self):
+        """
+        This evaluator on the cascade's cheap route. It shares the cache, router
+        and call state; a result it cannot parse is escalated, not retried.
+        """
+        if self._cheap_tier is None:
+            tier = copy.copy(self)
+            tier.route = self.cascade.cheap_route
+            tier.model_id = self.router.model_for(tier.route)
+            tier.cascade = None
+            tier.max_parse_attempts = 1
+            self._cheap_tier = tier
+        return self._cheap_tier
+
+    def analyze_with_cascade(self, transcript_text, timing=None):
+        """
+        analyze_customer_sentiment_and_responses, through the model cascade when
+        it is on: the cheap tier first, this evaluator's model only for results
+        the cascade considers doubtful. Token counts include both tiers.
+        """
+        if not self.cascade or self.cascade.cheap_route == self.route:
+            return self.analyze_customer_sentiment_and_responses(transcript_text)
+
+        start = time.perf_counter()
+        with metrics.stage("cascade_cheap"):
+            cheap, input_token_count, output_token_count = self.cheap_tier().analyze_customer_sentiment_and_responses(transcript_text)
+        self.cascade.record_tier(self.cascade.cheap_route, time.perf_counter() - start, input_token_count + output_token_count)
+
+        total_score = None
+        if cheap:
+            merged = self.merge_timing_scores(cheap, timing) if timing else cheap
+            total_scores, _, _ = self.calculate_score(merged)
+            total_score = total_scores["Total Score"] if total_scores else None
+        reasons = self.cascade.escalation_reasons(cheap, total_score)
+        self.call_state.cascade = {"tier": self.cascade.cheap_route, "escalation_reasons": reasons}
+        if not reasons:
+            return cheap, input_token_count, output_token_count
+
+        logging.info(f"Escalating to {self.model_id}: {', '.join(reasons)}")
+        self.cascade.record_escalation(reasons)
+        metrics.current().increment("cascade_escalations")
+        start = time.perf_counter()
+        with metrics.stage("cascade_full"):
+            full, full_input_tokens, full_output_tokens = self.analyze_customer_sentiment_and_responses(transcript_text)
+        self.cascade.record_tier(self.route, time.perf_counter() - start, full_input_tokens + full_output_tokens)
+        input_token_count += full_input_tokens
+        output_token_count += full_output_tokens
+        if full:
+            self.call_state.cascade["tier"] = self.route
+            return full, input_token_count, output_token_count
+        # The larger model failed too; a valid cheap result is better than none
+        return cheap, input_token_count, output_token_count
+
+    def split_metadata(self):
+        """Status of each section of this thread's last split evaluation (ok, retried, hit, failover, skipped, failed), or None."""
+        if not self.splitter:
+            return None
+        return getattr(self.call_state, "split", None)
+
+    def cascade_metadata(self):
+        """Tier and escalation reasons of this thread's last evaluation plus the container-wide cascade stats."""
+        if not self.cascade:
+            return None
+        metadata = dict(getattr(self.call_state, "cascade", None) or {})
+        metadata.update(self.cascade.stats())
+        return metadata
+
+    def format_transcript(self, transcript):
+        """Convert a list of transcript entries to text; raw text exports are used as-is."""
+        if isinstance(transcript, str):
+            return transcript.strip()
+        return "\n".join([f"{entry['timestamp']} - {entry['user']} - {entry['message']}" for entry in transcript])
+
+    def compact_transcript(self, transcript_text):
+        """Strip system events and bot boilerplate before prompting; records token savings per thread."""
+        self.call_state.compaction = None
+        if not self.compactor:
+            return transcript_text
+        compacted_text, stats = self.compactor.compact(transcript_text)
+        logging.info(f"Transcript compaction: {stats['tokens_before']} -> {stats['tokens_after']} tokens")
+        self.call_state.compaction = stats
+        return compacted_text
+
+    def merge_timing_scores(self, llm_response, timing):
+        """Return a copy of the LLM response with the locally computed time-based scores filled in."""
+        merged = json.loads(json.dumps(llm_response))  # cached responses must not be mutated
+        for category, item in TIMING_RUBRIC_ITEMS.items():
+            if not isinstance(merged.get(category), dict):
+                merged[category] = {}
+            merged[category][item] = timing[item]
+        merged["Timing"] = {
+            "first_response_seconds": timing["first_response_seconds"],
+            "max_dead_air_seconds": timing["max_dead_air_seconds"]
+        }
+        return merged
+
+    def score_timings(self, transcript_texts):
+        """
+        Score the time-based items of many formatted transcripts with one
+        TimingEngine pass; returns {transcript_text: timing or None}, the
+        `timings` that evaluate_conversation and evaluate_packed accept.
+        """
+        if not self.local_timing:
+            return {}
+        return self.timing_engine.score_transcripts({text: text for text in transcript_texts})
+
+    def score_timing(self, transcript_text, timings=None):
+        """
+        Score a transcript's time-based items locally, or None; taken from
+        `timings` (see score_timings) when it holds the transcript. A transcript
+        without parsable timestamps is marked untimed on this thread, so its
+        prompt keeps the time-based items for the LLM to score.
+        """
+        if not self.local_timing:
+            timing = None
+        elif timings and transcript_text in timings:
+            timing = timings[transcript_text]
+        else:
+            timing = self.timing_engine.score_transcript(transcript_text)
+        self.call_state.untimed = self.local_timing and timing is None
+        if self.call_state.untimed:
+            logging.warning("No parsable timestamps in the transcript; the LLM scores the time-based items.")
+            metrics.current().increment("untimed_transcripts")
+        return timing
+
+    def prepare_transcript(self, transcript, timings=None):
+        """Format a transcript, score its timing locally (or take it from `timings`) and compact it; returns (text, timing)."""
+        with metrics.stage("transcript_format"):
+            transcript_text = self.format_transcript(transcript)
+        with metrics.stage("timing"):
+            timing = self.score_timing(transcript_text, timings)
+        with metrics.stage("compaction"):
+            transcript_text = self.compact_transcript(transcript_text)
+        return transcript_text, timing
+
+    def finish_evaluation(self, analysis_results, timing, input_token_count, output_token_count):
+        """Merge the timing scores into an LLM evaluation and total it, in evaluate_conversation's result shape."""
+        with metrics.stage("scoring"):
+            if timing:
+                analysis_results = self.merge_timing_scores(analysis_results, timing)
+            total_scores, summary, sentiment = self.calculate_score(analysis_results)
+        return total_scores, summary, sentiment, analysis_results, input_token_count, output_token_count
+
+    def evaluate_packed(self, transcripts, deadline=None, timings=None):
+        """
+        Evaluate several short transcripts with a single LLM call, so the rubric
+        is sent once (see transcript_packing). Returns one evaluate_conversation
+        result per transcript, in order. Cached tickets are not sent, the call's
+        tokens are split between the packed tickets (their shares add up to
+        the call's usage), and a ticket whose slot of the output fails
+        validation is evaluated on its own. call_state.spent_tokens is the list
+        of tokens each ticket actually sent to the API. `timings` are timing
+        scores computed up front (see score_timings).
+        """
+        spent_tokens = [0] * len(transcripts)
+        if self.splitter:
+            # Split mode already sends a small prompt per section; packing would undo that
+            results = []
+            for index, transcript in enumerate(transcripts):
+                results.append(self.evaluate_conversation(transcript, deadline, timings))
+                spent_tokens[index] = self.call_state.spent_tokens
+            self.call_state.spent_tokens = spent_tokens
+            return results
+        self.call_state.deadline = deadline
+        prepared = [self.prepare_transcript(transcript, timings) for transcript in transcripts]
+        # prepare_transcript leaves the last ticket's timing mode behind; the packed tickets are all timed,
+        # so their cache keys and prompt use the prompt without the time-based items
+        self.call_state.untimed = False
+        results = [None] * len(transcripts)
+        cache_keys = [None] * len(transcripts)
+        packed = []
+        for index, (transcript_text, timing) in enumerate(prepared):
+            if self.local_timing and timing is None:
+                # Untimed transcripts need the full rubric prompt; they are evaluated on their own below
+                continue
+            if self.cache:
+                cache_keys[index] = make_cache_key(transcript_text, self.model_id, self.prompt_hash())
+                cached = self.cache.get(cache_keys[index])
+                if cached:
+                    results[index] = self.finish_evaluation(cached["llm_response"], timing, cached["input_tokens"], cached["output_tokens"])
+                    continue
+            near_duplicate = self.near_duplicate_of(transcript_text)
+            if near_duplicate and self.near_duplicates.mode == "reuse":
+                results[index] = self.finish_evaluation(near_duplicate["llm_response"], timing, 0, 0)
+                continue
+            packed.append(index)
+
+        # Each packed ticket's share of the call's tokens, the remainder spread over the first ones
+        shares = {}
+        if len(packed) > 1:
+            prompt = build_packed_prompt(self.rubric_prompt(), [prepared[index][0] for index in packed])
+            metrics.current().increment("llm_attempts")
+            meter = self.call_state.meter = TokenMeter()
+            output, token_usage = self.call_groq_inference(prompt)
+            slots = split_packed_output(output, len(packed))
+            input_tokens, input_rest = divmod((token_usage or {}).get("prompt_tokens", 0), len(packed))
+            output_tokens, output_rest = divmod((token_usage or {}).get("completion_tokens", 0), len(packed))
+            # Every request of the call (retries and hedges included) is spent, spread over the packed tickets the same way
+            spent, spent_rest = divmod(meter.tokens, len(packed))
+            for position, index in enumerate(packed):
+                shares[index] = (input_tokens + (position < input_rest), output_tokens + (position < output_rest))
+                spent_tokens[index] = spent + (position < spent_rest)
+            for index, slot in zip(packed, slots):
+                parsed = self.parse_llm_output(slot) if slot else None
+                if not parsed:
+                    continue
+                input_share, output_share = shares[index]
+                if cache_keys[index] and self.served_by_primary_model():
+                    self.cache.put(cache_keys[index], {"llm_response": parsed, "input_tokens": input_share, "output_tokens": output_share})
+                self.index_evaluation(prepared[index][0], parsed, input_share, output_share)
+                results[index] = self.finish_evaluation(parsed, prepared[index][1], input_share, output_share)
+            metrics.current().record("packed_tickets", len(packed), unit="Count")
+
+        for index in range(len(transcripts)):
+            if results[index] is None:
+                if index in shares:
+                    logging.warning(f"Packed slot {index + 1} of {len(packed)} failed validation; evaluating it on its own.")
+                    metrics.current().increment("pack_fallbacks")
+                result = self.evaluate_conversation(transcripts[index], deadline, timings)
+                # A failed slot's share of the packed call was spent too; untimed and unpacked tickets had no part in it
+                input_share, output_share = shares.get(index, (0, 0))
+                results[index] = result[:4] + (result[4] + input_share, result[5] + output_share)
+                spent_tokens[index] += self.call_state.spent_tokens
+        self.call_state.spent_tokens = spent_tokens
+        return results
+
+    def evaluate_conversation(self, transcript, deadline=None, timings=None):
+        """
+        Evaluate the conversation using the LLM, giving up on retries that would pass `deadline`.
+        `timings` are timing scores computed up front for many transcripts (see score_timings).
+        The reported token counts include those of a cached or reused evaluation;
+        call_state.spent_tokens is what this call actually sent to the API.
+        """
+        self.call_state.deadline = deadline
+        meter = self.call_state.meter = TokenMeter()
         try:
-            # Convert transcript to text format
-            transcript_text = "\n".join([f"{entry['timestamp']} - {entry['user']} - {entry['message']}" for entry in transcript])
-            
-            analysis_results, input_token_count, output_token_count = self.analyze_customer_sentiment_and_responses(transcript_text)
+            transcript_text, timing = self.prepare_transcript(transcript, timings)
+
+            self.call_state.cascade = None
+            analysis_results, input_token_count, output_token_count = self.analyze_with_cascade(transcript_text, timing)
+            metrics.current().record("prompt_tokens", input_token_count, unit="Count")
+            metrics.current().record("completion_tokens", output_token_count, unit="Count")
 
             if analysis_results:
-                total_scores, summary, sentiment = self.calculate_score(analysis_results)
-                return total_scores, summary, sentiment, analysis_results, input_token_count, output_token_count
+                return self.finish_evaluation(analysis_results, timing, input_token_count, output_token_count)
             else:
                 logging.error("Failed to analyze the conversation.")
                 return None, '', '', None, input_token_count, output_token_count
         except Exception as e:
             logging.error(f"Error evaluating conversation: {e}")
             return None, '', '', None, 0, 0
+        finally:
+            self.call_state.spent_tokens = meter.tokens
             
-def lambda_handler(event, context):
-    logging.info("Lambda function invoked.")
+    def stream_groq_inference(self, input_text: str, route=None):
+        """
+        Stream a completion from Groq. Yields (content_delta, token_usage) pairs;
+        token_usage is None except on the final chunk that reports it. Closing
+        the generator early closes the HTTP stream, so no more tokens are paid for.
+        """
+        if not self.model_id or not input_text:
+            raise ValueError("Both model_id and input_text must be provided")
+        deadline = getattr(self.call_state, "deadline", None)
 
-    # Get the origin of the request
-    origin = event.get("headers", {}).get("origin") or event.get("headers", {}).get("Origin")
-    logging.info(f"Request origin: {origin}")
+        estimated_tokens = 0
 
-    # Reject requests from disallowed origins
-    # if not is_allowed_origin(origin):
-    if False :
-        logging.warning(f"Unauthorized origin: {origin}")
-        return {
-            'statusCode': 401,
-            'body': json.dumps({'error': 'Unauthorized origin'}),
-            'headers': {
-                "Access-Control-Allow-Origin": "null",
-                "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type, Authorization",
+        def create_stream():
+            nonlocal estimated_tokens
+            # Every attempt of the retry policy (and every hedge) is a request of its own for the rate limiter
+            estimated_tokens = self.acquire_request(input_text)
+            try:
+                backend, model, stream = self.router.create(
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "you are a experienced helpful QA assistant."
+                        },
+                        {
+                            "role": "user",
+                            "content": input_text,
+                        }
+                    ],
+                    route=route or self.route,
+                    timeout=REQUEST_TIMEOUT,
+                    deadline=deadline,
+                    stream=True,
+                )
+            except Exception:
+                self.record_request_usage(estimated_tokens, None)
+                raise
+            self.call_state.backend = {"name": backend.name, "model": model}
+            return stream
+
+        stream = self.retry_policy.call(create_stream, deadline)
+        final_usage = None
+        try:
+            for chunk in stream:
+                delta = getattr(chunk.choices[0].delta, "content", None) if chunk.choices else None
+                usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+                token_usage = None
+                if usage:
+                    final_usage = usage
+                    token_usage = {
+                        "prompt_tokens": usage.prompt_tokens,
+                        "completion_tokens": usage.completion_tokens,
+                        "total_tokens": usage.total_tokens
+                    }
+                if delta or token_usage:
+                    yield delta or "", token_usage
+        finally:
+            stream.close()
+            # A stream closed before its usage came (e.g. a cancelled hedge) keeps its estimate in the tokens bucket
+            if final_usage:
+                self.record_request_usage(estimated_tokens, final_usage)
+
+    def stream_evaluation(self, transcript, deadline=None):
+        """
+        Evaluate a transcript while the completion streams in. Yields events:
+          {"event": "category", "category", "scores", "score"} as soon as a rubric category's object closes
+          {"event": "field", "name", "value"} for Fatal, Sentiment and Summary
+          {"event": "fatal"} when Fatal comes back "yes"; the stream is stopped right there
+          {"event": "result", ...} with the same body as the non-streaming response
+          {"event": "error", "error"} if the evaluation fails
+        Cached evaluations are replayed without calling the model.
+        """
+        self.call_state.deadline = deadline
+        transcript_text = self.format_transcript(transcript)
+        timing = self.score_timing(transcript_text)
+        transcript_text = self.compact_transcript(transcript_text)
+        excluded_items = self.excluded_items()
+
+        cache_key = None
+        self.call_state.cache_status = "off"
+        self.call_state.parse_status = None
+        self.call_state.backend = None
+        cached = None
+        if self.cache:
+            cache_key = make_cache_key(transcript_text, self.model_id, self.prompt_hash())
+            cached = self.cache.get(cache_key)
+            self.call_state.cache_status = "hit" if cached else "miss"
+
+        def category_event(category, section):
+            section = dict(section)
+            if timing and category in TIMING_RUBRIC_ITEMS:
+                section[TIMING_RUBRIC_ITEMS[category]] = timing[TIMING_RUBRIC_ITEMS[category]]
+            score = sum(value for key, value in section.items() if key != "Reasoning" and isinstance(value, (int, float)))
+            return {"event": "category", "category": category, "scores": section, "score": score}
+
+        members = {}
+        token_usage = None
+        if cached:
+            members = json.loads(json.dumps(cached["llm_response"]))
+            token_usage = {"prompt_tokens": cached["input_tokens"], "completion_tokens": cached["output_tokens"]}
+            for key, value in members.items():
+                yield category_event(key, value) if key in RUBRIC_SCHEMA else {"event": "field", "name": key, "value": value}
+        else:
+            prompt = self.build_prompt(transcript_text)
+            map_input_tokens = map_output_tokens = 0
+            if estimate_tokens(prompt) > self.context_budget():
+                condensed, map_input_tokens, map_output_tokens = self.condense_transcript(transcript_text)
+                prompt = self.build_prompt(condensed)
+
+            parser = IncrementalObjectParser()
+            fatal_hit = False
+            stream = self.stream_groq_inference(prompt)
+            try:
+                for delta, usage in stream:
+                    token_usage = usage or token_usage
+                    for key, value in parser.feed(delta):
+                        members[key] = value
+                        if key in RUBRIC_SCHEMA:
+                            if not validate_category(key, value, excluded_items):
+                                yield category_event(key, value)
+                        elif key == "Fatal":
+                            value = normalize_fatal(value) or value
+                            members[key] = value
+                            yield {"event": "field", "name": key, "value": value}
+                            if value == "yes":
+                                fatal_hit = True
+                        else:
+                            yield {"event": "field", "name": key, "value": value}
+                    if fatal_hit:
+                        yield {"event": "fatal"}
+                        break
+            except Exception as e:
+                logging.error(f"Error during streamed evaluation: {e}")
+                yield {"event": "error", "error": str(e)}
+                return
+            finally:
+                stream.close()
+
+            # An early fatal stop leaves Sentiment and Summary out on purpose
+            errors = validate_evaluation(members, excluded_items, require_summary=not fatal_hit)
+            if errors:
+                PARSE_STATS.record("failed")
+                self.call_state.parse_status = "failed"
+                logging.error(f"Streamed evaluation failed validation: {errors}")
+                yield {"event": "error", "error": "Evaluation failure"}
+                return
+            PARSE_STATS.record("clean")
+            self.call_state.parse_status = "clean"
+            token_usage = {
+                "prompt_tokens": map_input_tokens + (token_usage or {}).get("prompt_tokens", 0),
+                "completion_tokens": map_output_tokens + (token_usage or {}).get("completion_tokens", 0)
             }
+            # Only complete evaluations are cached; an early fatal stop leaves Sentiment/Summary out
+            if cache_key and not fatal_hit and self.served_by_primary_model():
+                self.cache.put(cache_key, {
+                    "llm_response": members,
+                    "input_tokens": token_usage["prompt_tokens"],
+                    "output_tokens": token_usage["completion_tokens"]
+                })
+
+        llm_response = self.merge_timing_scores(members, timing) if timing else members
+        total_scores, summary, sentiment = self.calculate_score(llm_response)
+        if not total_scores:
+            yield {"event": "error", "error": "Evaluation failure"}
+            return
+        result = dict(total_scores)
+        result.update({
+            "Summary": summary,
+            "Sentiment": sentiment,
+            "llm_response": llm_response,
+            "Input Token Count": token_usage["prompt_tokens"] if token_usage else 0,
+            "Output Token Count": token_usage["completion_tokens"] if token_usage else 0,
+            "Cache": self.cache_metadata(),
+            "Compaction": getattr(self.call_state, "compaction", None),
+            "Parse": self.parse_metadata(),
+            "Backend": getattr(self.call_state, "backend", None)
+        })
+        yield {"event": "result", **result}
+
+def evaluate_transcript(evaluator, transcript, deadline=None, timings=None):
+    """Evaluate one transcript and build its response body."""
+    total_scores, summary, sentiment, llm_response, input_token_count, output_token_count = evaluator.evaluate_conversation(transcript, deadline, timings)
+
+    if not total_scores:
+        return {
+            "error": "Evaluation failure",
+            "Input Token Count": input_token_count,
+            "Output Token Count": output_token_count
         }
+    return {
+        "Opening Score": total_scores['Opening Score'],
+        "Communication Skills Score": total_scores['Communication Skills Score'],
+        "Chat Handling Score": total_scores['Chat Handling Score'],
+        "Product Knowledge Score": total_scores['Product Knowledge Score'],
+        "Fatal Error": total_scores['Fatal Error'],
+        "Total Score": total_scores['Total Score'],
+        "Summary": summary,
+        "Sentiment": sentiment,
+        "llm_response": llm_response,
+        "Input Token Count": input_token_count,
+        "Output Token Count": output_token_count,
+        "Cache": evaluator.cache_metadata(),
+        "Compaction": getattr(evaluator.call_state, "compaction", None),
+        "Parse": evaluator.parse_metadata(),
+        "Backend": getattr(evaluator.call_state, "backend", None),
+        "Hedging": evaluator.hedge_metadata(),
+        "Cascade": evaluator.cascade_metadata(),
+        "NearDuplicate": evaluator.near_duplicate_metadata(),
+        "Split": evaluator.split_metadata()
+    }
+
+def evaluate_batch(evaluator, items, max_concurrency, deadline=None):
+    """
+    Evaluate a list of {id, transcript} items concurrently (at most
+    `max_concurrency` at a time). Every item gets its own status, so one bad
+    item does not fail the batch; token counts are summed over all items.
+    The timing of all items is scored up front in one TimingEngine pass.
+    """
+    try:
+        with metrics.stage("timing"):
+            timings = evaluator.score_timings([
+                evaluator.format_transcript(item["transcript"])
+                for item in items if isinstance(item, dict) and item.get("transcript")
+            ])
+    except Exception as e:
+        # A malformed item fails on its own below; the others are then scored one by one
+        logging.warning(f"Could not score the batch's timing up front: {e}")
+        timings = None
+
+    def evaluate_item(index, item):
+        item_id = item.get("id", index) if isinstance(item, dict) else index
+        transcript = item.get("transcript") if isinstance(item, dict) else None
+        if not transcript:
+            return {"id": item_id, "status": "error", "error": "Transcript not found in the item."}
+        try:
+            result = evaluate_transcript(evaluator, transcript, deadline, timings)
+        except Exception as e:
+            logging.error(f"Error evaluating batch item {item_id}: {e}")
+            return {"id": item_id, "status": "error", "error": str(e)}
+        result["id"] = item_id
+        result["status"] = "error" if "error" in result else "ok"
+        return result
 
-    # Set CORS headers for allowed origin
-    cors_headers = {
-        "Access-Control-Allow-Origin": origin,
-        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type, Authorization",
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(items)))) as executor:
+        # Each item runs in a copy of this context so it records into the invocation's metrics
+        futures = [executor.submit(contextvars.copy_context().run, evaluate_item, index, item) for index, item in enumerate(items)]
+        results = [future.result() for future in futures]
+    metrics.current().record("batch_items", len(items), unit="Count")
+
+    return {
+        "results": results,
+        "Succeeded": sum(1 for result in results if result["status"] == "ok"),
+        "Failed": sum(1 for result in results if result["status"] != "ok"),
+        "Input Token Count": sum(result.get("Input Token Count", 0) for result in results),
+        "Output Token Count": sum(result.get("Output Token Count", 0) for result in results)
     }
 
-    # Handle OPTIONS preflight request
-    if event.get("httpMethod") == "OPTIONS":
+def lambda_handler(event, context):
+    """Entry point: handles the event and emits one structured metrics line per invocation."""
+    invocation = metrics.start_invocation({"Function": getattr(context, "function_name", "local")})
+    try:
+        response = handle_event(event, context)
+        invocation.set_property("statusCode", response.get("statusCode"))
+        return response
+    finally:
+        invocation.set_property("requestId", getattr(context, "aws_request_id", None))
+        invocation.emit()
+
+def get_live_sessions():
+    """Return the container-wide LiveSessionEvaluator (see live_sessions), building it on first use."""
+    global _live_sessions
+    if _live_sessions is None:
+        from live_sessions import LiveSessionEvaluator, build_session_store_from_env
+        _live_sessions = LiveSessionEvaluator(get_evaluator(), build_session_store_from_env())
+    return _live_sessions
+
+def update_live_session(body, deadline=None):
+    """Add a live chat's new messages to its session and re-evaluate it. Returns (statusCode, response body)."""
+    from live_sessions import SessionConflict
+
+    messages = body.get('messages')
+    if not messages and not body.get('final'):
+        return 400, {'error': "'messages' is required for a live session update."}
+    try:
+        return 200, get_live_sessions().update(
+            str(body['session_id']), messages or [], final=bool(body.get('final')), deadline=deadline
+        )
+    except SessionConflict as e:
+        return 409, {'error': str(e)}
+
+def submit_jobs(body):
+    """
+    Queue the body's transcript (or each of its `transcripts` items) as an
+    async job. Returns (statusCode, response body).
+    """
+    transcripts = body.get('transcripts')
+    if transcripts is not None:
+        if not isinstance(transcripts, list) or not transcripts:
+            return 400, {'error': "'transcripts' must be a non-empty list of {id, transcript} objects."}
+        if len(transcripts) > MAX_BATCH_SIZE:
+            return 400, {'error': f"At most {MAX_BATCH_SIZE} transcripts are accepted per request."}
+        if not all(isinstance(item, dict) and item.get("transcript") for item in transcripts):
+            return 400, {'error': "Every item of 'transcripts' needs a transcript."}
+        job_ids = get_job_service().submit([item["transcript"] for item in transcripts])
+        jobs = [{"id": item.get("id", index), "job_id": job_id} for index, (item, job_id) in enumerate(zip(transcripts, job_ids))]
+        return 202, {"status": "queued", "jobs": jobs}
+
+    if not body.get('transcript'):
+        return 400, {'error': "Transcript not found in the event data."}
+    job_id, = get_job_service().submit([body['transcript']])
+    return 202, {"status": "queued", "job_id": job_id}
+
+def get_job(event):
+    """Status (and result, once done) of the job in the path or query string. Returns (statusCode, response body)."""
+    job_id = (event.get("pathParameters") or {}).get("job_id") or (event.get("queryStringParameters") or {}).get("job_id")
+    if not job_id:
+        return 400, {'error': "job_id is required."}
+    job = get_job_service().get(job_id)
+    if not job:
+        return 404, {'error': f"Job {job_id} not found."}
+    return 200, job
+
+def worker_handler(event, context):
+    """
+    Evaluates queued async jobs, together as one batch (see evaluate_batch).
+    With an SQS trigger the messages arrive in event["Records"], and those
+    whose result could not be stored are returned as batchItemFailures so
+    SQS redelivers only them. Otherwise up to event["max_messages"] messages
+    are received from the job queue.
+    """
+    from jobs import QueueMessage
+
+    invocation = metrics.start_invocation({"Function": getattr(context, "function_name", "local")})
+    try:
+        service = get_job_service()
+        records = event.get("Records")
+        if records is not None:
+            messages = [
+                QueueMessage(
+                    record["messageId"], json.loads(record["body"]), record["receiptHandle"],
+                    int(record.get("attributes", {}).get("ApproximateReceiveCount", 1)),
+                )
+                for record in records
+            ]
+            for message in messages:
+                service.start(message)
+        else:
+            messages = service.receive(event.get("max_messages", WORKER_BATCH_SIZE))
+        if not messages:
+            return {"processed": 0, "succeeded": 0, "failed": 0, "batchItemFailures": []}
+
+        items = [{"id": index, "transcript": message.body.get("transcript")} for index, message in enumerate(messages)]
+        results = evaluate_batch(get_evaluator(), items, MAX_CONCURRENCY, Deadline.from_context(context))["results"]
+
+        failures = []
+        for message, result in zip(messages, results):
+            result = {key: value for key, value in result.items() if key not in ("id", "status")}
+            try:
+                if "error" in result:
+                    service.complete(message, error=result["error"], delete=records is None)
+                else:
+                    service.complete(message, result=result, delete=records is None)
+            except Exception as e:
+                logging.error(f"Storing the result of job {message.body.get('job_id')} failed: {e}")
+                failures.append({"itemIdentifier": message.message_id})
+        succeeded = sum(1 for result in results if result["status"] == "ok")
+        invocation.set_property("jobs", len(messages))
         return {
-            'statusCode': 200,
-            'headers': cors_headers,
-            'body': ''
+            "processed": len(messages),
+            "succeeded": succeeded,
+            "failed": len(messages) - succeeded,
+            "batchItemFailures": failures,
+        }
+    finally:
+        invocation.set_property("requestId", getattr(context, "aws_request_id", None))
+        invocation.emit()
+
+def handle_event(event, context):
+    logging.info("Lambda function invoked.")
+
+    # Origin and method dispatch; with the body parsing below it adds up to handler_parse_ms
+    with metrics.stage("handler_parse"):
+        # Get the origin of the request
+        origin = event.get("headers", {}).get("origin") or event.get("headers", {}).get("Origin")
+        logging.info(f"Request origin: {origin}")
+
+        # Reject requests from disallowed origins
+        # if not is_allowed_origin(origin):
+        if False :
+            logging.warning(f"Unauthorized origin: {origin}")
+            return {
+                'statusCode': 401,
+                'body': json.dumps({'error': 'Unauthorized origin'}),
+                'headers': {
+                    "Access-Control-Allow-Origin": "null",
+                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                    "Access-Control-Allow-Headers": "Content-Type, Authorization",
+                }
+            }
+
+        # Set CORS headers for allowed origin
+        cors_headers = {
+            "Access-Control-Allow-Origin": origin,
+            "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization",
         }
 
-    # Accept both JSON and form-urlencoded bodies
-    logging.info(f"Type of body: {type(event.get('body'))}")
-    body = event.get("body") or event
-    if isinstance(body, str):
+        # Handle OPTIONS preflight request
+        if event.get("httpMethod") == "OPTIONS":
+            return {
+                'statusCode': 200,
+                'headers': cors_headers,
+                'body': ''
+            }
+
+    # Poll an async job
+    if event.get("httpMethod") == "GET":
         try:
-            body = json.loads(body)
-        except Exception:
-            logging.error(f"Invalid JSON body. Type of body: {type(event.get('body'))} and Event - {event}")
+            status_code, response = get_job(event)
+        except Exception as e:
+            logging.error(f"Unexpected error: {str(e)}")
+            status_code, response = 500, {'error': str(e)}
+        return {
+            'statusCode': status_code,
+            'body': json.dumps(response),
+            'headers': cors_headers
+        }
+
+    with metrics.stage("handler_parse"):
+        # Accept both JSON and form-urlencoded bodies
+        logging.info(f"Type of body: {type(event.get('body'))}")
+        body = event.get("body") or event
+        if isinstance(body, str):
+            try:
+                body = json.loads(body)
+            except Exception:
+                logging.error(f"Invalid JSON body. Type of body: {type(event.get('body'))} and Event - {event}")
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': 'Invalid JSON body.'}),
+                    'headers': cors_headers
+                }
+        elif not isinstance(body, dict):
+            logging.error(f"Body is not a valid JSON object or string. Type of body: {type(event.get('body'))} and Event - {event}")
             return {
                 'statusCode': 400,
-                'body': json.dumps({'error': 'Invalid JSON body.'}),
+                'body': json.dumps({'error': 'Invalid JSON format.'}),
                 'headers': cors_headers
             }
-    elif not isinstance(body, dict):
-        logging.error(f"Body is not a valid JSON object or string. Type of body: {type(event.get('body'))} and Event - {event}")
+
+    # Live chats: incremental evaluation of the messages since the last update
+    if body.get('session_id'):
+        try:
+            status_code, response = update_live_session(body, Deadline.from_context(context))
+        except Exception as e:
+            logging.error(f"Unexpected error: {str(e)}")
+            status_code, response = 500, {'error': str(e)}
         return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Invalid JSON format.'}),
+            'statusCode': status_code,
+            'body': json.dumps(response),
             'headers': cors_headers
         }
 
+    # Async mode: queue the evaluation and answer with job ids right away
+    if body.get('async'):
+        try:
+            status_code, response = submit_jobs(body)
+        except Exception as e:
+            logging.error(f"Unexpected error: {str(e)}")
+            status_code, response = 500, {'error': str(e)}
+        return {
+            'statusCode': status_code,
+            'body': json.dumps(response),
+            'headers': cors_headers
+        }
+
+    transcripts = body.get('transcripts')
+    if transcripts is not None:
+        if not isinstance(transcripts, list) or not transcripts:
+            logging.error("Invalid transcripts list in the event data.")
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': "'transcripts' must be a non-empty list of {id, transcript} objects."}),
+                'headers': cors_headers
+            }
+        if len(transcripts) > MAX_BATCH_SIZE:
+            logging.error(f"Batch of {len(transcripts)} transcripts exceeds the limit of {MAX_BATCH_SIZE}.")
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f"At most {MAX_BATCH_SIZE} transcripts are accepted per request."}),
+                'headers': cors_headers
+            }
+        try:
+            response = evaluate_batch(get_evaluator(), transcripts, MAX_CONCURRENCY, Deadline.from_context(context))
+            return {
+                'statusCode': 200,
+                'body': json.dumps(response),
+                'headers': cors_headers
+            }
+        except Exception as e:
+            logging.error(f"Unexpected error: {str(e)}")
+            return {
+                'statusCode': 500,
+                'body': json.dumps({'error': str(e)}),
+                'headers': cors_headers
+            }
+
     transcript = body.get('transcript')
 
     if not transcript:
@@ -343,26 +1418,10 @@ def lambda_handler(event, context):
         }
 
     try:
-        evaluator = ChatAgentEvaluator()
-        total_scores, summary, sentiment, llm_response, input_token_count, output_token_count = evaluator.evaluate_conversation(transcript)
-
-        if total_scores:
-            response = {
-                "Opening Score": total_scores['Opening Score'],
-                "Communication Skills Score": total_scores['Communication Skills Score'],
-                "Chat Handling Score": total_scores['Chat Handling Score'],
-                "Product Knowledge Score": total_scores['Product Knowledge Score'],
-                "Fatal Error": total_scores['Fatal Error'],
-                "Total Score": total_scores['Total Score'],
-                "Summary": summary,
-                "Sentiment": sentiment,
-                "llm_response": llm_response,
-                "Input Token Count": input_token_count,
-                "Output Token Count": output_token_count
-            }
-        else:
+        response = evaluate_transcript(get_evaluator(), transcript, Deadline.from_context(context))
+        if "error" in response:
             logging.warning("Evaluation failure.")
-            response = {"error": "Evaluation failure"}
+            response = {"error": response["error"]}
 
         return {
             'statusCode': 200,
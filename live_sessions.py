@@ -0,0 +1,423 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import metrics
+from llm_json import RUBRIC_SCHEMA, normalize_fatal, repair_json, validate_category
+from timing_engine import ASSIGNMENT_PATTERN, AUTO_GREETING_PATTERN, FIRST_RESPONSE_ITEM, HOLD_PATTERN, SYSTEM_PATTERN, TIMELY_RESPONSE_ITEM
+from token_estimates import estimate_tokens
+from transcript_compaction import parse_entries
+
+RESOLVED_PREFIX = "Resolved by"
+
+LIVE_UPDATE_PROMPT = """
+            The conversation is still in progress and is evaluated incrementally.
+
+            Summary of the conversation before the new messages:
+            {summary}
+
+            Current evaluation of the conversation before the new messages:
+            {scores}
+
+            New messages:
+            {messages}
+
+            Re-evaluate only these categories, for the whole conversation so far, in the format above: {categories}.
+            Also return "Fatal", "Sentiment" and "Summary", where Summary summarizes the whole conversation so far
+            in at most {summary_words} words. Return only the JSON object.
+"""
+
+class SessionConflict(Exception):
+    """Raised when a session was updated concurrently; the caller should retry the update."""
+
+def new_session(session_id):
+    return {
+        "session_id": session_id,
+        "version": 0,
+        "status": "live",
+        "summary": "",
+        "scores": {},
+        "fatal": "no",
+        "sentiment": None,
+        "pending": [],
+        "last_timestamp": None,
+        "seen_at_last": {},
+        "agents": [],
+        "timing": {
+            "first_customer_at": None,
+            "first_assigned_at": None,
+            "first_response_seconds": None,
+            "max_dead_air_seconds": None,
+            "previous": None,
+        },
+        "updates": 0,
+        "llm_calls": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+    }
+
+class SQLiteSessionStore:
+    """Live session states in a local SQLite file, with optimistic concurrency on their version."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, version INTEGER NOT NULL, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def get(self, session_id):
+        with self.lock:
+            row = self.conn.execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, state, expected_version):
+        """Store a state, bumping its version; raises SessionConflict if the stored version is not `expected_version`."""
+        state["version"] = expected_version + 1
+        with self.lock:
+            if expected_version == 0:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO sessions (session_id, version, state, updated_at) VALUES (?, ?, ?, ?)",
+                    (state["session_id"], state["version"], json.dumps(state), time.time()),
+                )
+            else:
+                cursor = self.conn.execute(
+                    "UPDATE sessions SET version = ?, state = ?, updated_at = ? WHERE session_id = ? AND version = ?",
+                    (state["version"], json.dumps(state), time.time(), state["session_id"], expected_version),
+                )
+        if cursor.rowcount != 1:
+            raise SessionConflict(f"Session {state['session_id']} was updated concurrently")
+
+class DynamoDBSessionStore:
+    """The same store on a DynamoDB table keyed by session_id; the state is kept as a JSON string."""
+
+    def __init__(self, table_name, ttl=7 * 24 * 3600):
+        import boto3
+        self.table = boto3.resource("dynamodb").Table(table_name)
+        self.ttl = ttl
+
+    def get(self, session_id):
+        item = self.table.get_item(Key={"session_id": session_id}).get("Item")
+        return json.loads(item["state"]) if item else None
+
+    def put(self, state, expected_version):
+        from botocore.exceptions import ClientError
+        state["version"] = expected_version + 1
+        condition = "attribute_not_exists(session_id)" if expected_version == 0 else "version = :expected"
+        values = {} if expected_version == 0 else {":expected": expected_version}
+        try:
+            self.table.put_item(
+                Item={
+                    "session_id": state["session_id"],
+                    "version": state["version"],
+                    "state": json.dumps(state),
+                    "expires_at": int(time.time()) + self.ttl,
+                },
+                ConditionExpression=condition,
+                **({"ExpressionAttributeValues": values} if values else {}),
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                raise SessionConflict(f"Session {state['session_id']} was updated concurrently") from e
+            raise
+
+def build_session_store_from_env():
+    """AUTOQA_SESSION_STORE: "sqlite" (default, the file AUTOQA_SESSION_DB) or "dynamodb" (the table AUTOQA_SESSION_TABLE)."""
+    kind = os.getenv("AUTOQA_SESSION_STORE", "sqlite")
+    if kind == "dynamodb":
+        return DynamoDBSessionStore(os.environ["AUTOQA_SESSION_TABLE"])
+    if kind == "sqlite":
+        return SQLiteSessionStore(os.getenv("AUTOQA_SESSION_DB", "/tmp/autoqa_sessions.sqlite"))
+    raise ValueError(f"Unknown session store {kind!r}")
+
+def parse_timestamp(timestamp):
+    """A naive UTC datetime; timestamps without an offset are taken as UTC, like TimingEngine does."""
+    try:
+        at = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return at.astimezone(timezone.utc).replace(tzinfo=None) if at.tzinfo else at
+
+def parse_partial_evaluation(output, categories, excluded_items=()):
+    """
+    Parse an incremental update: `categories` are validated like a full
+    evaluation, other categories are ignored. Returns the data or None.
+    """
+    if not output:
+        return None
+    text = output.strip().strip("`")
+    text = text[4:] if text.startswith("json") else text
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        repaired = repair_json(output)
+        try:
+            data = json.loads(repaired) if repaired else None
+        except json.JSONDecodeError:
+            data = None
+    if not isinstance(data, dict):
+        return None
+    errors = []
+    for category in categories:
+        errors.extend(validate_category(category, data.get(category), excluded_items))
+    # A missing Fatal usually means a truncated answer; it must not pass as "no"
+    fatal = normalize_fatal(data.get("Fatal"))
+    if errors or fatal is None:
+        logging.error(f"Live update failed validation: {errors or ['Fatal is not yes/no']}")
+        return None
+    data["Fatal"] = fatal
+    return data
+
+class LiveSessionEvaluator:
+    """
+    Evaluates a conversation while it is going on. Each update sends only the
+    messages that are new since the last one, plus the session's compact
+    state (a running summary and the current category scores), and asks the
+    model to re-score only the categories those messages can change. So the
+    cost of an update does not grow with the length of the chat.
+
+    - Opening is scored once, with the agent's first messages.
+    - Communication skills and Product Knowledge change with agent messages.
+    - Chat Handling also changes with assignments, tags and resolution.
+    - Customer-only messages wait in the session's pending buffer, until an
+      agent answers or `max_pending_tokens` is reached.
+
+    The time-based items are tracked locally from each message's timestamp.
+    A "Resolved by" event, or an update with `final`, finalizes the session.
+    """
+
+    def __init__(self, evaluator, store, summary_words=120, max_pending_tokens=1500):
+        self.evaluator = evaluator
+        self.store = store
+        self.summary_words = summary_words
+        self.max_pending_tokens = max_pending_tokens
+        # session_id: [lock, number of updates holding or waiting for it]; dropped when that number is back to 0
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    @contextmanager
+    def lock_for(self, session_id):
+        """Serialize this container's updates of one session; only sessions being updated keep a lock."""
+        with self.locks_lock:
+            entry = self.locks.setdefault(session_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.locks[session_id]
+
+    def update(self, session_id, messages, final=False, deadline=None):
+        """
+        Add new messages (transcript entries or text) to a session and
+        re-evaluate it if needed, giving up on retries that would pass
+        `deadline`. Returns the session's current evaluation.
+        """
+        # The evaluator's call_state outlives the invocation; set this one's deadline
+        self.evaluator.call_state.deadline = deadline
+        # Live sessions track the time-based items themselves (see observe)
+        self.evaluator.call_state.untimed = False
+        with self.lock_for(session_id):
+            state = self.store.get(session_id) or new_session(session_id)
+            if state["status"] == "final":
+                return self.result(state, [], 0, 0)
+            expected_version = state["version"]
+            entries = self.new_entries(state, messages)
+            roles = [self.observe(state, entry) for entry in entries]
+            state["pending"].extend(entry.render() for entry in entries)
+            final = final or any(entry.message.startswith(RESOLVED_PREFIX) for entry in entries)
+
+            categories = self.affected_categories(state, roles, final)
+            pending_tokens = sum(estimate_tokens(line) for line in state["pending"])
+            if not categories and state["pending"] and pending_tokens > self.max_pending_tokens:
+                categories = [category for category in RUBRIC_SCHEMA if category in state["scores"]] or list(RUBRIC_SCHEMA)
+            input_tokens = output_tokens = 0
+            scored = False
+            if categories and state["pending"]:
+                input_tokens, output_tokens, scored = self.rescore(state, categories)
+            if not scored:
+                categories = []
+            # A final update whose messages could not be scored stays live, so it can be sent again
+            if final and not state["pending"]:
+                state["status"] = "final"
+            state["updates"] += 1
+            self.store.put(state, expected_version)
+            return self.result(state, categories, input_tokens, output_tokens)
+
+    def new_entries(self, state, messages):
+        """
+        Entries not seen yet, so clients may resend the whole conversation:
+        those after the last timestamp seen, and those at that timestamp
+        beyond the ones already seen there (counted by user and message, as
+        several messages may share a timestamp).
+        """
+        _, entries = parse_entries(self.evaluator.format_transcript(messages))
+        last = parse_timestamp(state["last_timestamp"]) if state["last_timestamp"] else None
+        seen = state.setdefault("seen_at_last", {})
+        counts = {}
+        fresh = []
+        for entry in entries:
+            at = parse_timestamp(entry.timestamp)
+            if at is None:
+                fresh.append(entry)
+                continue
+            if last is not None and at < last:
+                continue
+            if last is None or at > last:
+                last, seen, counts = at, {}, {}
+                state["last_timestamp"] = entry.timestamp
+            key = json.dumps([entry.user, entry.message])
+            counts[key] = counts.get(key, 0) + 1
+            if counts[key] <= seen.get(key, 0):
+                continue
+            seen[key] = counts[key]
+            fresh.append(entry)
+        state["seen_at_last"] = seen
+        return fresh
+
+    def observe(self, state, entry):
+        """
+        Role of an entry ("assignment", "system", "agent" or "customer"),
+        updating the session's time-based measurements the way TimingEngine
+        scores a whole transcript.
+        """
+        message = entry.message
+        assignment = ASSIGNMENT_PATTERN.match(message)
+        if assignment:
+            assignee = assignment.group(1) or assignment.group(2)
+            if assignee not in state["agents"]:
+                state["agents"].append(assignee)
+            role = "assignment"
+        elif SYSTEM_PATTERN.match(message) or AUTO_GREETING_PATTERN.search(message) or entry.user is None:
+            role = "system"
+        elif (entry.user or "").lower() == "agent" or entry.user in state["agents"]:
+            role = "agent"
+        else:
+            role = "customer"
+
+        timing = state["timing"]
+        at = parse_timestamp(entry.timestamp)
+        if at is None or role == "system":
+            return role
+        if role == "assignment" and timing["first_assigned_at"] is None:
+            timing["first_assigned_at"] = entry.timestamp
+        if role == "customer" and timing["first_customer_at"] is None:
+            timing["first_customer_at"] = entry.timestamp
+        if role == "agent":
+            wait_started_at = parse_timestamp(timing["first_assigned_at"] or timing["first_customer_at"] or "")
+            if timing["first_response_seconds"] is None and wait_started_at is not None and at >= wait_started_at:
+                timing["first_response_seconds"] = (at - wait_started_at).total_seconds()
+            previous = timing["previous"]
+            if previous and (previous[0] in ("customer", "assignment") or (previous[0] == "agent" and previous[2])):
+                gap = (at - parse_timestamp(previous[1])).total_seconds()
+                timing["max_dead_air_seconds"] = max(gap, timing["max_dead_air_seconds"] or 0)
+        timing["previous"] = [role, entry.timestamp, role == "agent" and bool(HOLD_PATTERN.search(message))]
+        return role
+
+    def affected_categories(self, state, roles, final):
+        categories = set()
+        if "agent" in roles:
+            categories.update(["Communication skills", "Chat Handling", "Product Knowledge"])
+            if "Opening" not in state["scores"]:
+                categories.add("Opening")
+        if "assignment" in roles or final:
+            categories.add("Chat Handling")
+        if final:
+            # Whatever was never scored is scored now
+            categories.update(category for category in RUBRIC_SCHEMA if category not in state["scores"])
+        return [category for category in RUBRIC_SCHEMA if category in categories]
+
+    def rescore(self, state, categories):
+        """
+        One LLM call for the pending messages; merges the re-scored categories
+        into the state. Returns (input_tokens, output_tokens, whether the
+        answer could be parsed and merged).
+        """
+        evaluator = self.evaluator
+        scores = {category: state["scores"][category] for category in RUBRIC_SCHEMA if category in state["scores"]}
+        new_messages = "\n".join(state["pending"])
+        if evaluator.compactor:
+            new_messages, _ = evaluator.compactor.compact(new_messages)
+        prompt = evaluator.rubric_prompt() + LIVE_UPDATE_PROMPT.format(
+            summary=state["summary"] or "(start of the conversation)",
+            scores=json.dumps({**scores, "Fatal": state["fatal"], "Sentiment": state["sentiment"]}),
+            messages=new_messages,
+            categories=", ".join(categories),
+            summary_words=self.summary_words,
+        )
+        excluded_items = evaluator.excluded_items()
+
+        metrics.current().increment("llm_attempts")
+        output, token_usage = evaluator.call_groq_inference(
+            prompt, validate=lambda text: parse_partial_evaluation(text, categories, excluded_items) is not None
+        )
+        input_tokens = (token_usage or {}).get("prompt_tokens", 0)
+        output_tokens = (token_usage or {}).get("completion_tokens", 0)
+        metrics.current().record("prompt_tokens", input_tokens, unit="Count")
+        metrics.current().record("completion_tokens", output_tokens, unit="Count")
+        state["llm_calls"] += 1
+        state["input_tokens"] += input_tokens
+        state["output_tokens"] += output_tokens
+
+        data = parse_partial_evaluation(output, categories, excluded_items)
+        if data is None:
+            # Keep the messages pending; the next update sends them again
+            logging.warning(f"Live update of session {state['session_id']} could not be parsed; keeping its messages pending.")
+            return input_tokens, output_tokens, False
+        for category in categories:
+            state["scores"][category] = data[category]
+        # A fatal error found earlier stays, even if later messages do not show it again
+        state["fatal"] = "yes" if "yes" in (state["fatal"], data["Fatal"]) else "no"
+        state["sentiment"] = data.get("Sentiment", state["sentiment"])
+        state["summary"] = data.get("Summary") or state["summary"]
+        state["pending"] = []
+        return input_tokens, output_tokens, True
+
+    def timing_scores(self, state):
+        engine = self.evaluator.timing_engine
+        timing = state["timing"]
+        first_response = timing["first_response_seconds"]
+        max_dead_air = timing["max_dead_air_seconds"]
+        return {
+            FIRST_RESPONSE_ITEM: engine.first_response_points if first_response is not None and first_response <= engine.first_response_limit else 0,
+            TIMELY_RESPONSE_ITEM: engine.timely_response_points if (max_dead_air or 0) <= engine.dead_air_limit else 0,
+            "first_response_seconds": first_response,
+            "max_dead_air_seconds": max_dead_air,
+        }
+
+    def result(self, state, categories, input_tokens, output_tokens):
+        """The session's evaluation so far; categories not scored yet count as zero."""
+        evaluator = self.evaluator
+        llm_response = dict(state["scores"], Fatal=state["fatal"], Sentiment=state["sentiment"], Summary=state["summary"])
+        if evaluator.local_timing:
+            llm_response = evaluator.merge_timing_scores(llm_response, self.timing_scores(state))
+        total_scores, summary, sentiment = evaluator.calculate_score(llm_response)
+        return {
+            "session_id": state["session_id"],
+            "status": state["status"],
+            **(total_scores or {}),
+            "Summary": summary,
+            "Sentiment": sentiment,
+            "llm_response": llm_response,
+            "Scored Categories": [category for category in RUBRIC_SCHEMA if category in state["scores"]],
+            "Updated Categories": categories,
+            "Pending Messages": len(state["pending"]),
+            "Input Token Count": input_tokens,
+            "Output Token Count": output_tokens,
+            "Session": {
+                "updates": state["updates"],
+                "llm_calls": state["llm_calls"],
+                "input_tokens": state["input_tokens"],
+                "output_tokens": state["output_tokens"],
+                "last_timestamp": state["last_timestamp"],
+            },
+        }
@@ -0,0 +1,391 @@
+import json
+import logging
+import re
+import threading
+
+# Rubric items and their maximum points, as requested in the evaluation prompt
+RUBRIC_SCHEMA = {
+    "Opening": {
+        "First response given within defined timeframe": 10,
+        "Opening statement (Pre-defined)": 5,
+    },
+    "Communication skills": {
+        "Apology / Empathy when required": 10,
+        "Timely response": 5,
+        "Correct sentence formation": 5,
+    },
+    "Chat Handling": {
+        "Asked Probing questions (WH Questions)": 5,
+        "Chat Disposition": 5,
+        "Internal Notes": 5,
+        "Notes for inter department assignment": 5,
+        "Logs URL to be added for reference": 5,
+    },
+    "Product Knowledge": {
+        "Proactively sharing product knowledge/education for future reference": 10,
+        "Proper information to Tech / TL / Other internal departments while assigning the case": 10,
+        "Possible Resolution in case of no response basis available information": 10,
+        "Screenshot / knowledgebase / steps / reference": 10,
+        "Educate to map the listings or check for catalog in unlinked": 10,
+    },
+}
+
+LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+NUMBER_PATTERN = re.compile(r"^-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?$")
+LEADING_NUMBER_PATTERN = re.compile(r"^\s*(-?\d+(?:\.\d+)?)")
+BAREWORD_DELIMITERS = set(',:{}[]"\n')
+
+class ParseStats:
+    """Container-wide counters of how LLM outputs were parsed."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {"clean": 0, "repaired": 0, "failed": 0}
+
+    def record(self, status):
+        with self.lock:
+            self.counts[status] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+PARSE_STATS = ParseStats()
+
+def tokenize(text, start):
+    """
+    Yield (kind, value) tokens of a JSON-ish object starting at `start`.
+    kind is one of "punct", "string", "bare". Strings tolerate raw newlines,
+    single quotes and unescaped inner quotes; a string cut off by the end of
+    the text is returned as is.
+    """
+    position = start
+    length = len(text)
+    while position < length:
+        char = text[position]
+        if char.isspace():
+            position += 1
+        elif char in "{}[]:,":
+            yield "punct", char
+            position += 1
+        elif char in "\"'":
+            quote = char
+            position += 1
+            chars = []
+            while position < length:
+                char = text[position]
+                if char == "\\" and position + 1 < length:
+                    chars.append(text[position:position + 2])
+                    position += 2
+                    continue
+                if char == quote:
+                    # Only a quote followed by a structural character closes the string
+                    rest = text[position + 1:].lstrip()
+                    if not rest or rest[0] in ",:}]":
+                        position += 1
+                        break
+                    chars.append("\\\"" if quote == "\"" else char)
+                    position += 1
+                    continue
+                if char == "\"":
+                    chars.append("\\\"")
+                else:
+                    chars.append(char)
+                position += 1
+            yield "string", "".join(chars)
+        else:
+            end = position
+            while end < length and text[end] not in BAREWORD_DELIMITERS:
+                end += 1
+            word = text[position:end].strip()
+            if word:
+                yield "bare", word
+            position = max(end, position + 1)
+
+def render_string(raw):
+    """Turn raw string contents (possibly with raw control characters) into a JSON string literal."""
+    escaped = raw.replace("\r", "\\r").replace("\n", "\\n").replace("\t", "\\t")
+    try:
+        return json.dumps(json.loads(f"\"{escaped}\""))
+    except json.JSONDecodeError:
+        return json.dumps(raw)
+
+def render_bare(word):
+    """Barewords become literals, numbers or (for yes/no, <score> placeholders, free text) strings."""
+    if word in LITERALS:
+        return LITERALS[word]
+    if NUMBER_PATTERN.match(word):
+        return word
+    return json.dumps(word.rstrip(","))
+
+def repair_json(output):
+    """
+    Rebuild the outermost JSON object of an LLM output, fixing common defects:
+    preamble/trailing text and code fences, trailing or missing commas,
+    unquoted values (yes/no, <score> placeholders), single-quoted or
+    unterminated strings and truncated nested objects. Returns the repaired
+    JSON text, or None if the output contains no object.
+    """
+    start = output.find("{")
+    if start == -1:
+        return None
+
+    parts = []
+    # Each frame is [kind, state]; object states: key, colon, value, comma; array states: value, comma
+    stack = []
+    pending_comma = False
+
+    def emit_value(text):
+        nonlocal pending_comma
+        if pending_comma:
+            parts.append(",")
+            pending_comma = False
+        parts.append(text)
+
+    for kind, value in tokenize(output, start):
+        frame = stack[-1] if stack else None
+        if frame is None and parts:
+            break  # outermost object closed; ignore trailing text
+
+        if kind == "punct" and value in "}]":
+            if not frame:
+                break
+            if frame[0] == "object" and frame[1] in ("colon", "value"):
+                if frame[1] == "colon":
+                    parts.append(":")
+                parts.append("null")
+            pending_comma = False
+            parts.append("}" if frame[0] == "object" else "]")
+            stack.pop()
+            if stack:
+                stack[-1][1] = "comma"
+            continue
+
+        if kind == "punct" and value == ",":
+            if frame and frame[1] == "comma":
+                frame[1] = "key" if frame[0] == "object" else "value"
+                pending_comma = True
+            elif frame and frame[0] == "object" and frame[1] == "value":
+                parts.append("null")
+                frame[1] = "key"
+                pending_comma = True
+            continue  # stray commas are dropped
+
+        if kind == "punct" and value == ":":
+            if frame and frame[0] == "object" and frame[1] == "colon":
+                parts.append(":")
+                frame[1] = "value"
+            continue
+
+        # A value or key token, or an opening bracket
+        if frame and frame[1] == "comma":
+            # Missing comma between members
+            pending_comma = True
+            frame[1] = "key" if frame[0] == "object" else "value"
+        if frame and frame[0] == "object" and frame[1] == "key":
+            if kind == "punct":
+                continue  # a bracket cannot be a key
+            emit_value(render_string(value) if kind == "string" else json.dumps(value))
+            frame[1] = "colon"
+            continue
+        if frame and frame[0] == "object" and frame[1] == "colon":
+            parts.append(":")
+            frame[1] = "value"
+
+        if kind == "punct":
+            emit_value(value)
+            if frame:
+                frame[1] = "comma"
+            stack.append(["object" if value == "{" else "array", "key" if value == "{" else "value"])
+        else:
+            emit_value(render_string(value) if kind == "string" else render_bare(value))
+            if frame:
+                frame[1] = "comma"
+
+    # Close whatever the truncated output left open
+    while stack:
+        frame = stack.pop()
+        if frame[0] == "object" and frame[1] == "colon":
+            parts.append(":null")
+        elif frame[0] == "object" and frame[1] == "value":
+            parts.append("null")
+        parts.append("}" if frame[0] == "object" else "]")
+    return "".join(parts) if parts else None
+
+def coerce_score(value):
+    """Scores may arrive as numbers, numeric strings or "5/10"; anything else is not a score."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        match = LEADING_NUMBER_PATTERN.match(value)
+        if match:
+            number = float(match.group(1))
+            return int(number) if number.is_integer() else number
+    return None
+
+def normalize_fatal(value):
+    """Fatal as "yes"/"no" (accepting booleans and any casing), or None if it is neither."""
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    value = str(value).strip().lower()
+    return value if value in ("yes", "no") else None
+
+def validate_category(category, section, excluded_items=()):
+    """Coerce and clamp the scores of one rubric category in place; returns a list of errors."""
+    if not isinstance(section, dict):
+        return [f"missing category {category}"]
+    errors = []
+    items = RUBRIC_SCHEMA[category]
+    for key, value in list(section.items()):
+        if key == "Reasoning" or key in excluded_items:
+            continue
+        score = coerce_score(value)
+        if score is None:
+            errors.append(f"non-numeric score for {category} / {key}: {value!r}")
+            continue
+        maximum = items.get(key)
+        section[key] = max(0, min(score, maximum)) if maximum is not None else max(0, score)
+    # A missing item would silently score zero (e.g. output cut off mid-category); ask again instead
+    missing = [item for item in items if item not in section and item not in excluded_items]
+    if missing:
+        errors.append(f"{category} is missing items {missing}")
+    return errors
+
+def validate_evaluation(data, excluded_items=(), require_summary=True):
+    """
+    Check a parsed evaluation against RUBRIC_SCHEMA and normalize it in place:
+    scores are coerced to numbers and clamped to their maximum, and Fatal is
+    lowercased to "yes"/"no". Returns a list of errors (empty if valid).
+    Items in `excluded_items` are scored elsewhere and not expected. Every
+    other item, Fatal and (with `require_summary`) Sentiment and Summary must
+    be present, so a truncated output is asked again rather than scored.
+    """
+    if not isinstance(data, dict):
+        return ["evaluation is not a JSON object"]
+    errors = []
+    for category in RUBRIC_SCHEMA:
+        errors.extend(validate_category(category, data.get(category), excluded_items))
+
+    if "Fatal" not in data:
+        errors.append("missing Fatal")
+    else:
+        fatal = normalize_fatal(data["Fatal"])
+        if fatal is None:
+            errors.append(f"Fatal is not yes/no: {data['Fatal']!r}")
+        else:
+            data["Fatal"] = fatal
+    if require_summary:
+        for field in ("Sentiment", "Summary"):
+            if not isinstance(data.get(field), str) or not data[field].strip():
+                errors.append(f"missing {field}")
+    return errors
+
+def load_json_object(output):
+    """
+    JSON in an LLM output, repairing it if needed. Returns (data, status) with
+    status "clean" or "repaired"; data is None if nothing could be parsed.
+    """
+    status = "clean"
+    text = output.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[4:] if text.startswith("json") else text
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        data = None
+    if data is None:
+        status = "repaired"
+        repaired = repair_json(output)
+        try:
+            data = json.loads(repaired) if repaired else None
+        except json.JSONDecodeError as e:
+            logging.error(f"Error parsing repaired LLM output: {e}")
+            data = None
+    return data, status
+
+def parse_evaluation(output, excluded_items=(), stats=PARSE_STATS):
+    """
+    Parse and validate an LLM evaluation. Returns (data, status) where status
+    is "clean" (valid JSON as returned), "repaired" (valid after repair) or
+    "failed" (data is None; only then is a new LLM call worth paying for).
+    The status is counted in `stats` unless it is None.
+    """
+    data, status = load_json_object(output)
+    errors = validate_evaluation(data, excluded_items) if data is not None else ["no JSON object found"]
+    if errors:
+        logging.error(f"LLM output failed validation: {errors}")
+        if stats:
+            stats.record("failed")
+        return None, "failed"
+    if stats:
+        stats.record(status)
+    return data, status
+
+class IncrementalObjectParser:
+    """
+    Parses a streamed JSON object and reports each top-level member as soon as
+    it is complete, e.g. a whole rubric category once its closing brace has
+    arrived. Text before the opening brace (preamble, code fences) is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.started = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.member_start = None
+
+    def feed(self, text):
+        """Add streamed text; returns a list of (key, value) members completed by it."""
+        self.buffer += text
+        members = []
+        while self.position < len(self.buffer) and not self.finished:
+            char = self.buffer[self.position]
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self.depth = 1
+                    self.member_start = self.position + 1
+            elif self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == "\"":
+                    self.in_string = False
+            elif char == "\"":
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    members.extend(self.complete_member(self.position))
+                    self.finished = True
+            elif char == "," and self.depth == 1:
+                members.extend(self.complete_member(self.position))
+                self.member_start = self.position + 1
+            self.position += 1
+        return members
+
+    def complete_member(self, end):
+        member = self.buffer[self.member_start:end].strip()
+        if not member:
+            return []
+        text = "{" + member + "}"
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            repaired = repair_json(text)
+            try:
+                data = json.loads(repaired) if repaired else {}
+            except json.JSONDecodeError:
+                logging.warning(f"Could not parse streamed member: {member[:80]}")
+                return []
+        return list(data.items())
@@ -0,0 +1,163 @@
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = os.getenv("AUTOQA_METRICS_NAMESPACE", "DexkorAutoQA")
+
+_current = contextvars.ContextVar("autoqa_metrics", default=None)
+
+class Histogram:
+    """
+    Log-bucketed histogram (about 5% relative error) for in-process latency
+    and token percentiles, cheap enough to update on every invocation.
+    """
+    GROWTH = 1.1
+    ZERO_BUCKET = -10 ** 9
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+
+    def bucket_of(self, value):
+        return self.ZERO_BUCKET if value <= 0 else int(math.floor(math.log(value, self.GROWTH)))
+
+    def add(self, value):
+        with self.lock:
+            bucket = self.bucket_of(value)
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+            self.count += 1
+            self.total += value
+
+    def percentile(self, pct):
+        with self.lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, math.ceil(pct / 100 * self.count))
+            seen = 0
+            for bucket in sorted(self.buckets):
+                seen += self.buckets[bucket]
+                if seen >= rank:
+                    # Upper bound of the bucket
+                    return 0.0 if bucket == self.ZERO_BUCKET else self.GROWTH ** (bucket + 1)
+            return 0.0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50": round(self.percentile(50), 2),
+            "p95": round(self.percentile(95), 2),
+            "p99": round(self.percentile(99), 2),
+        }
+
+HISTOGRAMS = {}
+HISTOGRAMS_LOCK = threading.Lock()
+
+def histogram(name):
+    with HISTOGRAMS_LOCK:
+        if name not in HISTOGRAMS:
+            HISTOGRAMS[name] = Histogram()
+        return HISTOGRAMS[name]
+
+def histogram_summary():
+    """p50/p95/p99 of every metric aggregated in this process so far."""
+    with HISTOGRAMS_LOCK:
+        names = sorted(HISTOGRAMS)
+    return {name: histogram(name).summary() for name in names}
+
+class InvocationMetrics:
+    """
+    Metrics of one invocation: stage timings (summed when a stage runs more
+    than once, e.g. per batch item or retry), counters and properties.
+    Emitted as a single CloudWatch Embedded Metric Format JSON line.
+    """
+
+    def __init__(self, dimensions=None):
+        self.lock = threading.Lock()
+        self.started_at = time.perf_counter()
+        self.dimensions = dimensions or {}
+        self.values = {}
+        self.units = {}
+        self.properties = {}
+
+    def record(self, name, value, unit="Milliseconds"):
+        with self.lock:
+            self.values[name] = self.values.get(name, 0) + value
+            self.units[name] = unit
+
+    def increment(self, name, amount=1):
+        self.record(name, amount, unit="Count")
+
+    def set_property(self, name, value):
+        with self.lock:
+            self.properties[name] = value
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(f"{name}_ms", (time.perf_counter() - start) * 1000)
+
+    def to_emf(self):
+        with self.lock:
+            values = {name: round(value, 3) for name, value in self.values.items()}
+            values["total_ms"] = round((time.perf_counter() - self.started_at) * 1000, 3)
+            units = dict(self.units, total_ms="Milliseconds")
+            properties = dict(self.properties)
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [sorted(self.dimensions)],
+                    "Metrics": [{"Name": name, "Unit": units[name]} for name in sorted(values)],
+                }],
+            },
+        }
+        record.update(self.dimensions)
+        record.update(properties)
+        record.update(values)
+        return record
+
+    def emit(self):
+        """Print the EMF line (CloudWatch picks it up from stdout) and feed the in-process histograms."""
+        record = self.to_emf()
+        if os.getenv("AUTOQA_METRICS", "on") != "off":
+            print(json.dumps(record, default=str), flush=True)
+        if os.getenv("AUTOQA_METRICS_HISTOGRAMS", "on") != "off":
+            for metric in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]:
+                histogram(metric["Name"]).add(record[metric["Name"]])
+        return record
+
+class NullMetrics(InvocationMetrics):
+    """Used when no invocation is being measured; records nothing."""
+
+    def record(self, name, value, unit="Milliseconds"):
+        pass
+
+    def set_property(self, name, value):
+        pass
+
+NULL_METRICS = NullMetrics()
+
+def start_invocation(dimensions=None):
+    """Begin measuring an invocation in the current context; returns its InvocationMetrics."""
+    metrics = InvocationMetrics(dimensions)
+    _current.set(metrics)
+    return metrics
+
+def current():
+    """Metrics of the invocation running in this context (a no-op recorder if there is none)."""
+    return _current.get() or NULL_METRICS
+
+def stage(name):
+    """Time a pipeline stage of the current invocation."""
+    return current().stage(name)
@@ -0,0 +1,296 @@
+"""
+Local stand-in for the Groq chat completions API, for load tests and
+benchmarks that should not spend real quota.
+
+Serves POST /openai/v1/chat/completions (plain and streamed) with rubric
+evaluations, configurable latency, injected 429/5xx errors, malformed or
+truncated JSON outputs and token usage. Point the lambda at it with
+GROQ_BASE_URL:
+
+    python mock_groq.py --port 8008 --latency-ms 800 --distribution lognormal --rate-429 0.05
+    GROQ_BASE_URL=http://127.0.0.1:8008 GROQ_API=mock python api_test.py
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_json import RUBRIC_SCHEMA
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+CHARS_PER_TOKEN = 4
+STREAM_CHUNK_CHARS = 24
+PACKED_TICKET_PATTERN = re.compile(r"^### Ticket (T\d+)$", re.MULTILINE)
+
+class MockConfig:
+    """Behaviour of the mock server; rates are probabilities per request."""
+
+    def __init__(self, latency_ms=500.0, distribution="fixed", sigma=0.5, tokens_per_second=0.0,
+                 rate_429=0.0, rate_5xx=0.0, malformed_rate=0.0, truncated_rate=0.0,
+                 retry_after=0.2, fatal_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        # Streaming pace; 0 sends the whole stream as fast as possible
+        self.tokens_per_second = tokens_per_second
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.malformed_rate = malformed_rate
+        self.truncated_rate = truncated_rate
+        self.retry_after = retry_after
+        self.fatal_rate = fatal_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def roll(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+    def sample_latency(self):
+        """Seconds to wait before answering, drawn from the configured distribution."""
+        mean = self.latency_ms / 1000
+        with self.lock:
+            if self.distribution == "uniform":
+                return self.random.uniform(0, 2 * mean)
+            if self.distribution == "exponential":
+                return self.random.expovariate(1 / mean) if mean > 0 else 0.0
+            if self.distribution == "lognormal":
+                # latency_ms is the median; sigma sets the length of the tail
+                return self.random.lognormvariate(math.log(mean), self.sigma) if mean > 0 else 0.0
+        return mean
+
+    def sample_score(self, maximum):
+        with self.lock:
+            return self.random.choice([0, maximum // 2, maximum, maximum])
+
+class MockStats:
+    """Counters of what the server answered, by outcome."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def record(self, outcome):
+        with self.lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+def count_tokens(text):
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN)) if text else 0
+
+def build_evaluation(config, prompt):
+    """A rubric evaluation covering the items the prompt asks for."""
+    evaluation = {}
+    for category, items in RUBRIC_SCHEMA.items():
+        section = {item: config.sample_score(maximum) for item, maximum in items.items() if item in prompt}
+        section["Reasoning"] = f"Mock reasoning for {category.lower()}."
+        evaluation[category] = section
+    evaluation["Fatal"] = "yes" if config.roll(config.fatal_rate) else "no"
+    evaluation["Sentiment"] = "Neutral"
+    evaluation["Summary"] = "Mock evaluation of the conversation."
+    return evaluation
+
+def malform(content):
+    """Typical LLM formatting defects that llm_json.repair_json can fix."""
+    content = content.replace('"Fatal": "no"', '"Fatal": no').replace('"Fatal": "yes"', '"Fatal": yes')
+    content = content.replace("}, ", "},, ", 1)
+    return f"Here is the evaluation:\n```json\n{content}\n```"
+
+def build_content(config, prompt):
+    """Completion text and finish reason for a prompt."""
+    if "summarize it in at most" in prompt:
+        # Map step of a long transcript (lambda_function.CHUNK_SUMMARY_PROMPT)
+        return "Customer reported an issue; the agent investigated and replied.", "stop"
+    tickets = PACKED_TICKET_PATTERN.findall(prompt)
+    if tickets:
+        # Packed prompt (transcript_packing): one evaluation per ticket id
+        content = json.dumps({ticket_id: build_evaluation(config, prompt) for ticket_id in tickets}, indent=2)
+    else:
+        content = json.dumps(build_evaluation(config, prompt), indent=2)
+    if config.roll(config.truncated_rate):
+        with config.lock:
+            cut = config.random.randint(1, len(content) - 1)
+        return content[:cut], "length"
+    if config.roll(config.malformed_rate):
+        return malform(content), "stop"
+    return content, "stop"
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    server_version = "MockGroq/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message, error_type, headers=None):
+        self.send_json(status, {"error": {"message": message, "type": error_type}}, headers)
+
+    def do_POST(self):
+        config, stats = self.server.config, self.server.stats
+        if self.path.rstrip("/") != COMPLETIONS_PATH:
+            stats.record("not_found")
+            self.send_error_json(404, f"Unknown path {self.path}", "invalid_request_error")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            stats.record("bad_request")
+            self.send_error_json(400, "Invalid JSON body.", "invalid_request_error")
+            return
+
+        time.sleep(config.sample_latency())
+        if config.roll(config.rate_429):
+            stats.record("429")
+            self.send_error_json(429, "Rate limit reached (mock).", "rate_limit_exceeded", {
+                "retry-after": str(config.retry_after),
+                "x-ratelimit-reset-requests": f"{config.retry_after}s",
+            })
+            return
+        if config.roll(config.rate_5xx):
+            stats.record("5xx")
+            self.send_error_json(503, "Service unavailable (mock).", "internal_server_error")
+            return
+
+        prompt = "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+        content, finish_reason = build_content(config, prompt)
+        usage = {
+            "prompt_tokens": count_tokens(prompt),
+            "completion_tokens": count_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = request.get("model", "mock")
+        stats.record("truncated" if finish_reason == "length" else "ok")
+
+        if request.get("stream"):
+            self.stream_completion(completion_id, model, content, finish_reason, usage)
+            return
+        self.send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+            "usage": usage,
+        })
+
+    def stream_completion(self, completion_id, model, content, finish_reason, usage):
+        """Server-sent events in the OpenAI chunk format, with usage in x_groq on the last chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        pace = self.server.config.tokens_per_second
+
+        def send(chunk):
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        try:
+            for start in range(0, len(content), STREAM_CHUNK_CHARS):
+                piece = content[start:start + STREAM_CHUNK_CHARS]
+                send(dict(base, choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+                if pace:
+                    time.sleep(count_tokens(piece) / pace)
+            send(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": finish_reason}], x_groq={"usage": usage}))
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. early stop on a fatal error)
+            self.server.stats.record("stream_aborted")
+
+class MockGroqServer:
+    """The mock server on a background thread; use as a context manager or start()/stop()."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), MockGroqHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = config or MockConfig()
+        self.httpd.stats = MockStats()
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self):
+        return self.httpd.stats
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+def add_config_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="Mean (median for lognormal) response latency.")
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "exponential", "lognormal"], default="fixed")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Spread of the lognormal distribution.")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Streaming pace (0: unthrottled).")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with 429.")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Share of requests answered with 503.")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of outputs with repairable JSON defects.")
+    parser.add_argument("--truncated-rate", type=float, default=0.0, help="Share of outputs cut off mid-JSON.")
+    parser.add_argument("--fatal-rate", type=float, default=0.0, help="Share of evaluations with Fatal: yes.")
+    parser.add_argument("--retry-after", type=float, default=0.2, help="retry-after seconds sent with 429s.")
+    parser.add_argument("--seed", type=int, default=None)
+
+def config_from_args(args):
+    return MockConfig(
+        latency_ms=args.latency_ms, distribution=args.distribution, sigma=args.sigma,
+        tokens_per_second=args.tokens_per_second, rate_429=args.rate_429, rate_5xx=args.rate_5xx,
+        malformed_rate=args.malformed_rate, truncated_rate=args.truncated_rate,
+        retry_after=args.retry_after, fatal_rate=args.fatal_rate, seed=args.seed,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Groq chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8008)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockGroqServer(config_from_args(args), args.host, args.port)
+    print(f"Mock Groq API on {server.url} (set GROQ_BASE_URL={server.url})", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats.snapshot()))
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from transcript_compaction import TIMESTAMP, parse_entries
+
+# Details that differ between otherwise identical templated tickets
+TIMESTAMP_PATTERN = re.compile(TIMESTAMP)
+URL_PATTERN = re.compile(r"https?://\S+")
+EMAIL_PATTERN = re.compile(r"\S+@\S+\.\w+")
+# Numbers and anything containing a digit: order ids, SKUs, amounts, phone numbers
+NUMBER_PATTERN = re.compile(r"(?<!<)\b\w*\d[\w-]*\b(?!>)")
+WORD_PATTERN = re.compile(r"<\w+>|\w+")
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+REFERENCE_PROMPT = """
+            Reference: a near-identical ticket (similarity {similarity:.2f}) was evaluated as below. Keep your
+            scores consistent with it, and deviate only where this transcript actually differs.
+            {evaluation}
+        """
+
+def similarity_text(transcript_text):
+    """
+    Transcript text with its templated details replaced by placeholders:
+    speakers become <speaker1>, <speaker2>, ... (also where they are named in
+    messages), and timestamps, URLs, emails and numbers become <ts>, <url>,
+    <email> and <num>. Lowercased, so only the wording is compared.
+    """
+    _, entries = parse_entries(transcript_text)
+    if not entries:
+        lines = [transcript_text]
+    else:
+        speakers = {}
+        for entry in entries:
+            if entry.user and entry.user not in speakers:
+                speakers[entry.user] = f"<speaker{len(speakers) + 1}>"
+        # Longer names first, so "Augustya Dev" is not replaced as "Augustya" + " Dev"
+        by_length = sorted(speakers, key=len, reverse=True)
+        name_pattern = re.compile("|".join(re.escape(name) for name in by_length)) if by_length else None
+        lines = []
+        for entry in entries:
+            message = name_pattern.sub(lambda match: speakers[match.group(0)], entry.message) if name_pattern else entry.message
+            lines.append(f"{speakers.get(entry.user, '<system>')} {message}")
+    text = "\n".join(lines)
+    text = TIMESTAMP_PATTERN.sub(" <ts> ", text)
+    text = URL_PATTERN.sub(" <url> ", text)
+    text = EMAIL_PATTERN.sub(" <email> ", text)
+    text = NUMBER_PATTERN.sub(" <num> ", text)
+    return " ".join(WORD_PATTERN.findall(text.lower()))
+
+class MinHasher:
+    """
+    MinHash signatures of word shingles: the fraction of equal positions of
+    two signatures estimates the Jaccard similarity of their shingle sets.
+    """
+
+    def __init__(self, num_perm=64, shingle_size=3, seed=1):
+        import numpy as np
+        self.np = np
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = np.random.default_rng(seed)
+        self.a = generator.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = generator.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    def shingles(self, text):
+        words = text.split()
+        size = min(self.shingle_size, len(words)) or 1
+        return {" ".join(words[index:index + size]) for index in range(max(1, len(words) - size + 1))}
+
+    def signature(self, text):
+        np = self.np
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little") for shingle in self.shingles(text)],
+            dtype=np.uint64,
+        )
+        # One universal hash per permutation, applied to every shingle at once (uint64 wraps by design)
+        permuted = ((hashes[:, None] * self.a + self.b) % MERSENNE_PRIME) & MAX_HASH
+        return permuted.min(axis=0)
+
+    def similarity(self, signature, other):
+        return float((signature == other).mean())
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of recent evaluations. A transcript whose normalized
+    text (see similarity_text) has an estimated Jaccard similarity of at
+    least `threshold` with an indexed transcript of the same scope (model
+    and rubric prompt version) is a near-duplicate. With mode "reuse" the
+    stored evaluation is returned instead of calling the LLM; with mode
+    "anchor" the LLM is still called, with the stored evaluation in the
+    prompt as a reference.
+
+    Signatures are split into `bands` bands; only transcripts sharing a band
+    with the query are compared. The index holds the `max_entries` most
+    recently used evaluations.
+    """
+
+    def __init__(self, mode="reuse", threshold=0.9, num_perm=64, bands=16, max_entries=10000):
+        if mode not in ("reuse", "anchor"):
+            raise ValueError(f"Unknown near-duplicate mode {mode!r}")
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.mode = mode
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.hasher = MinHasher(num_perm)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.buckets = {}
+        self.counts = {"lookups": 0, "matches": 0}
+
+    @classmethod
+    def from_env(cls):
+        """A NearDuplicateIndex if AUTOQA_NEAR_DUP is "reuse" or "anchor", else None."""
+        mode = os.getenv("AUTOQA_NEAR_DUP", "off")
+        if mode == "off":
+            return None
+        return cls(
+            mode=mode,
+            threshold=float(os.getenv("AUTOQA_NEAR_DUP_THRESHOLD", 0.9)),
+            max_entries=int(os.getenv("AUTOQA_NEAR_DUP_MAX_ENTRIES", 10000)),
+        )
+
+    def signature(self, transcript_text):
+        return self.hasher.signature(similarity_text(transcript_text))
+
+    def band_keys(self, scope, signature):
+        return [
+            (scope, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def find(self, transcript_text, scope):
+        """
+        The best match of a transcript as {"key", "similarity", "llm_response",
+        "input_tokens", "output_tokens"}, or None below the threshold.
+        """
+        signature = self.signature(transcript_text)
+        best, best_similarity = None, 0.0
+        with self.lock:
+            self.counts["lookups"] += 1
+            candidates = set()
+            for band_key in self.band_keys(scope, signature):
+                candidates.update(self.buckets.get(band_key, ()))
+            for key in candidates:
+                entry = self.entries[key]
+                similarity = self.hasher.similarity(signature, entry["signature"])
+                if similarity > best_similarity:
+                    best, best_similarity = key, similarity
+            if best is None or best_similarity < self.threshold:
+                return None
+            self.counts["matches"] += 1
+            self.entries.move_to_end(best)
+            entry = self.entries[best]
+        return {
+            "key": best,
+            "similarity": round(best_similarity, 4),
+            "llm_response": entry["llm_response"],
+            "input_tokens": entry["input_tokens"],
+            "output_tokens": entry["output_tokens"],
+        }
+
+    def add(self, key, transcript_text, scope, llm_response, input_tokens, output_tokens):
+        """Index an evaluation under `key` (e.g. a hash of its transcript)."""
+        signature = self.signature(transcript_text)
+        band_keys = self.band_keys(scope, signature)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = {
+                "signature": signature,
+                "band_keys": band_keys,
+                "llm_response": llm_response,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+            }
+            for band_key in band_keys:
+                self.buckets.setdefault(band_key, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        for band_key in entry["band_keys"]:
+            bucket = self.buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band_key]
+
+    def reference_prompt(self, match):
+        """Text appended to the rubric prompt in "anchor" mode."""
+        return REFERENCE_PROMPT.format(similarity=match["similarity"], evaluation=json.dumps(match["llm_response"]))
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts, entries=len(self.entries))
+        counts["match_rate"] = round(counts["matches"] / counts["lookups"], 4) if counts["lookups"] else 0.0
+        return counts
@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+import re
+import threading
+
+import pandas as pd
+
+from transcript_compaction import ASSIGN_PATTERN, TAGS_PATTERN, parse_entries
+from transcript_reader import iter_transcripts
+
+RESOLVED_PATTERN = re.compile(r"^Resolved by (.+?)\s*$")
+UNASSIGNED = ("null", "UNASSIGNED")
+
+SCORE_COLUMNS = [
+    "Opening Score",
+    "Communication Skills Score",
+    "Chat Handling Score",
+    "Product Knowledge Score",
+    "Total Score",
+]
+LABEL_COLUMNS = ["Fatal Error", "Sentiment"]
+DIMENSIONS = ("all", "agent", "team", "tag")
+KEY_COLUMNS = ["dimension", "key", "week"]
+TICKET_COLUMNS = ["agent", "team", "tags", "week"] + SCORE_COLUMNS + LABEL_COLUMNS
+UNKNOWN = "unknown"
+
+def metadata_frame(transcripts):
+    """
+    Parse {code: transcript_text} into one frame indexed by Code with the
+    ticket's agent (last assignee, else whoever resolved it), team (queue of
+    the last assignment), tags (last "Tags changed" list), resolved_by and
+    week (ISO week of the last resolution, else of the last event).
+    """
+    rows = []
+    for code, transcript_text in transcripts.items():
+        _, entries = parse_entries(transcript_text)
+        for entry in entries:
+            rows.append((code, entry.timestamp, entry.message))
+    events = pd.DataFrame(rows, columns=["Code", "timestamp", "message"])
+    events["timestamp"] = pd.to_datetime(events["timestamp"], format="ISO8601", utc=True, errors="coerce")
+
+    message = events["message"].fillna("")
+    assignment = message.str.extract(ASSIGN_PATTERN)
+    events["agent"] = assignment[0].where(~assignment[0].isin(UNASSIGNED))
+    events["team"] = assignment[1].replace("", None)
+    events["tags"] = message.str.extract(TAGS_PATTERN)[0]
+    events["resolved_by"] = message.str.extract(RESOLVED_PATTERN)[0]
+    events["resolved_at"] = events["timestamp"].where(events["resolved_by"].notna())
+
+    # last() skips missing values, so each column holds the ticket's latest event of its kind
+    grouped = events.groupby("Code", sort=False)
+    metadata = grouped[["agent", "team", "tags", "resolved_by"]].last()
+    metadata["agent"] = metadata["agent"].fillna(metadata["resolved_by"])
+    metadata["tags"] = metadata["tags"].str.split(",").map(
+        lambda tags: [tag.strip() for tag in tags if tag.strip()] if isinstance(tags, list) else []
+    )
+    ended_at = grouped["resolved_at"].max().fillna(grouped["timestamp"].max())
+    metadata["week"] = ended_at.dt.strftime("%G-W%V")
+    metadata = metadata.reindex(pd.Index(list(transcripts.keys()), name="Code"))
+    metadata["tags"] = metadata["tags"].map(lambda tags: tags if isinstance(tags, list) else [])
+    return metadata
+
+class QARollups:
+    """
+    Per-dimension, per-week aggregates of evaluation results that are updated
+    as results are written, so dashboards query them without rescanning the
+    results store. Dimensions are "all", "agent", "team" and "tag" (a ticket
+    counts once under each of its tags).
+
+    Two count tables hold everything: `scores` counts tickets per whole-point
+    score of each score column and `labels` per Fatal Error/Sentiment value.
+    Means, percentiles, the fatal rate and the sentiment mix are all derived
+    from these counts, so updates are a vectorized group-by and a sum, and
+    any set of weeks can be merged exactly. A third table, `tickets`, keeps
+    the scores, labels and metadata each code was last counted with, so a
+    re-evaluated code replaces its earlier counts instead of adding to them.
+    Results are aggregated and the tables saved as they are written (see
+    add_results); existing tables at `path` are extended unless `resume` is False.
+    """
+
+    def __init__(self, path=None, resume=True):
+        self.path = path
+        self.lock = threading.Lock()
+        self.transcripts = {}
+        self.scores = pd.DataFrame(columns=KEY_COLUMNS + ["measure", "value", "n"])
+        self.labels = pd.DataFrame(columns=KEY_COLUMNS + ["measure", "value", "n"])
+        self.tickets = pd.DataFrame(columns=TICKET_COLUMNS, index=pd.Index([], name="Code"))
+        if resume and path and os.path.exists(os.path.join(path, "scores.parquet")):
+            self.scores = pd.read_parquet(os.path.join(path, "scores.parquet"))
+            self.labels = pd.read_parquet(os.path.join(path, "labels.parquet"))
+            # Rollups saved before the tickets table existed cannot tell re-evaluated codes apart
+            if os.path.exists(os.path.join(path, "tickets.parquet")):
+                self.tickets = pd.read_parquet(os.path.join(path, "tickets.parquet"))
+                self.tickets["tags"] = self.tickets["tags"].map(list)
+
+    def track(self, records):
+        """Pass (code, transcript_text) records through, keeping each transcript until its result is added."""
+        for code, transcript_text in records:
+            with self.lock:
+                self.transcripts[code] = transcript_text
+            yield code, transcript_text
+
+    def forget(self, code):
+        """Drop a tracked transcript whose evaluation failed."""
+        with self.lock:
+            self.transcripts.pop(code, None)
+
+    def add_results(self, rows):
+        """Aggregate result rows of tracked transcripts and save the tables; called with every flush of the results."""
+        if not rows:
+            return
+        with self.lock:
+            transcripts = {row["Code"]: self.transcripts.pop(row["Code"], "") for row in rows}
+            self.add(pd.DataFrame(rows), metadata_frame(transcripts))
+            self.save()
+
+    def add(self, results, metadata):
+        """
+        Aggregate a results frame (one row per Code) with its metadata_frame()
+        into the tables. Codes counted before are taken out of the counts first.
+        """
+        frame = results.drop_duplicates("Code", keep="last").join(metadata, on="Code").set_index("Code")
+        frame = frame.reindex(columns=TICKET_COLUMNS)
+        frame["week"] = frame["week"].fillna(UNKNOWN)
+        previous = self.tickets[self.tickets.index.isin(frame.index)]
+
+        scores, labels = self._observations(frame)
+        old_scores, old_labels = self._observations(previous)
+        self.scores = self._merge(self.scores, scores, old_scores)
+        self.labels = self._merge(self.labels, labels, old_labels)
+        self.tickets = pd.concat([self.tickets[~self.tickets.index.isin(frame.index)], frame])
+
+    @staticmethod
+    def _observations(frame):
+        """One row per (dimension, key, week, measure, value) a frame of TICKET_COLUMNS counts, for scores and labels."""
+        frame = frame.reset_index(drop=True)
+        tagged = frame.explode("tags").dropna(subset=["tags"])
+        keyed = pd.concat([
+            frame.assign(dimension="all", key="all"),
+            frame.assign(dimension="agent", key=frame["agent"].fillna(UNKNOWN)),
+            frame.assign(dimension="team", key=frame["team"].fillna(UNKNOWN)),
+            tagged.assign(dimension="tag", key=tagged["tags"]),
+        ], ignore_index=True)
+
+        scores = keyed.melt(id_vars=KEY_COLUMNS, value_vars=SCORE_COLUMNS, var_name="measure")
+        scores["value"] = pd.to_numeric(scores["value"], errors="coerce").round()
+        scores = scores.dropna(subset=["value"]).astype({"value": "int64"})
+        labels = keyed.melt(id_vars=KEY_COLUMNS, value_vars=LABEL_COLUMNS, var_name="measure")
+        labels = labels.dropna(subset=["value"])
+        labels["value"] = labels["value"].astype(str).str.strip().str.lower()
+        labels = labels[labels["value"] != ""]
+        return scores, labels
+
+    @staticmethod
+    def _merge(table, observations, removed):
+        columns = KEY_COLUMNS + ["measure", "value"]
+        counts = observations.groupby(columns).size().rename("n").reset_index()
+        negated = removed.groupby(columns).size().rename("n").mul(-1).reset_index()
+        counts = pd.concat([table, counts, negated], ignore_index=True).groupby(columns, as_index=False)["n"].sum()
+        counts = counts[counts["n"] > 0].astype({"n": "int64"})
+        return counts.sort_values(columns, kind="stable").reset_index(drop=True)
+
+    def save(self):
+        """Write both tables to `path` (each via a temporary file and a rename)."""
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        tables = (("scores", self.scores, False), ("labels", self.labels, False), ("tickets", self.tickets, True))
+        for name, table, index in tables:
+            final_path = os.path.join(self.path, f"{name}.parquet")
+            table.to_parquet(final_path + ".tmp", index=index)
+            os.replace(final_path + ".tmp", final_path)
+
+    def query(self, dimension="agent", key=None, weeks=None, by_week=False, percentiles=(50, 90)):
+        """
+        One row per key of a dimension (and per week with `by_week`): tickets,
+        fatal_rate, the share of each sentiment, and the mean and percentiles
+        of every score column. `key` and `weeks` restrict the rows counted.
+        """
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension {dimension!r}; expected one of {DIMENSIONS}")
+        group = ["key", "week"] if by_week else ["key"]
+        scores = self._select(self.scores, dimension, key, weeks)
+        labels = self._select(self.labels, dimension, key, weeks)
+        if labels.empty:
+            return pd.DataFrame(columns=group + ["tickets", "fatal_rate"]).set_index(group)
+
+        labels = labels.groupby(group + ["measure", "value"])["n"].sum().unstack(["measure", "value"], fill_value=0)
+        tickets = labels.T.groupby(level="measure").sum().T.max(axis=1)
+        summary = pd.DataFrame({"tickets": tickets})
+        if ("Fatal Error", "yes") in labels.columns:
+            summary["fatal_rate"] = labels[("Fatal Error", "yes")] / tickets
+        else:
+            summary["fatal_rate"] = 0.0
+        if "Sentiment" in labels.columns.get_level_values("measure"):
+            sentiment = labels["Sentiment"]
+            summary = summary.join(sentiment.div(sentiment.sum(axis=1), axis=0).add_prefix("sentiment_"))
+
+        # Score counts sorted by value: a percentile is the first value whose running count reaches it
+        scores = scores.groupby(group + ["measure", "value"])["n"].sum().reset_index()
+        by_measure = scores.groupby(group + ["measure"])
+        total = by_measure["n"].transform("sum")
+        running = by_measure["n"].cumsum()
+        weighted = (scores["value"] * scores["n"]).groupby([scores[column] for column in group + ["measure"]]).sum()
+        stats = {"mean": weighted / by_measure["n"].sum()}
+        for percentile in percentiles:
+            reached = scores[(running >= total * percentile / 100).to_numpy()]
+            stats[f"p{percentile:g}"] = reached.groupby(group + ["measure"])["value"].first()
+        stats = pd.DataFrame(stats).unstack("measure")
+        stats.columns = [f"{measure} {stat}" for stat, measure in stats.columns]
+        ordered = [f"{measure} {stat}" for measure in SCORE_COLUMNS for stat in ["mean"] + [f"p{p:g}" for p in percentiles]]
+        summary = summary.join(stats[[column for column in ordered if column in stats.columns]])
+        return summary.round(4)
+
+    @staticmethod
+    def _select(table, dimension, key, weeks):
+        mask = table["dimension"] == dimension
+        if key is not None:
+            mask &= table["key"] == key
+        if weeks:
+            mask &= table["week"].isin(list(weeks))
+        return table[mask]
+
+def read_results(path, columns=None):
+    """A results file written by autoQA.py (a CSV file or a *.parquet dataset directory), optionally only some columns."""
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+def build_rollups(results_path, transcripts_path, rollups_path, batch_size=2000):
+    """Rebuild the rollups from scratch from an existing results store and its transcript export."""
+    results = read_results(results_path).drop_duplicates("Code", keep="last").set_index("Code", drop=False)
+    rollups = QARollups(rollups_path, resume=False)
+    batch = {}
+    for code, transcript_text in iter_transcripts(transcripts_path):
+        if code not in results.index:
+            continue
+        batch[code] = transcript_text
+        if len(batch) >= batch_size:
+            rollups.add(results.loc[list(batch)].reset_index(drop=True), metadata_frame(batch))
+            batch = {}
+    if batch:
+        rollups.add(results.loc[list(batch)].reset_index(drop=True), metadata_frame(batch))
+    rollups.save()
+    return rollups
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Per-agent, team, tag and week QA rollups of autoQA results.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Rebuild the rollups from a results store.")
+    build.add_argument("--results", default="evaluation_results.csv", help="CSV file or *.parquet dataset written by autoQA.py.")
+    build.add_argument("--input", default="transcript.txt", help="Transcript export the results came from.")
+    build.add_argument("--rollups", default="qa_rollups", help="Directory of the rollup tables.")
+    query = subparsers.add_parser("query", help="Print rollups of one dimension.")
+    query.add_argument("--rollups", default="qa_rollups", help="Directory of the rollup tables.")
+    query.add_argument("--dimension", default="agent", choices=DIMENSIONS)
+    query.add_argument("--key", default=None, help="Only this agent, team or tag.")
+    query.add_argument("--week", action="append", default=None, help="Only this ISO week (e.g. 2022-W46); repeatable.")
+    query.add_argument("--by-week", action="store_true", help="One row per key and week.")
+    query.add_argument("--json", action="store_true", help="Print JSON records instead of a table.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "build":
+        build_rollups(args.results, args.input, args.rollups)
+        print(f"Rollups written to {args.rollups}")
+    else:
+        summary = QARollups(args.rollups).query(args.dimension, args.key, args.week, args.by_week)
+        if args.json:
+            print(json.dumps(json.loads(summary.reset_index().to_json(orient="records")), indent=2))
+        else:
+            print(summary.to_string())
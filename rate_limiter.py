@@ -0,0 +1,73 @@
+import threading
+import time
+
+# Completion tokens reserved per request when estimating its cost up front
+EXPECTED_COMPLETION_TOKENS = 700
+
+class TokenBucket:
+    """Classic token bucket: holds up to `capacity` units and refills at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        # A bucket that never refills would make every wait infinite
+        if rate_per_minute <= 0:
+            raise ValueError(f"Rate limits must be positive, got {rate_per_minute} per minute")
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.available = self.capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now):
+        elapsed = now - self.updated_at
+        self.available = min(self.capacity, self.available + elapsed * self.rate_per_second)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` units can be taken (0 if available now)."""
+        # A request bigger than the bucket can never fit; let it through once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate_per_second
+
+    def take(self, amount):
+        self.available -= amount
+
+    def adjust(self, amount):
+        """Add (or with a negative amount, remove) units, e.g. to reconcile an estimate."""
+        self.available = min(self.capacity, self.available + amount)
+
+class RateLimiter:
+    """
+    Thread-safe limiter enforcing both a requests/min and a tokens/min budget.
+
+    Callers `acquire()` with an estimated token cost before calling the LLM and
+    `record_usage()` with the real `token_usage` afterwards, so the tokens bucket
+    tracks what Groq actually billed rather than the estimate.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.lock = threading.Lock()
+
+    def acquire(self, estimated_tokens):
+        """Block until one request and `estimated_tokens` tokens are available, then take them."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(estimated_tokens)
+                    return
+            time.sleep(wait)
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Reconcile the tokens bucket with the actual usage of a finished request."""
+        if actual_tokens is None:
+            return
+        with self.lock:
+            self.tokens.refill(time.monotonic())
+            self.tokens.adjust(estimated_tokens - actual_tokens)
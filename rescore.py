@@ -0,0 +1,72 @@
+import argparse
+import logging
+import os
+import time
+
+import pandas as pd
+
+from qa_analytics import read_results
+from rubric import Rubric, item_frame
+
+def items_path(results_path):
+    """Item score cache next to a results file or dataset directory."""
+    return results_path.rstrip("/") + ".items.parquet"
+
+def load_items(results_path):
+    """
+    Item scores of every evaluation in a results store, indexed by Code (the
+    latest row of each code). Parsing llm_response JSON is the only slow
+    step, so parsed items are kept in items_path() with a hash of the
+    response they came from, and only codes that are new or were
+    re-evaluated since the last run are parsed.
+    """
+    results = read_results(results_path, columns=["Code", "llm_response"]).drop_duplicates("Code", keep="last")
+    response_hash = pd.util.hash_pandas_object(results["llm_response"].fillna("").astype(str), index=False).to_numpy()
+    response_hash = pd.Series(response_hash, index=pd.Index(results["Code"], name="Code"), name="response_hash")
+    cache_path = items_path(results_path)
+    cached = pd.read_parquet(cache_path) if os.path.exists(cache_path) else None
+    if cached is not None and "response_hash" in cached.columns:
+        unchanged = cached["response_hash"].reindex(response_hash.index).to_numpy() == response_hash.to_numpy()
+        fresh = results[~unchanged]
+        cached = cached.drop(index=fresh["Code"], errors="ignore")
+    else:
+        # Caches from before response hashes were kept cannot tell re-evaluated codes apart
+        cached, fresh = None, results
+    if len(fresh):
+        started_at = time.perf_counter()
+        parsed = item_frame(fresh["llm_response"], index=pd.Index(fresh["Code"], name="Code"))
+        parsed["response_hash"] = response_hash.loc[parsed.index]
+        logging.info(f"Parsed {len(parsed)} stored evaluations in {time.perf_counter() - started_at:.1f}s")
+        cached = parsed if cached is None else pd.concat([cached, parsed])
+        cached.to_parquet(cache_path + ".tmp")
+        os.replace(cache_path + ".tmp", cache_path)
+    return cached.drop(columns="response_hash").reindex(pd.Index(results["Code"], name="Code"))
+
+def rescore(results_path, rubric):
+    """Scores of every stored evaluation under `rubric`, without calling the LLM."""
+    return rubric.score_frame(load_items(results_path))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Recompute scores of stored evaluations under a (new) rubric, with no LLM calls.")
+    parser.add_argument("--results", default="evaluation_results.csv", help="CSV file or *.parquet dataset written by autoQA.py.")
+    parser.add_argument("--rubric", default=None, help="Rubric JSON file (default: AUTOQA_RUBRIC, else the built-in rubric).")
+    parser.add_argument("--output", default="rescored_results.csv", help="CSV or *.parquet file of the new scores.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    rubric = Rubric.from_file(args.rubric) if args.rubric else Rubric.from_env()
+    started_at = time.perf_counter()
+    items = load_items(args.results)
+    loaded_at = time.perf_counter()
+    scores = rubric.score_frame(items)
+    scored_at = time.perf_counter()
+    if args.output.endswith(".parquet"):
+        scores.to_parquet(args.output)
+    else:
+        scores.to_csv(args.output)
+    print(
+        f"Rescored {len(scores)} evaluations (load {loaded_at - started_at:.2f}s, score {scored_at - loaded_at:.3f}s): "
+        f"mean total {scores['Total Score'].mean():.1f}, fatal rate {(scores['Fatal Error'] == 'Yes').mean():.3f}"
+    )
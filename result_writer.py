@@ -0,0 +1,184 @@
+import csv
+import logging
+import os
+import threading
+import time
+import uuid
+
+class CsvResultWriter:
+    """
+    Appends evaluation rows to a CSV file as they complete, writing the header
+    once. `on_flush(rows)` is called once rows are on disk.
+    """
+
+    def __init__(self, path, fieldnames, on_flush=None):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.on_flush = on_flush
+        self.lock = threading.Lock()
+        write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+        if write_header:
+            self.writer.writeheader()
+            self.file.flush()
+
+    def write(self, row):
+        with self.lock:
+            self.writer.writerow(row)
+            self.file.flush()
+            if self.on_flush:
+                self.on_flush([row])
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ParquetResultWriter:
+    """
+    Appends evaluation rows to a Parquet dataset (a directory of part files)
+    with a typed schema. Rows are buffered and written as one row group per
+    part file every `row_group_size` rows or `flush_interval` seconds; each
+    part is written to a hidden temporary name and renamed, so a crash never
+    leaves a partial file that readers of the dataset would pick up. `on_flush(rows)` is called once rows are on disk.
+
+    `schema` maps column names to "string", "int64", "float64" or "json" (a
+    string column of JSON documents). Parts already in the dataset with
+    other column types (e.g. int64 scores of older runs) are cast to the
+    schema on open, since a dataset whose parts disagree cannot be read.
+    Requires pyarrow.
+    """
+
+    def __init__(self, path, schema, row_group_size=1000, flush_interval=60.0, on_flush=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa, self.pq = pa, pq
+        self.path = path
+        self.columns = schema
+        types = {"string": pa.string(), "int64": pa.int64(), "float64": pa.float64(), "json": pa.string()}
+        self.schema = pa.schema([
+            pa.field(name, types[kind], metadata={"format": "json"} if kind == "json" else None)
+            for name, kind in schema.items()
+        ])
+        self.row_group_size = row_group_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.lock = threading.Lock()
+        self.rows = []
+        self.flushed_at = time.monotonic()
+        # Part files of different runs never collide
+        self.run_id = uuid.uuid4().hex[:8]
+        self.parts = 0
+        os.makedirs(path, exist_ok=True)
+        self._upgrade_parts()
+
+    def _upgrade_parts(self):
+        for name in sorted(os.listdir(self.path)):
+            if not (name.startswith("part-") and name.endswith(".parquet")):
+                continue
+            part_path = os.path.join(self.path, name)
+            schema = self.pq.read_schema(part_path)
+            if schema.equals(self.schema, check_metadata=False):
+                continue
+            if schema.names != self.schema.names:
+                logging.warning(f"{part_path} has other columns than the results schema; leaving it as is.")
+                continue
+            # Safe casts only (e.g. int64 to float64); a lossy one raises instead of changing results
+            table = self.pq.read_table(part_path).cast(self.schema)
+            temporary_path = os.path.join(self.path, f".{name}.tmp")
+            self.pq.write_table(table, temporary_path, compression="zstd")
+            os.replace(temporary_path, part_path)
+            logging.info(f"Cast {part_path} to the results schema.")
+
+    def write(self, row):
+        with self.lock:
+            self.rows.append(row)
+            if len(self.rows) >= self.row_group_size or time.monotonic() - self.flushed_at >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        self.flushed_at = time.monotonic()
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        columns = {
+            name: [self._cell(row.get(name), kind) for row in rows]
+            for name, kind in self.columns.items()
+        }
+        table = self.pa.table(columns, schema=self.schema)
+        self.parts += 1
+        name = f"part-{self.run_id}-{self.parts:05d}.parquet"
+        final_path = os.path.join(self.path, name)
+        # Readers of the dataset skip "."-prefixed files, so one left behind by a crash is not read as a part
+        temporary_path = os.path.join(self.path, f".{name}.tmp")
+        self.pq.write_table(table, temporary_path, compression="zstd")
+        os.replace(temporary_path, final_path)
+        if self.on_flush:
+            self.on_flush(rows)
+
+    @staticmethod
+    def _cell(value, kind):
+        if value is None or value == "":
+            return None
+        if kind == "int64":
+            return int(round(float(value)))
+        if kind == "float64":
+            return float(value)
+        return str(value)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_result_writer(path, schema, on_flush=None):
+    """A ParquetResultWriter for *.parquet paths, else a CsvResultWriter with the schema's columns."""
+    if path.endswith(".parquet"):
+        return ParquetResultWriter(path, schema, on_flush=on_flush)
+    return CsvResultWriter(path, list(schema), on_flush=on_flush)
+
+class Checkpoint:
+    """
+    Append-only file of completed ticket codes. A resumed run skips every code
+    listed here, so work that was already paid for is not evaluated again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.completed = set()
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                self.completed = {line.strip() for line in file if line.strip()}
+        self.file = open(path, "a")
+
+    def __contains__(self, code):
+        return code in self.completed
+
+    def mark_done(self, code):
+        with self.lock:
+            self.completed.add(code)
+            self.file.write(code + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,145 @@
+import email.utils
+import logging
+import os
+import random
+import re
+import time
+
+import metrics
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+# Transport-level errors (by class name, so groq does not need to be imported here)
+RETRYABLE_ERROR_NAMES = {
+    "APIConnectionError", "APITimeoutError", "ConnectError", "ConnectTimeout", "PoolTimeout", "ReadTimeout", "RemoteProtocolError",
+}
+# Groq reset headers look like "2m59.56s", "7.66s" or "35ms"
+DURATION_PATTERN = re.compile(r"(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+(?:\.\d+)?)ms)?$")
+
+class DeadlineExceeded(Exception):
+    """Raised instead of retrying when the next attempt would not finish before the deadline."""
+
+class Deadline:
+    """Absolute point in time by which a request must be done (e.g. the Lambda invocation timeout)."""
+
+    def __init__(self, seconds_from_now):
+        self.expires_at = time.monotonic() + seconds_from_now
+
+    @classmethod
+    def from_context(cls, context, margin_ms=None):
+        """
+        Deadline of a Lambda invocation, `margin_ms` before the timeout so there
+        is time left to build the response. None when there is no context.
+        """
+        if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+            return None
+        if margin_ms is None:
+            margin_ms = int(os.getenv("AUTOQA_DEADLINE_MARGIN_MS", 1000))
+        return cls(max(0, context.get_remaining_time_in_millis() - margin_ms) / 1000)
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+def status_code_of(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+def is_retryable(error):
+    """Rate limits, server errors, timeouts and connection errors are retryable; everything else is fatal."""
+    status = status_code_of(error)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+def parse_duration(value):
+    """Seconds in a retry/reset header: plain seconds, an HTTP date or a Groq duration like "1m2.5s"."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    match = DURATION_PATTERN.match(value)
+    if match and any(match.groups()):
+        hours, minutes, seconds, millis = (float(group) if group else 0.0 for group in match.groups())
+        return hours * 3600 + minutes * 60 + seconds + millis / 1000
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def retry_after_seconds(error):
+    """Server-requested wait from retry-after(-ms) or, for rate limits, the x-ratelimit-reset-* headers."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        millis = parse_duration(headers.get("retry-after-ms"))
+        if millis is not None:
+            return millis / 1000
+    if headers.get("retry-after"):
+        return parse_duration(headers.get("retry-after"))
+    if status_code_of(error) == 429:
+        resets = [parse_duration(headers.get(name)) for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+        resets = [reset for reset in resets if reset is not None]
+        # Waiting for the later reset guarantees both budgets have room again
+        return max(resets) if resets else None
+    return None
+
+class RetryPolicy:
+    """
+    Calls a function, retrying retryable errors with exponential backoff and
+    full jitter. A server-provided retry-after takes precedence over the
+    backoff. With a Deadline, no attempt is started that could not finish in
+    time; DeadlineExceeded is raised instead.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=20.0, min_attempt_time=1.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # An attempt started with less time than this left cannot realistically finish
+        self.min_attempt_time = min_attempt_time
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_attempts=int(os.getenv("AUTOQA_MAX_ATTEMPTS", 4)),
+            base_delay=float(os.getenv("AUTOQA_RETRY_BASE_DELAY", 0.5)),
+            max_delay=float(os.getenv("AUTOQA_RETRY_MAX_DELAY", 20.0)),
+        )
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff for the given (1-based) attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def call(self, function, deadline=None):
+        """Run function() until it succeeds, a fatal error occurs, attempts run out or the deadline nears."""
+        attempt = 0
+        while True:
+            attempt += 1
+            if deadline and deadline.remaining() < self.min_attempt_time:
+                metrics.current().increment("deadline_exceeded")
+                raise DeadlineExceeded(f"No time left for attempt {attempt}")
+            try:
+                return function()
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_attempts:
+                    raise
+                retry_after = retry_after_seconds(e)
+                delay = retry_after if retry_after is not None else self.backoff(attempt)
+                if deadline and delay + self.min_attempt_time > deadline.remaining():
+                    metrics.current().increment("deadline_exceeded")
+                    raise DeadlineExceeded(f"Retry after {delay:.1f}s would pass the deadline") from e
+                logging.warning(f"Attempt {attempt} failed with {type(e).__name__} ({status_code_of(e)}); retrying in {delay:.2f}s")
+                metrics.current().increment("llm_retries")
+                metrics.current().record("retry_wait_ms", delay * 1000)
+                time.sleep(delay)
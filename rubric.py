@@ -0,0 +1,159 @@
+import json
+import os
+
+from llm_json import RUBRIC_SCHEMA, coerce_score, normalize_fatal
+
+# Score column of each category in responses and results files
+CATEGORY_COLUMNS = {
+    "Opening": "Opening Score",
+    "Communication skills": "Communication Skills Score",
+    "Chat Handling": "Chat Handling Score",
+    "Product Knowledge": "Product Knowledge Score",
+}
+FATAL_POLICIES = ("zero", "deduct", "cap", "ignore")
+
+DEFAULT_RUBRIC = {
+    "categories": {
+        category: {"column": CATEGORY_COLUMNS[category], "weight": 1, "items": dict(items)}
+        for category, items in RUBRIC_SCHEMA.items()
+    },
+    # "zero": a fatal error zeroes the total; "deduct"/"cap": subtract `value` from / cap the total at `value`
+    "fatal": {"policy": "zero", "value": 0},
+}
+
+def item_column(category, item):
+    """Flat column name of a rubric item in item score frames."""
+    return f"{category} :: {item}"
+
+def whole(value):
+    return int(value) if float(value).is_integer() else round(value, 2)
+
+class Rubric:
+    """
+    How item scores of an evaluation add up to the category and total scores:
+    the points of each item, a weight per category and the fatal policy.
+
+    The LLM always scores items on the prompt's scale (RUBRIC_SCHEMA). An item
+    worth a different number of points here is rescaled, so a stored
+    llm_response can be rescored under a new rubric without asking the model
+    again; items the prompt does not ask for score zero.
+    """
+
+    def __init__(self, categories, fatal_policy="zero", fatal_value=0):
+        if fatal_policy not in FATAL_POLICIES:
+            raise ValueError(f"Unknown fatal policy {fatal_policy!r}; expected one of {FATAL_POLICIES}")
+        self.categories = categories
+        self.fatal_policy = fatal_policy
+        self.fatal_value = fatal_value
+
+    @classmethod
+    def from_dict(cls, data):
+        fatal = data.get("fatal", {})
+        categories = {
+            category: {
+                "column": spec.get("column", CATEGORY_COLUMNS.get(category, f"{category} Score")),
+                "weight": spec.get("weight", 1),
+                "items": dict(spec["items"]),
+            }
+            for category, spec in data["categories"].items()
+        }
+        return cls(categories, fatal.get("policy", "zero"), fatal.get("value", 0))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r") as file:
+            return cls.from_dict(json.load(file))
+
+    @classmethod
+    def from_env(cls):
+        """The rubric in the JSON file AUTOQA_RUBRIC, else DEFAULT_RUBRIC."""
+        path = os.getenv("AUTOQA_RUBRIC")
+        return cls.from_file(path) if path else cls.from_dict(DEFAULT_RUBRIC)
+
+    def scale(self, category, item):
+        """Factor from the prompt's points of an item to this rubric's."""
+        asked = RUBRIC_SCHEMA.get(category, {}).get(item)
+        points = self.categories[category]["items"][item]
+        return points / asked if asked else 0.0
+
+    def apply_fatal(self, total, fatal):
+        if not fatal or self.fatal_policy == "ignore":
+            return total
+        if self.fatal_policy == "zero":
+            return 0
+        if self.fatal_policy == "deduct":
+            return max(0, total - self.fatal_value)
+        return min(total, self.fatal_value)
+
+    def score(self, llm_response):
+        """Category scores, "Fatal Error" ("Yes"/"No") and "Total Score" of one evaluation."""
+        scores = {}
+        for category, spec in self.categories.items():
+            section = llm_response.get(category)
+            section = section if isinstance(section, dict) else {}
+            points = 0
+            for item in spec["items"]:
+                value = coerce_score(section.get(item))
+                if value is not None:
+                    points += value * self.scale(category, item)
+            scores[spec["column"]] = whole(points * spec["weight"])
+        fatal = normalize_fatal(llm_response.get("Fatal", "no")) == "yes"
+        scores["Fatal Error"] = "Yes" if fatal else "No"
+        scores["Total Score"] = whole(self.apply_fatal(sum(scores[spec["column"]] for spec in self.categories.values()), fatal))
+        return scores
+
+    def score_frame(self, items):
+        """
+        Vectorized score() over an item score frame (see item_frame): one row
+        per evaluation with the category score columns, Fatal Error and Total Score.
+        """
+        import numpy as np
+        import pandas as pd
+
+        scores = pd.DataFrame(index=items.index)
+        total = np.zeros(len(items))
+        for category, spec in self.categories.items():
+            columns = [item_column(category, item) for item in spec["items"]]
+            values = items.reindex(columns=columns).to_numpy(dtype=float, na_value=0.0)
+            scales = np.array([self.scale(category, item) for item in spec["items"]])
+            category_score = (values @ scales) * spec["weight"] if columns else np.zeros(len(items))
+            scores[spec["column"]] = category_score
+            total += category_score
+        fatal = items["Fatal"].to_numpy(dtype=bool)
+        if self.fatal_policy == "zero":
+            total = np.where(fatal, 0.0, total)
+        elif self.fatal_policy == "deduct":
+            total = np.where(fatal, np.maximum(0.0, total - self.fatal_value), total)
+        elif self.fatal_policy == "cap":
+            total = np.where(fatal, np.minimum(total, self.fatal_value), total)
+        scores["Fatal Error"] = np.where(fatal, "Yes", "No")
+        scores["Total Score"] = total
+        return scores.round(2)
+
+def item_frame(llm_responses, index=None):
+    """
+    Item scores of stored evaluations (dicts or JSON strings) as a frame with
+    one item_column() per RUBRIC_SCHEMA item and a boolean Fatal column.
+    Missing or unparseable scores are NaN.
+    """
+    import pandas as pd
+
+    columns = {item_column(category, item): [] for category, items in RUBRIC_SCHEMA.items() for item in items}
+    fatal = []
+    for response in llm_responses:
+        if isinstance(response, str):
+            try:
+                response = json.loads(response)
+            except ValueError:
+                response = None
+        response = response if isinstance(response, dict) else {}
+        for category, items in RUBRIC_SCHEMA.items():
+            section = response.get(category)
+            section = section if isinstance(section, dict) else {}
+            for item in items:
+                value = coerce_score(section.get(item))
+                columns[item_column(category, item)].append(float("nan") if value is None else value)
+        fatal.append(normalize_fatal(response.get("Fatal", "no")) == "yes")
+    frame = pd.DataFrame(columns, index=index, dtype=float)
+    frame["Fatal"] = fatal
+    return frame
@@ -0,0 +1,218 @@
+import contextvars
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from eval_cache import hash_text, make_cache_key
+from llm_json import RUBRIC_SCHEMA, load_json_object, normalize_fatal, validate_category
+
+# Sections of a split evaluation and the numbered parameters of the rubric prompt each one is asked about
+SECTIONS = {
+    "Fatal": (5,),
+    "Opening": (1,),
+    "Communication skills": (2,),
+    "Chat Handling": (3,),
+    "Product Knowledge": (4,),
+    "Summary": (6, 7),
+}
+PARAMETER_PATTERN = re.compile(r"^\s*(\d+)\. ")
+
+SECTION_PROMPT = """
+            You are tasked with evaluating one part of a conversation between a customer and an agent. Assess only the
+            parameters below, fairly, consistently and objectively, and give each score out of the maximum given.
+
+{parameters}
+
+            # Return only this JSON object, do not return any additional text in the response
+            {format}
+
+            Transcript:
+            {transcript}
+        """
+
+SKIPPED_REASONING = "Not evaluated: a fatal error was found."
+
+def rubric_parameters(rubric_prompt):
+    """The numbered parameter blocks ("1. Opening ..." up to the task steps) of the rubric prompt, by number."""
+    start = rubric_prompt.index("Evaluation Parameters:")
+    end = rubric_prompt.index("Task Steps:")
+    blocks, number = {}, None
+    for line in rubric_prompt[start:end].split("\n")[1:]:
+        match = PARAMETER_PATTERN.match(line)
+        if match:
+            number = int(match.group(1))
+            blocks[number] = []
+        if number is not None and line.strip():
+            blocks[number].append(line)
+    return {number: "\n".join(lines) for number, lines in blocks.items()}
+
+def section_format(section, excluded_items=()):
+    """The JSON a section is answered with, written like the rubric prompt's own format."""
+    indent = " " * 12
+    if section == "Fatal":
+        return f'{{\n{indent}    "Fatal": <yes or no>,\n{indent}    "Reasoning": <reasoning>\n{indent}}}'
+    if section == "Summary":
+        return f'{{\n{indent}    "Sentiment": <overall_sentiment>,\n{indent}    "Summary": <summary_of_transcript>\n{indent}}}'
+    lines = [f'{indent}        "{item}": <score>,' for item in RUBRIC_SCHEMA[section] if item not in excluded_items]
+    lines.append(f'{indent}        "Reasoning": <reasoning_for_score>')
+    return f'{{\n{indent}    "{section}": {{\n' + "\n".join(lines) + f'\n{indent}    }}\n{indent}}}'
+
+def parse_section(section, output, excluded_items=()):
+    """A section's JSON, validated (scores coerced and clamped), or None."""
+    if not output:
+        return None
+    data, _ = load_json_object(output)
+    if not isinstance(data, dict):
+        return None
+    if section == "Fatal":
+        fatal = normalize_fatal(data.get("Fatal"))
+        if fatal is None:
+            return None
+        return {"Fatal": fatal, "Reasoning": data.get("Reasoning", "")}
+    if section == "Summary":
+        if not isinstance(data.get("Summary"), str) or "Sentiment" not in data:
+            return None
+        return {"Sentiment": data["Sentiment"], "Summary": data["Summary"]}
+    if validate_category(section, data.get(section), excluded_items):
+        return None
+    return {section: data[section]}
+
+class SplitEvaluator:
+    """
+    Evaluates a transcript with one small prompt per section (see SECTIONS)
+    instead of the whole rubric in one completion, and merges the answers
+    into the usual llm_response. Sections run concurrently, so the latency
+    is that of the longest section, and each one is cached and re-asked on
+    its own: a malformed Product Knowledge answer does not redo the others.
+
+    Fatal is asked first. When it is "yes" and the rubric zeroes fatal
+    tickets (`skip_on_fatal`), the four scored categories are not asked and
+    score zero; the summary is asked alongside Fatal either way.
+    """
+
+    def __init__(self, max_concurrency=5, skip_on_fatal=True):
+        self.max_concurrency = max_concurrency
+        self.skip_on_fatal = skip_on_fatal
+
+    @classmethod
+    def from_env(cls):
+        """A SplitEvaluator if AUTOQA_SPLIT is "on", else None."""
+        if os.getenv("AUTOQA_SPLIT", "off") != "on":
+            return None
+        return cls(
+            max_concurrency=int(os.getenv("AUTOQA_SPLIT_CONCURRENCY", 5)),
+            skip_on_fatal=os.getenv("AUTOQA_SPLIT_SKIP_ON_FATAL", "on") != "off",
+        )
+
+    def section_prompts(self, evaluator):
+        """Prompt template of each section, with a {transcript} placeholder."""
+        parameters = rubric_parameters(evaluator.rubric_prompt())
+        excluded_items = evaluator.excluded_items()
+        return {
+            section: SECTION_PROMPT.replace("{parameters}", "\n".join(parameters[number] for number in numbers))
+            .replace("{format}", section_format(section, excluded_items))
+            for section, numbers in SECTIONS.items()
+        }
+
+    def version(self, evaluator):
+        """Hash of all section prompts, part of the evaluator's prompt version in split mode."""
+        prompts = self.section_prompts(evaluator)
+        return hash_text("\n".join(prompts[section] for section in SECTIONS))
+
+    def evaluate(self, evaluator, transcript, prompt_transcript=None, reference=""):
+        """
+        Evaluate `transcript` section by section. `prompt_transcript` is what
+        the prompts show when it differs (a condensed transcript), `reference`
+        is appended to every prompt. Returns (llm_response or None,
+        input_tokens, output_tokens, status of each section).
+        """
+        templates = self.section_prompts(evaluator)
+        prompt_transcript = prompt_transcript or transcript
+        deadline = getattr(evaluator.call_state, "deadline", None)
+        untimed = getattr(evaluator.call_state, "untimed", False)
+        meter = getattr(evaluator.call_state, "meter", None)
+
+        def run(section):
+            # Worker threads have their own call_state; carry the invocation deadline, timing mode and token meter over
+            evaluator.call_state.deadline = deadline
+            evaluator.call_state.untimed = untimed
+            evaluator.call_state.meter = meter
+            prompt = templates[section].replace("{transcript}", prompt_transcript) + reference
+            return self.run_section(evaluator, section, transcript, templates[section], prompt)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_concurrency)) as executor:
+            def submit(section):
+                return executor.submit(contextvars.copy_context().run, run, section)
+
+            futures = {"Summary": submit("Summary"), "Fatal": submit("Fatal")}
+            fatal = futures["Fatal"].result()[0]
+            skip = (
+                self.skip_on_fatal and fatal is not None and fatal["Fatal"] == "yes"
+                and evaluator.rubric.fatal_policy == "zero"
+            )
+            # A Fatal section that cannot be answered fails the evaluation, so the categories are not asked either
+            if fatal is not None and not skip:
+                futures.update({category: submit(category) for category in RUBRIC_SCHEMA})
+            results = {section: future.result() for section, future in futures.items()}
+
+        input_tokens = sum(result[1] for result in results.values())
+        output_tokens = sum(result[2] for result in results.values())
+        statuses = {section: result[3] for section, result in results.items()}
+        if any(result[0] is None for result in results.values()):
+            return None, input_tokens, output_tokens, statuses
+
+        llm_response = {}
+        excluded_items = evaluator.excluded_items()
+        for category in RUBRIC_SCHEMA:
+            if category in results:
+                llm_response.update(results[category][0])
+            else:
+                statuses[category] = "skipped"
+                metrics.current().increment("split_sections_skipped")
+                section = {item: 0 for item in RUBRIC_SCHEMA[category] if item not in excluded_items}
+                llm_response[category] = dict(section, Reasoning=SKIPPED_REASONING)
+        llm_response["Fatal"] = results["Fatal"][0]["Fatal"]
+        llm_response["Fatal Reasoning"] = results["Fatal"][0]["Reasoning"]
+        llm_response.update(results["Summary"][0])
+        return llm_response, input_tokens, output_tokens, statuses
+
+    def run_section(self, evaluator, section, transcript, template, prompt):
+        """
+        Ask one section, from the cache if possible, re-asking up to the
+        evaluator's max_parse_attempts while the answer does not parse.
+        Returns (data or None, input_tokens, output_tokens, status).
+        """
+        cache_key = None
+        if evaluator.cache:
+            cache_key = make_cache_key(transcript, evaluator.model_id, hash_text(template))
+            cached = evaluator.cache.get(cache_key)
+            if cached:
+                return cached["data"], cached["input_tokens"], cached["output_tokens"], "hit"
+
+        excluded_items = evaluator.excluded_items()
+        input_tokens = output_tokens = 0
+        for attempt in range(evaluator.max_parse_attempts):
+            metrics.current().increment("llm_attempts")
+            output, token_usage = evaluator.call_groq_inference(
+                prompt, validate=lambda text: parse_section(section, text, excluded_items) is not None
+            )
+            input_tokens += (token_usage or {}).get("prompt_tokens", 0)
+            output_tokens += (token_usage or {}).get("completion_tokens", 0)
+            if not output:
+                # Transport errors were already retried by the retry policy; a new attempt would repeat them
+                logging.warning(f"{section}: no result returned from LLM.")
+                break
+            data = parse_section(section, output, excluded_items)
+            if data is not None:
+                if not evaluator.served_by_primary_model():
+                    return data, input_tokens, output_tokens, "failover"
+                if cache_key:
+                    evaluator.cache.put(cache_key, {"data": data, "input_tokens": input_tokens, "output_tokens": output_tokens})
+                return data, input_tokens, output_tokens, "ok" if attempt == 0 else "retried"
+            logging.warning(f"{section} attempt {attempt + 1}: failed to parse LLM output.")
+            deadline = getattr(evaluator.call_state, "deadline", None)
+            if deadline and deadline.expired():
+                break
+        return None, input_tokens, output_tokens, "failed"
@@ -0,0 +1,62 @@
+import pytest
+
+import inference_backends
+import lambda_function
+from batch_runner import BatchRunner
+from mock_groq import MockConfig, MockGroqServer
+from transcript_packing import TranscriptPacker
+
+def ticket(number, timed=True):
+    lines = [
+        ("10:00:00", "Customer", f"Order {number} is stuck in processing"),
+        ("10:00:30", "Agent", f"Let me check order {number} for you"),
+    ]
+    if timed:
+        return "\n".join(f"2024-10-01T{time}Z - {user} - {message}" for time, user, message in lines)
+    return "\n".join(f"{user} - {message}" for _, user, message in lines)
+
+@pytest.fixture
+def evaluator(monkeypatch):
+    with MockGroqServer(MockConfig(latency_ms=0, seed=1)) as server:
+        monkeypatch.setenv("GROQ_BASE_URL", server.url)
+        monkeypatch.setenv("GROQ_API", "mock")
+        monkeypatch.setenv("AUTOQA_CACHE", "memory")
+        monkeypatch.setenv("AUTOQA_METRICS", "off")
+        monkeypatch.setattr(inference_backends, "_router", None)
+        yield lambda_function.ChatAgentEvaluator()
+
+def test_cache_hits_spend_no_tokens(evaluator):
+    runner = BatchRunner(evaluator, max_in_flight=1)
+    (_, first, _, first_spent), = runner.run([("A", ticket(1))])
+    (_, second, _, second_spent), = runner.run([("B", ticket(1))])
+    assert first_spent == first[4] + first[5] > 0
+    # The cached result still reports the stored token counts
+    assert (second[4], second[5]) == (first[4], first[5])
+    assert second_spent == 0
+
+def test_packed_tickets_split_the_tokens_spent(evaluator):
+    runner = BatchRunner(evaluator, max_in_flight=1)
+    list(runner.run([("A", ticket(1))]))
+    results = runner.evaluate_pack([(code, ticket(number)) for code, number in (("A", 1), ("B", 2), ("C", 3))])
+    spent = {code: spent_tokens for code, _, _, spent_tokens in results}
+    assert spent["A"] == 0
+    assert spent["B"] + spent["C"] == sum(result[4] + result[5] for code, result, _, _ in results if code != "A")
+
+@pytest.mark.parametrize("packer", [None, TranscriptPacker()])
+def test_timing_is_scored_once_per_chunk(evaluator, monkeypatch, packer):
+    batches = []
+    score_batch = evaluator.timing_engine.score_batch
+
+    def recorded(transcripts):
+        batches.append(len(transcripts))
+        return score_batch(transcripts)
+
+    monkeypatch.setattr(evaluator.timing_engine, "score_batch", recorded)
+    runner = BatchRunner(evaluator, max_in_flight=2, packer=packer, chunk_size=3)
+    records = [("A", ticket(1)), ("B", ticket(2, timed=False)), ("C", ticket(3)), ("D", ticket(4))]
+    results = {code: result for code, result, _, _ in runner.run(records)}
+    assert batches == [3, 1]
+    assert all(result[0] for result in results.values())
+    # The chunk's timing scores are merged into the timed tickets' results
+    item = lambda_function.TIMING_RUBRIC_ITEMS["Opening"]
+    assert results["A"][3]["Opening"][item] == evaluator.timing_engine.score_transcript(ticket(1))[item]
@@ -0,0 +1,54 @@
+import pytest
+
+import inference_backends
+import lambda_function
+from mock_groq import MockConfig, MockGroqServer
+
+def ticket(number, timed=True):
+    lines = [
+        ("10:00:00", "Customer", f"Order {number} is stuck in processing"),
+        ("10:00:30", "Agent", f"Let me check order {number} for you"),
+    ]
+    if timed:
+        return "\n".join(f"2024-10-01T{time}Z - {user} - {message}" for time, user, message in lines)
+    return "\n".join(f"{user} - {message}" for _, user, message in lines)
+
+@pytest.fixture
+def evaluator(monkeypatch):
+    with MockGroqServer(MockConfig(latency_ms=0, seed=1)) as server:
+        monkeypatch.setenv("GROQ_BASE_URL", server.url)
+        monkeypatch.setenv("GROQ_API", "mock")
+        monkeypatch.setenv("AUTOQA_CACHE", "memory")
+        monkeypatch.setenv("AUTOQA_METRICS", "off")
+        monkeypatch.setattr(inference_backends, "_router", None)
+        evaluator = lambda_function.ChatAgentEvaluator()
+        calls = []
+        call_groq_inference = evaluator.call_groq_inference
+
+        def recorded(prompt, validate=None):
+            output, token_usage = call_groq_inference(prompt, validate)
+            calls.append(("### Ticket" in prompt, token_usage))
+            return output, token_usage
+
+        monkeypatch.setattr(evaluator, "call_groq_inference", recorded)
+        evaluator.calls = calls
+        yield evaluator
+
+def test_packed_tickets_are_cached_under_the_timed_prompt(evaluator):
+    # The untimed ticket comes last, so its timing mode is the one prepare_transcript leaves behind
+    evaluator.evaluate_packed([ticket(1), ticket(2), ticket(3, timed=False)])
+    for number in (1, 2):
+        evaluator.evaluate_conversation(ticket(number))
+        assert evaluator.call_state.cache_status == "hit"
+    evaluator.evaluate_conversation(ticket(3, timed=False))
+    assert evaluator.call_state.cache_status == "hit"
+
+def test_token_shares_add_up_to_the_packed_call(evaluator):
+    results = evaluator.evaluate_packed([ticket(1), ticket(2, timed=False), ticket(3), ticket(4)])
+    assert all(result[0] for result in results)
+    (packed_usage,) = [usage for packed, usage in evaluator.calls if packed]
+    (single_usage,) = [usage for packed, usage in evaluator.calls if not packed]
+    packed_results = [results[0], results[2], results[3]]
+    assert sum(result[4] for result in packed_results) == packed_usage["prompt_tokens"]
+    assert sum(result[5] for result in packed_results) == packed_usage["completion_tokens"]
+    assert (results[1][4], results[1][5]) == (single_usage["prompt_tokens"], single_usage["completion_tokens"])
@@ -0,0 +1,19 @@
+import time
+
+import pytest
+
+from hedging import Hedger
+
+def test_failed_hedge_releases_its_reservation():
+    hedger = Hedger(min_samples=1, max_extra_ratio=1.0, max_workers=2)
+    hedger.latencies.add(0.001)
+    hedger.budget.record_used(1000)
+
+    def attempt(route, cancel):
+        time.sleep(0.05)
+        raise ConnectionError("backend unavailable")
+
+    with pytest.raises(ConnectionError):
+        hedger.run(attempt, "realtime", bool)
+    assert hedger.counts["hedged"] == 1
+    assert hedger.budget.reserved_tokens == 0
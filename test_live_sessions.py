@@ -0,0 +1,49 @@
+import threading
+
+from live_sessions import LiveSessionEvaluator, new_session, parse_timestamp
+
+class Formatter:
+    """Just the part of ChatAgentEvaluator that new_entries uses."""
+    def format_transcript(self, transcript):
+        return "\n".join(f"{entry['timestamp']} - {entry['user']} - {entry['message']}" for entry in transcript)
+
+def message(second, user, text):
+    return {"timestamp": f"2024-10-01T10:00:{second:02d}Z", "user": user, "message": text}
+
+def test_resent_conversation_keeps_messages_sharing_a_timestamp():
+    live = LiveSessionEvaluator(Formatter(), store=None)
+    state = new_session("s1")
+    first = [message(0, "Customer", "hi"), message(5, "Customer", "order 42"), message(5, "Agent", "hello")]
+    assert [entry.message for entry in live.new_entries(state, first)] == ["hi", "order 42", "hello"]
+
+    resent = first + [message(5, "Customer", "is it shipped?"), message(9, "Agent", "checking")]
+    assert [entry.message for entry in live.new_entries(state, resent)] == ["is it shipped?", "checking"]
+    assert live.new_entries(state, resent) == []
+
+def test_repeated_message_at_the_same_timestamp_is_counted():
+    live = LiveSessionEvaluator(Formatter(), store=None)
+    state = new_session("s1")
+    live.new_entries(state, [message(0, "Customer", "hello")])
+    resent = [message(0, "Customer", "hello"), message(0, "Customer", "hello")]
+    assert [entry.message for entry in live.new_entries(state, resent)] == ["hello"]
+
+def test_offsets_are_converted_to_utc():
+    assert parse_timestamp("2024-10-01T15:30:00+05:30") == parse_timestamp("2024-10-01T10:00:00Z")
+
+def test_session_locks_are_released():
+    live = LiveSessionEvaluator(Formatter(), store=None)
+    entered = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with live.lock_for("s1"):
+            entered.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    entered.wait()
+    assert list(live.locks) == ["s1"]
+    release.set()
+    thread.join()
+    assert live.locks == {}
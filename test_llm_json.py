@@ -0,0 +1,63 @@
+import json
+
+from llm_json import RUBRIC_SCHEMA, parse_evaluation
+
+TIMING_ITEMS = ("First response given within defined timeframe", "Timely response")
+
+def full_evaluation():
+    evaluation = {
+        category: dict({item: maximum for item, maximum in items.items()}, Reasoning="ok")
+        for category, items in RUBRIC_SCHEMA.items()
+    }
+    evaluation.update({"Fatal": "no", "Sentiment": "Neutral", "Summary": "Customer asked about an order."})
+    return evaluation
+
+def test_clean_output():
+    data, status = parse_evaluation(json.dumps(full_evaluation()), stats=None)
+    assert status == "clean"
+    assert data["Product Knowledge"]["Screenshot / knowledgebase / steps / reference"] == 10
+
+def test_repairable_output():
+    output = "Here is the evaluation:\n```json\n" + json.dumps(full_evaluation()).replace('"no"', "no") + "\n```"
+    data, status = parse_evaluation(output, stats=None)
+    assert status == "repaired"
+    assert data["Fatal"] == "no"
+
+def test_truncated_inside_category_fails():
+    output = json.dumps(full_evaluation())
+    cut = output.index('"Possible Resolution')
+    data, status = parse_evaluation(output[:cut], stats=None)
+    assert (data, status) == (None, "failed")
+
+def test_truncated_before_fatal_fails():
+    output = json.dumps(full_evaluation())
+    data, status = parse_evaluation(output[:output.index('"Fatal"')], stats=None)
+    assert (data, status) == (None, "failed")
+
+def test_missing_summary_fails():
+    evaluation = full_evaluation()
+    del evaluation["Summary"]
+    assert parse_evaluation(json.dumps(evaluation), stats=None) == (None, "failed")
+
+def test_missing_item_fails():
+    evaluation = full_evaluation()
+    del evaluation["Chat Handling"]["Internal Notes"]
+    assert parse_evaluation(json.dumps(evaluation), stats=None) == (None, "failed")
+
+def test_excluded_items_are_not_required():
+    evaluation = full_evaluation()
+    del evaluation["Opening"][TIMING_ITEMS[0]]
+    del evaluation["Communication skills"][TIMING_ITEMS[1]]
+    data, status = parse_evaluation(json.dumps(evaluation), excluded_items=TIMING_ITEMS, stats=None)
+    assert status == "clean"
+    assert TIMING_ITEMS[0] not in data["Opening"]
+
+def test_scores_are_coerced_and_clamped():
+    evaluation = full_evaluation()
+    evaluation["Opening"]["Opening statement (Pre-defined)"] = "4/5"
+    evaluation["Chat Handling"]["Chat Disposition"] = 9
+    evaluation["Fatal"] = "YES"
+    data, _ = parse_evaluation(json.dumps(evaluation), stats=None)
+    assert data["Opening"]["Opening statement (Pre-defined)"] == 4
+    assert data["Chat Handling"]["Chat Disposition"] == 5
+    assert data["Fatal"] == "yes"
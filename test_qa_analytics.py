@@ -0,0 +1,37 @@
+from qa_analytics import QARollups
+
+def transcript(agent):
+    return "\n".join([
+        "2022-11-15T10:00:00Z - Customer - My order has not arrived",
+        f"2022-11-15T10:01:00Z - {agent} - Assignee changed to {agent} ( CS_PREMIUM ) by {agent}",
+        f"2022-11-15T10:02:00Z - {agent} - Tags changed  to [P2, delivery] by {agent}",
+        f"2022-11-15T10:05:00Z - System - Resolved by {agent}",
+    ])
+
+def result(code, total, fatal="no"):
+    return {
+        "Code": code, "Opening Score": 10.0, "Communication Skills Score": 20.0, "Chat Handling Score": 30.0,
+        "Product Knowledge Score": 15.0, "Total Score": total, "Fatal Error": fatal, "Sentiment": "Positive",
+    }
+
+def test_re_evaluated_code_replaces_its_counts(tmp_path):
+    rollups = QARollups(str(tmp_path))
+    list(rollups.track([("A", transcript("Asha")), ("B", transcript("Ben"))]))
+    rollups.add_results([result("A", 75.0), result("B", 80.0)])
+    list(rollups.track([("A", transcript("Carla"))]))
+    rollups.add_results([result("A", 90.0, fatal="yes")])
+
+    every = rollups.query("all").loc["all"]
+    assert every["tickets"] == 2
+    assert every["fatal_rate"] == 0.5
+    assert every["Total Score mean"] == 85.0
+    # The earlier evaluation's agent no longer has the ticket
+    assert set(rollups.query("agent").index) == {"Ben", "Carla"}
+    assert rollups.query("tag").loc["P2", "tickets"] == 2
+
+    # Saved with every add_results, including what each code was counted with
+    resumed = QARollups(str(tmp_path))
+    list(resumed.track([("B", transcript("Ben"))]))
+    resumed.add_results([result("B", 60.0)])
+    assert resumed.query("all").loc["all", "tickets"] == 2
+    assert resumed.query("all").loc["all", "Total Score mean"] == 75.0
@@ -0,0 +1,13 @@
+import pytest
+
+from rate_limiter import RateLimiter, TokenBucket
+
+@pytest.mark.parametrize("requests_per_minute, tokens_per_minute", [(0, 6000), (30, 0), (-1, 6000)])
+def test_non_positive_limits_are_rejected(requests_per_minute, tokens_per_minute):
+    with pytest.raises(ValueError):
+        RateLimiter(requests_per_minute, tokens_per_minute)
+
+def test_wait_time_of_an_empty_bucket():
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.01)
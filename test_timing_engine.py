@@ -0,0 +1,16 @@
+from timing_engine import TimingEngine
+
+TRANSCRIPT = """2024-10-01{sep}10:00:00{zone} - Customer - my order is stuck
+2024-10-01{sep}10:00:20{zone} - Unicommerce Customer Support - Assignee changed to Agent A (CS_PREMIUM) by defaultEnterprise
+2024-10-01{sep}10:00:50{zone} - Agent A - Hi, let me check that for you"""
+
+def test_offsets_and_space_separators_are_parsed():
+    engine = TimingEngine()
+    utc = engine.score_transcript(TRANSCRIPT.format(sep="T", zone="Z"))
+    for sep, zone in ((" ", "+05:30"), ("T", "-0400"), (" ", "")):
+        assert engine.score_transcript(TRANSCRIPT.format(sep=sep, zone=zone)) == utc
+
+def test_untimed_transcript_is_not_scored():
+    engine = TimingEngine()
+    assert engine.score_transcript("Customer - my order is stuck\nAgent A - Hi") is None
+    assert engine.score_batch({1: TRANSCRIPT.format(sep="T", zone="Z"), 2: "no timestamps"})["timed"].tolist() == [True, False]
@@ -0,0 +1,30 @@
+import math
+
+import pytest
+
+import inference_backends
+import lambda_function
+from token_estimates import CHARS_PER_TOKEN, estimate_tokens
+
+@pytest.fixture
+def evaluator(monkeypatch):
+    monkeypatch.setenv("GROQ_API", "mock")
+    monkeypatch.setenv("AUTOQA_CACHE", "off")
+    monkeypatch.setattr(inference_backends, "_router", None)
+    return lambda_function.ChatAgentEvaluator()
+
+def test_estimate_is_characters_over_3_5_rounded_up():
+    assert CHARS_PER_TOKEN == 3.5
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("x") == 1
+    assert estimate_tokens("x" * 35) == 10
+    assert estimate_tokens("x" * 36) == 11
+
+def test_count_tokens_falls_back_to_the_shared_estimate(evaluator):
+    text = "Hello, how can I help you with your order today?" * 10
+    assert evaluator.count_tokens(text=text) == estimate_tokens(text) == math.ceil(len(text) / 3.5)
+    # The previous heuristic, int(len * 1.15 * 3 / 4), gave a different count
+    assert evaluator.count_tokens(text=text) != int(len(text) * 1.15 * 3 / 4)
+
+def test_count_tokens_prefers_reported_usage(evaluator):
+    assert evaluator.count_tokens(text="x" * 35, usage={"total_tokens": 42}) == 42
@@ -0,0 +1,154 @@
+import re
+import numpy as np
+import pandas as pd
+
+from transcript_compaction import parse_entries
+
+# Raw export events and their compacted markers (see transcript_compaction)
+ASSIGNMENT_PATTERN = re.compile(
+    r"^(?:(?:Assignee changed|Assigned) to (?!null\b|UNASSIGNED\b)(.+?) \(|\[assigned to (.+?) \()"
+)
+SYSTEM_PATTERN = re.compile(
+    r"^(?:Assignee changed to|Assigned to|Tags changed|Resolved by|Reopened by|Closed Automatically|\[)"
+)
+AUTO_GREETING_PATTERN = re.compile(r"Thank you for reaching out to us|Kindly note, we will chat in English")
+# Agent messages that put the customer on hold ("Wait let me check"); the customer keeps waiting after them
+HOLD_PATTERN = re.compile(r"\b(?:wait|let me check|checking|hold on|give me)\b", re.IGNORECASE)
+
+FIRST_RESPONSE_ITEM = "First response given within defined timeframe"
+TIMELY_RESPONSE_ITEM = "Timely response"
+
+class TimingEngine:
+    """
+    Computes the time-based rubric items from transcript timestamps instead of
+    asking the LLM:
+
+    - First response given within defined timeframe (10 points): the first
+      agent message comes within `first_response_limit` seconds of the first
+      assignment (or of the first customer message when the transcript has no
+      assignment events, as in lambda requests).
+    - Timely response (5 points): the customer never waits more than
+      `dead_air_limit` seconds for an agent message, counting from their own
+      message, a (re)assignment or an agent hold message ("let me check").
+      Gaps where the agent is waiting on the customer are not dead air.
+
+    All transcripts of a batch are parsed into one events frame and scored
+    with vectorized group-bys.
+    """
+
+    def __init__(self, first_response_limit=60, dead_air_limit=7 * 60, first_response_points=10, timely_response_points=5):
+        self.first_response_limit = first_response_limit
+        self.dead_air_limit = dead_air_limit
+        self.first_response_points = first_response_points
+        self.timely_response_points = timely_response_points
+
+    def events_frame(self, transcripts):
+        """Parse {ticket: transcript_text} into one events frame with a role per message."""
+        rows = []
+        for ticket, transcript_text in transcripts.items():
+            _, entries = parse_entries(transcript_text)
+            for entry in entries:
+                rows.append((ticket, entry.timestamp, entry.user, entry.message))
+        events = pd.DataFrame(rows, columns=["ticket", "timestamp", "user", "message"])
+        events["timestamp"] = pd.to_datetime(events["timestamp"], format="ISO8601", utc=True, errors="coerce")
+        events = events.dropna(subset=["timestamp"])
+
+        message = events["message"].fillna("")
+        assignee = message.str.extract(ASSIGNMENT_PATTERN).bfill(axis=1).iloc[:, 0]
+        events["assignee"] = assignee
+
+        # Agents are the "agent" user of lambda requests or anyone assigned to the ticket
+        assignees = events.dropna(subset=["assignee"])[["ticket", "assignee"]].drop_duplicates()
+        known_agent = pd.MultiIndex.from_frame(events[["ticket", "user"]].fillna("")).isin(
+            pd.MultiIndex.from_frame(assignees.rename(columns={"assignee": "user"}))
+        )
+        is_assignment = events["assignee"].notna().to_numpy()
+        is_system = (
+            message.str.match(SYSTEM_PATTERN).to_numpy()
+            | message.str.contains(AUTO_GREETING_PATTERN).to_numpy()
+            | events["user"].isna().to_numpy()
+        )
+        is_agent = (events["user"].str.lower().eq("agent").to_numpy() | known_agent) & ~is_system
+        events["role"] = np.select(
+            [is_assignment, is_system, is_agent],
+            ["assignment", "system", "agent"],
+            default="customer",
+        )
+        return events.sort_values(["ticket", "timestamp"], kind="stable").reset_index(drop=True)
+
+    def score_batch(self, transcripts):
+        """
+        Score {ticket: transcript_text}. Returns a frame indexed by ticket with
+        first_response_seconds, max_dead_air_seconds and the two item scores.
+        """
+        events = self.events_frame(transcripts)
+        tickets = pd.Index(list(transcripts.keys()), name="ticket")
+        if events.empty:
+            scores = self._scores_frame(tickets, pd.Series(np.nan, index=tickets), pd.Series(np.nan, index=tickets))
+            scores["timed"] = False
+            return scores
+
+        agent = events[events["role"] == "agent"]
+
+        # Start of the wait: first assignment, else first customer message
+        first_assigned_at = events[events["role"] == "assignment"].groupby("ticket")["timestamp"].min()
+        first_customer_at = events[events["role"] == "customer"].groupby("ticket")["timestamp"].min()
+        wait_started_at = first_assigned_at.combine_first(first_customer_at).reindex(tickets)
+
+        # Agent notes written before the assignment (e.g. internal tickets) are not a response
+        agent_started_at = wait_started_at.reindex(agent["ticket"]).to_numpy()
+        responses = agent[(agent["timestamp"].to_numpy() >= agent_started_at)]
+        first_agent_at = responses.groupby("ticket")["timestamp"].min()
+        first_response = (first_agent_at.reindex(tickets) - wait_started_at).dt.total_seconds()
+
+        # Dead air: gap before each agent message while the customer was waiting on the agent
+        conversation = events[events["role"].isin(["agent", "customer", "assignment"])]
+        grouped = conversation.groupby("ticket")
+        previous_at = grouped["timestamp"].shift()
+        previous_role = grouped["role"].shift()
+        previous_is_hold = grouped["message"].shift().fillna("").str.contains(HOLD_PATTERN)
+        customer_waiting = previous_role.isin(["customer", "assignment"]) | ((previous_role == "agent") & previous_is_hold)
+        gaps = (conversation["timestamp"] - previous_at).dt.total_seconds()
+        agent_gaps = gaps[((conversation["role"] == "agent") & customer_waiting).to_numpy()]
+        max_dead_air = agent_gaps.groupby(conversation.loc[agent_gaps.index, "ticket"]).max().reindex(tickets)
+
+        scores = self._scores_frame(tickets, first_response, max_dead_air)
+        scores["timed"] = tickets.isin(events["ticket"].unique())
+        return scores
+
+    def _scores_frame(self, tickets, first_response, max_dead_air):
+        scores = pd.DataFrame(index=tickets)
+        scores["first_response_seconds"] = first_response.to_numpy()
+        scores["max_dead_air_seconds"] = max_dead_air.to_numpy()
+        # No agent message at all scores zero for first response; no gaps means no dead air
+        scores[FIRST_RESPONSE_ITEM] = np.where(
+            scores["first_response_seconds"].to_numpy() <= self.first_response_limit, self.first_response_points, 0
+        )
+        scores[TIMELY_RESPONSE_ITEM] = np.where(
+            scores["max_dead_air_seconds"].fillna(0).to_numpy() <= self.dead_air_limit, self.timely_response_points, 0
+        )
+        return scores
+
+    def score_transcript(self, transcript_text):
+        """
+        Score a single transcript; returns a dict of the two item scores plus
+        the raw timings, or None when it has no timestamps that can be parsed
+        (the LLM then has to score the two items).
+        """
+        return self.score_transcripts({0: transcript_text})[0]
+
+    def score_transcripts(self, transcripts):
+        """Score {ticket: transcript_text} in one score_batch pass; returns {ticket: score_transcript's result}."""
+        rows = self.score_batch(transcripts).to_dict("index")
+        return {ticket: self._timing_of(rows[ticket]) for ticket in transcripts}
+
+    @staticmethod
+    def _timing_of(row):
+        if not row["timed"]:
+            return None
+        return {
+            FIRST_RESPONSE_ITEM: int(row[FIRST_RESPONSE_ITEM]),
+            TIMELY_RESPONSE_ITEM: int(row[TIMELY_RESPONSE_ITEM]),
+            "first_response_seconds": None if pd.isna(row["first_response_seconds"]) else float(row["first_response_seconds"]),
+            "max_dead_air_seconds": None if pd.isna(row["max_dead_air_seconds"]) else float(row["max_dead_air_seconds"]),
+        }
@@ -0,0 +1,8 @@
+import math
+
+# Conservative characters-per-token ratio: pre-flight estimates against the context window, rate limits and budgets
+CHARS_PER_TOKEN = 3.5
+
+def estimate_tokens(text):
+    """Estimated tokens of a text; the one estimate used wherever tokens are counted before a call."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
@@ -0,0 +1,63 @@
+import re
+
+from token_estimates import CHARS_PER_TOKEN, estimate_tokens
+from transcript_compaction import parse_entries
+
+# Events that start a new phase of the conversation: (re)assignments, queue changes, resolve/reopen
+BOUNDARY_PATTERN = re.compile(
+    r"^(?:Assignee changed to|Assigned to|Resolved by|Reopened by|\[assigned to|\[queued)"
+)
+
+def split_segments(transcript_text):
+    """Split a transcript into conversation segments (lists of rendered lines) at boundary events."""
+    preamble, entries = parse_entries(transcript_text)
+    segments = [preamble] if any(line.strip() for line in preamble) else []
+    current = []
+    for entry in entries:
+        if current and BOUNDARY_PATTERN.match(entry.message):
+            segments.append(current)
+            current = []
+        current.append(entry.render())
+    if current:
+        segments.append(current)
+    return segments
+
+def split_long_line(line, max_tokens):
+    """Hard-split a single line that alone exceeds the budget."""
+    width = max(1, int(max_tokens * CHARS_PER_TOKEN))
+    return [line[start:start + width] for start in range(0, len(line), width)]
+
+def chunk_transcript(transcript_text, max_tokens):
+    """
+    Split a transcript into chunks of at most `max_tokens` (estimated), cutting
+    on conversation boundaries where possible, then on message boundaries, and
+    only as a last resort inside a message.
+    """
+    chunks = []
+    current, current_tokens = [], 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("\n".join(current))
+        current, current_tokens = [], 0
+
+    for segment in split_segments(transcript_text):
+        segment_tokens = estimate_tokens("\n".join(segment))
+        if current and current_tokens + segment_tokens > max_tokens:
+            flush()
+        if segment_tokens <= max_tokens:
+            current.extend(segment)
+            current_tokens += segment_tokens
+            continue
+        # Segment too large on its own: pack it line by line
+        for line in segment:
+            pieces = [line] if estimate_tokens(line) <= max_tokens else split_long_line(line, max_tokens)
+            for piece in pieces:
+                piece_tokens = estimate_tokens(piece) + 1
+                if current and current_tokens + piece_tokens > max_tokens:
+                    flush()
+                current.append(piece)
+                current_tokens += piece_tokens
+    flush()
+    return chunks
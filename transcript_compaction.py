@@ -0,0 +1,167 @@
+import logging
+import os
+import re
+
+from token_estimates import estimate_tokens
+
+# ISO 8601 timestamps: "T" or space between date and time, optional fraction, "Z" or a UTC offset
+TIMESTAMP = r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?"
+# "<timestamp>: <user> - <message>" (exports) or "<timestamp> - <user> - <message>" (lambda requests)
+LINE_PATTERN = re.compile(rf"^({TIMESTAMP})(:| -) (.*?) - (.*)$")
+# "<timestamp>: [marker]" lines written by this module for collapsed system events
+MARKER_PATTERN = re.compile(rf"^({TIMESTAMP})(:| -) (\[[^\]]*\])$")
+
+QUEUE_PATTERN = re.compile(r"^Assignee changed to (?:null|UNASSIGNED) \(\s*(.*?)\s*\).* by .*$")
+ASSIGN_PATTERN = re.compile(
+    r"^(?:Assignee changed|Assigned) to (.+?) \(\s*(.*?)\s*\)(?: from (.+?) \(\s*.*?\s*\))? by .*$"
+)
+TAGS_PATTERN = re.compile(r"^Tags changed\s+to \[(.*)\] by .*$")
+AUTO_CLOSE_PATTERN = re.compile(r"^Closed Automatically on .*$")
+AUTO_GREETING_MARKERS = (
+    "Thank you for reaching out to us. Our service agent will get back to you",
+    "Kindly note, we will chat in English by default",
+)
+
+class TranscriptEntry:
+    def __init__(self, timestamp, separator, user, message):
+        self.timestamp = timestamp
+        self.separator = separator
+        self.user = user
+        self.message = message
+
+    def render(self):
+        if self.user is None:
+            return f"{self.timestamp}{self.separator} {self.message}"
+        return f"{self.timestamp}{self.separator} {self.user} - {self.message}"
+
+def parse_entries(transcript_text):
+    """Split transcript text into entries; lines without a timestamp continue the previous message."""
+    entries = []
+    preamble = []
+    for line in transcript_text.splitlines():
+        marker = MARKER_PATTERN.match(line)
+        match = LINE_PATTERN.match(line)
+        if marker:
+            timestamp, separator, message = marker.groups()
+            entries.append(TranscriptEntry(timestamp, separator, None, message))
+        elif match:
+            entries.append(TranscriptEntry(*match.groups()))
+        elif entries:
+            entries[-1].message += "\n" + line
+        else:
+            preamble.append(line)
+    return preamble, entries
+
+# Each rule takes an entry and returns it (possibly rewritten) or None to drop it.
+
+def compact_queue_events(entry):
+    """'Assignee changed to null (CS_PREMIUM) by defaultEnterprise' -> '[queued: CS_PREMIUM]'."""
+    match = QUEUE_PATTERN.match(entry.message)
+    if match:
+        entry.user, entry.message = None, f"[queued: {match.group(1)}]"
+    return entry
+
+def compact_assignments(entry):
+    """Keep who was assigned and when (needed for first-response scoring), drop the rest."""
+    match = ASSIGN_PATTERN.match(entry.message)
+    if match:
+        assignee, queue, previous = match.groups()
+        moved_from = f" from {previous}" if previous else ""
+        entry.user, entry.message = None, f"[assigned to {assignee} ({queue}){moved_from}]"
+    return entry
+
+def compact_tags(entry):
+    """Tags are the chat disposition; keep the list, drop the boilerplate around it."""
+    match = TAGS_PATTERN.match(entry.message)
+    if match:
+        entry.user, entry.message = None, f"[tags: {match.group(1)}]"
+    return entry
+
+def compact_auto_greeting(entry):
+    """Replace the long bilingual auto-greeting with a marker that keeps its timestamp."""
+    if any(marker in entry.message for marker in AUTO_GREETING_MARKERS):
+        entry.user, entry.message = None, "[auto-greeting sent]"
+    return entry
+
+def compact_auto_close(entry):
+    if AUTO_CLOSE_PATTERN.match(entry.message):
+        entry.user, entry.message = None, "[closed automatically]"
+    return entry
+
+def trim_timestamps(entry):
+    """Second resolution is enough for scoring; drop the milliseconds."""
+    entry.timestamp = re.sub(r"\.\d+", "", entry.timestamp)
+    return entry
+
+def strip_blank_lines(entry):
+    lines = [line.rstrip() for line in entry.message.splitlines()]
+    entry.message = "\n".join(line for line in lines if line.strip())
+    return entry if entry.message else None
+
+def drop_duplicate_events(entries):
+    """Drop consecutive identical system events (e.g. repeated queue markers)."""
+    compacted = []
+    for entry in entries:
+        previous = compacted[-1] if compacted else None
+        if previous and entry.user is None and previous.user is None and previous.message == entry.message:
+            continue
+        compacted.append(entry)
+    return compacted
+
+RULES = {
+    "queue": compact_queue_events,
+    "assignment": compact_assignments,
+    "tags": compact_tags,
+    "auto_greeting": compact_auto_greeting,
+    "auto_close": compact_auto_close,
+    "blank_lines": strip_blank_lines,
+    "timestamps": trim_timestamps,
+}
+
+class TranscriptCompactor:
+    """
+    Pre-processing stage that removes or collapses non-conversational lines
+    (queue/assignment/tag events, auto-greetings, auto-close notices) before
+    the transcript is sent to the LLM. Timestamps of the collapsed events are
+    kept, so the facts scoring needs (e.g. assignment time) survive.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = [RULES[name] for name in (rules if rules is not None else RULES)]
+
+    def compact(self, transcript_text):
+        """Return (compacted_text, stats) where stats reports estimated tokens before and after."""
+        preamble, entries = parse_entries(transcript_text)
+        compacted = []
+        for entry in entries:
+            for rule in self.rules:
+                entry = rule(entry)
+                if entry is None:
+                    break
+            if entry is not None:
+                compacted.append(entry)
+        compacted = drop_duplicate_events(compacted)
+
+        lines = [line for line in preamble if line.strip()] + [entry.render() for entry in compacted]
+        compacted_text = "\n".join(lines)
+        stats = {
+            "tokens_before": estimate_tokens(transcript_text),
+            "tokens_after": estimate_tokens(compacted_text),
+        }
+        return compacted_text, stats
+
+def build_compactor_from_env():
+    """
+    Build the compactor described by AUTOQA_COMPACTION: "off", "all" (default)
+    or a comma separated list of rule names from RULES.
+    """
+    setting = os.getenv("AUTOQA_COMPACTION", "all").strip()
+    if setting == "off":
+        return None
+    if setting == "all":
+        return TranscriptCompactor()
+    names = [name.strip() for name in setting.split(",") if name.strip()]
+    unknown = [name for name in names if name not in RULES]
+    if unknown:
+        logging.warning(f"Ignoring unknown compaction rules: {unknown}")
+    return TranscriptCompactor([name for name in names if name in RULES])
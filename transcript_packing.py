@@ -0,0 +1,90 @@
+import json
+import os
+
+from llm_json import repair_json
+from token_estimates import estimate_tokens
+
+PACKED_INSTRUCTIONS = """
+            The tickets below are separate conversations. Evaluate each ticket on its own, exactly as described
+            above, and return a single JSON object with one key per ticket id whose value is that ticket's
+            evaluation object in the format above: {{"T1": {{...}}, "T2": {{...}}}}.
+            Return only this JSON object, with every ticket id present.
+
+{tickets}
+"""
+TICKET_HEADER = "### Ticket {ticket_id}"
+
+class TranscriptPacker:
+    """
+    Groups short transcripts into one prompt so the rubric is sent once per
+    group instead of once per ticket. A group holds at most `max_tickets`
+    transcripts of up to `short_tokens` each, and its prompt plus the
+    expected completions must fit `max_tokens`.
+    """
+
+    def __init__(self, max_tokens=6000, max_tickets=8, short_tokens=400, completion_tokens_per_ticket=450):
+        self.max_tokens = max_tokens
+        self.max_tickets = max_tickets
+        self.short_tokens = short_tokens
+        self.completion_tokens_per_ticket = completion_tokens_per_ticket
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_tokens=int(os.getenv("AUTOQA_PACK_MAX_TOKENS", 6000)),
+            max_tickets=int(os.getenv("AUTOQA_PACK_MAX_TICKETS", 8)),
+            short_tokens=int(os.getenv("AUTOQA_PACK_SHORT_TOKENS", 400)),
+        )
+
+    def is_short(self, transcript_text):
+        return estimate_tokens(transcript_text) <= self.short_tokens
+
+    def group_tokens(self, rubric_tokens, transcript_tokens):
+        """Prompt and completion tokens of a group with transcripts of the given sizes."""
+        tickets = len(transcript_tokens)
+        return (
+            rubric_tokens + estimate_tokens(PACKED_INSTRUCTIONS)
+            + sum(tokens + estimate_tokens(TICKET_HEADER) for tokens in transcript_tokens)
+            + tickets * self.completion_tokens_per_ticket
+        )
+
+    def fits(self, rubric_tokens, transcript_tokens, context_window=None):
+        """Whether a group of transcripts of these sizes can be sent as one call."""
+        limit = min(self.max_tokens, context_window) if context_window else self.max_tokens
+        return len(transcript_tokens) <= self.max_tickets and self.group_tokens(rubric_tokens, transcript_tokens) <= limit
+
+def ticket_ids(count):
+    return [f"T{index + 1}" for index in range(count)]
+
+def build_packed_prompt(rubric, transcripts):
+    """The rubric (a single-ticket prompt up to its transcript) followed by keyed tickets."""
+    tickets = "\n\n".join(
+        f"{TICKET_HEADER.format(ticket_id=ticket_id)}\n{transcript}"
+        for ticket_id, transcript in zip(ticket_ids(len(transcripts)), transcripts)
+    )
+    return rubric + PACKED_INSTRUCTIONS.format(tickets=tickets)
+
+def split_packed_output(output, count):
+    """
+    Per-ticket evaluation texts of a packed output, in ticket order. A slot
+    that is missing or not an object is None, so its ticket can be retried on
+    its own; the slots themselves are validated by the caller.
+    """
+    slots = [None] * count
+    if not output:
+        return slots
+    try:
+        data = json.loads(output.strip().strip("`").removeprefix("json"))
+    except json.JSONDecodeError:
+        repaired = repair_json(output)
+        try:
+            data = json.loads(repaired) if repaired else None
+        except json.JSONDecodeError:
+            data = None
+    if not isinstance(data, dict):
+        return slots
+    for index, ticket_id in enumerate(ticket_ids(count)):
+        slot = data.get(ticket_id)
+        if isinstance(slot, dict):
+            slots[index] = json.dumps(slot)
+    return slots
@@ -0,0 +1,42 @@
+import logging
+
+RECORD_DELIMITER = "*" * 100
+
+def iter_transcripts(path):
+    """
+    Stream (code, transcript_text) records from a transcript.txt export.
+
+    Records look like:
+        Code: TK822144
+        Transcript:
+        <transcript lines>
+        ****...**** (100 stars)
+
+    The file is read line by line, so memory use is bounded by the largest
+    single record rather than the size of the export. Undecodable bytes (the
+    exports mix encodings) are replaced rather than aborting the run.
+    """
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        code = None
+        lines = []
+        in_transcript = False
+        for line in file:
+            stripped = line.strip()
+            if stripped == RECORD_DELIMITER:
+                if code:
+                    yield code, "".join(lines).strip()
+                else:
+                    logging.warning("Skipping transcript record without a code.")
+                code, lines, in_transcript = None, [], False
+            elif in_transcript:
+                lines.append(line)
+            elif stripped.startswith("Code:"):
+                code = stripped[len("Code:"):].strip()
+            elif stripped.startswith("Transcript:"):
+                in_transcript = True
+                remainder = stripped[len("Transcript:"):].strip()
+                if remainder:
+                    lines.append(remainder + "\n")
+        # Like the original split-based parser, a trailing record without a delimiter is incomplete
+        if code and lines:
+            logging.warning(f"Ignoring unterminated transcript record {code} at end of {path}.")